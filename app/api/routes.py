@@ -3,14 +3,57 @@ from app.models.requests import UserIdRequest
 from app.services.session_service import session_service
 from app.services.chat_service import process_chat_message
 from app.api.websocket_handler import handle_websocket_connection
+from infrastructure.audio import decode_executor, close_transcription_backend, prewarm_speech, tts_cache
+from core.agents import app_graph
+from core.agents.prompts import prompt_cache_stats
+from core.agents.router import router_stats
+from core.tools.doctor_directory import doctor_directory
+from infrastructure.storage import get_supabase, close_supabase
+from infrastructure.email import get_outbox, close_outbox
+from infrastructure.google import calendar_metrics, calendar_api_metrics, start_calendar_service, stop_calendar_service
+from app.config.settings import settings
+from contextlib import asynccontextmanager
+import asyncio
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranca y detiene los servicios de fondo del worker"""
+    # Precalentar los workers de decodificación antes de aceptar conexiones
+    await asyncio.to_thread(decode_executor.start)
+    if settings.TTS_CACHE_ENABLED and settings.TTS_PREWARM_PHRASES:
+        asyncio.create_task(prewarm_speech(settings.TTS_PREWARM_PHRASES))
+    if settings.postgrest_url:
+        # Abre la primera conexión del pool y deja registrado si la base responde
+        asyncio.create_task(get_supabase().ahealth_check())
+    # Retoma los correos que quedaron en el spool de una ejecución anterior
+    await asyncio.to_thread(get_outbox().start)
+    if settings.DOCTOR_DIRECTORY_ENABLED:
+        # Hasta que carga el snapshot, search_doctors consulta la base directamente
+        doctor_directory.start()
+    if settings.CREDENTIALS_JSON:
+        # El token de Google Calendar se renueva de fondo, nunca dentro de una consulta
+        try:
+            start_calendar_service()
+        except ImportError as e:
+            logger.warning(f"Google Calendar no disponible: {e}")
+    yield
+    await doctor_directory.stop()
+    await asyncio.to_thread(stop_calendar_service)
+    await close_supabase()
+    await asyncio.to_thread(close_outbox)
+    decode_executor.shutdown()
+    await close_transcription_backend()
+    # Escribir el último batch de checkpoints antes de salir
+    if hasattr(app_graph.checkpointer, "close"):
+        await asyncio.to_thread(app_graph.checkpointer.close)
+
 def create_app() -> FastAPI:
     """Crea y configura la aplicación FastAPI"""
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
     
     from fastapi.middleware.cors import CORSMiddleware
     app.add_middleware(
@@ -63,6 +106,21 @@ def create_app() -> FastAPI:
             logger.error(f"Error en chat_endpoint: {e}")
             return Response(content=b"Error procesando mensaje", status_code=500)
 
+    @app.get("/metrics")
+    async def metrics():
+        return {
+            "audio_decode": decode_executor.metrics(),
+            "tts_cache": tts_cache.metrics(),
+            "prompt_cache": prompt_cache_stats.metrics(),
+            "router": router_stats.metrics(),
+            "doctor_directory": doctor_directory.metrics(),
+            "supabase": get_supabase().metrics(),
+            "email_outbox": get_outbox().metrics(),
+            "calendar": calendar_metrics(),
+            "calendar_api": calendar_api_metrics(),
+            "checkpoints": app_graph.checkpointer.metrics() if hasattr(app_graph.checkpointer, "metrics") else None
+        }
+
     @app.websocket("/audio")
     async def websocket_endpoint(websocket: WebSocket):
         await handle_websocket_connection(websocket)
@@ -1,11 +1,76 @@
 import asyncio
 import json
+import time
+import uuid
 from fastapi import WebSocket
-from langchain_core.messages import ToolMessage
-from infrastructure.audio import transcribe_audio, webm_bytes_to_wav
-from app.services.chat_service import process_chat_message
+from infrastructure.audio import (
+    transcribe_audio_async,
+    StreamingAudioDecoder,
+    VoiceActivityDetector,
+    contains_speech,
+    sentences_from_deltas,
+    synthesize_segments
+)
+from infrastructure.audio.audio_converter import WAV_HEADER_SIZE
+from app.config.settings import settings
+from app.services.chat_service import stream_reply
 from app.services.session_service import session_service
 
+async def send_audio_reply(websocket: WebSocket, deltas, send_lock: asyncio.Lock = None) -> int:
+    """
+    Envía la respuesta en streaming a medida que el LLM la genera: un mensaje
+    JSON `audio_start`, un `text_delta` por cada fragmento de texto, los chunks
+    de audio binarios a medida que los produce el TTS y un `audio_end` con el
+    texto completo. Cada oración se sintetiza apenas está completa (en paralelo
+    con el resto de la generación) y va precedida de un `audio_segment`, de modo
+    que el cliente puede decodificar cada segmento por separado.
+    Retorna la cantidad de bytes de audio enviados.
+    """
+    send_lock = send_lock or asyncio.Lock()
+    reply_id = uuid.uuid4().hex
+    text_parts = []
+    t0 = time.perf_counter()
+
+    async def forward_text():
+        # Reenvía el texto al cliente mientras alimenta el separador de oraciones
+        async for delta in deltas:
+            text_parts.append(delta)
+            async with send_lock:
+                await websocket.send_json({"type": "text_delta", "reply_id": reply_id, "text": delta})
+            yield delta
+
+    async with send_lock:
+        await websocket.send_json({
+            "type": "audio_start",
+            "reply_id": reply_id,
+            "format": settings.TTS_STREAM_FORMAT
+        })
+    sent = 0
+    current_segment = None
+    segments = sentences_from_deltas(forward_text())
+    async for index, segment, chunk in synthesize_segments(segments, response_format=settings.TTS_STREAM_FORMAT):
+        async with send_lock:
+            if sent == 0:
+                print(f"Primer chunk de audio en {time.perf_counter() - t0:.2f}s")
+            if index != current_segment:
+                current_segment = index
+                await websocket.send_json({
+                    "type": "audio_segment",
+                    "reply_id": reply_id,
+                    "index": index,
+                    "text": segment
+                })
+            await websocket.send_bytes(chunk)
+        sent += len(chunk)
+    async with send_lock:
+        await websocket.send_json({
+            "type": "audio_end",
+            "reply_id": reply_id,
+            "bytes": sent,
+            "text": "".join(text_parts)
+        })
+    return sent
+
 async def handle_websocket_connection(websocket: WebSocket):
     """Maneja la conexión WebSocket para audio"""
     patient_id = None
@@ -23,20 +88,30 @@ async def handle_websocket_connection(websocket: WebSocket):
         print(f"Error accepting WebSocket: {e}")
         return
     
-    timeout_seconds = 1
+    timeout_seconds = settings.WS_RECEIVE_TIMEOUT
+    # Con VAD se sondea más seguido para cortar la locución apenas termina la voz;
+    # el timeout de recepción queda como respaldo para clientes que dejan de enviar
+    poll_seconds = min(0.1, timeout_seconds) if settings.VAD_ENABLED else timeout_seconds
     connection_open = True
+    # Un decodificador por conexión: el PCM se genera mientras llegan los chunks
+    decoder = StreamingAudioDecoder(rate=16000)
+    vad = VoiceActivityDetector(rate=16000)
+    loop = asyncio.get_running_loop()
     
     try:
         while connection_open:
-            audio_buffer = bytearray()
+            ended_by_vad = False
+            last_chunk_at = loop.time()
+            vad.reset()
             try:
                 while True:
                     try:
-                        message = await asyncio.wait_for(websocket.receive(), timeout=timeout_seconds)
+                        message = await asyncio.wait_for(websocket.receive(), timeout=poll_seconds)
                         if "bytes" in message:
                             data = message["bytes"]
                             print(f"Received {len(data)} bytes of audio data")
-                            audio_buffer.extend(data)
+                            decoder.feed(data)
+                            last_chunk_at = loop.time()
                         elif "text" in message:
                             text_msg = message['text']
                             print(f"Received text message: {text_msg}")
@@ -55,28 +130,68 @@ async def handle_websocket_connection(websocket: WebSocket):
                             connection_open = False
                             break
                     except asyncio.TimeoutError:
-                        print("No bytes received in 3 seconds. Ending recording.")
-                        break
+                        if loop.time() - last_chunk_at >= timeout_seconds:
+                            print(f"No bytes received in {timeout_seconds} seconds. Ending recording.")
+                            break
                     except Exception as e:
                         print(f"Error receiving data: {e}")
                         connection_open = False
                         break
+
+                    if settings.VAD_ENABLED and decoder.received_bytes:
+                        vad.feed(decoder.read_pcm())
+                        if vad.ended or (vad.speech_detected and vad.audio_ms >= settings.VAD_MAX_UTTERANCE_MS):
+                            print(f"Fin de locución detectado por VAD ({vad.speech_ms} ms de voz)")
+                            ended_by_vad = True
+                            break
+                        if not vad.speech_detected and vad.silence_ms >= settings.VAD_MAX_SILENCE_MS:
+                            # Un cliente que solo envía silencio no debe mantener el buffer abierto
+                            print(f"Descartando {vad.silence_ms} ms de silencio")
+                            decoder.discard()
+                            vad.reset()
             except Exception as e:
                 print(f"WebSocket error: {e}")
                 connection_open = False
                 break  
 
-            if audio_buffer and connection_open:
+            if decoder.received_bytes and connection_open:
                 try:
                     # Validar que el buffer tenga un tamaño mínimo antes de procesar
-                    buffer_size = len(audio_buffer)
-                    if buffer_size < 100:
+                    buffer_size = decoder.received_bytes
+                    if buffer_size < 100 and not ended_by_vad:
                         print(f"Buffer demasiado pequeño ({buffer_size} bytes), ignorando...")
+                        if decoder.was_cut:
+                            # Cola de un contenedor que el cliente sigue escribiendo: no cerrarlo
+                            decoder.discard()
+                        else:
+                            decoder.close()
                         continue
                     
                     print(f"Procesando audio: {buffer_size} bytes recibidos")
-                    wav_in_memory = webm_bytes_to_wav(bytes(audio_buffer), rate=16000)
-                    transcription = transcribe_audio(wav_in_memory)
+                    if ended_by_vad:
+                        # El contenedor sigue abierto: lo que llegue después es la próxima locución
+                        wav_in_memory = decoder.cut()
+                    else:
+                        if settings.VAD_ENABLED:
+                            vad.feed(decoder.read_pcm())
+                            if vad.frames_seen and not vad.speech_detected:
+                                print("Locución sin voz, descartando antes de transcribir")
+                                if decoder.was_cut:
+                                    decoder.discard()
+                                else:
+                                    decoder.close()
+                                continue
+                        # El PCM ya se decodificó durante la recepción; solo resta el último frame
+                        wav_in_memory = await decoder.afinish()
+                        if wav_in_memory is None:
+                            continue
+                        if settings.VAD_ENABLED and not vad.frames_seen:
+                            with wav_in_memory.getbuffer() as wav_view:
+                                has_speech = contains_speech(wav_view[WAV_HEADER_SIZE:])
+                            if not has_speech:
+                                print("Locución sin voz, descartando antes de transcribir")
+                                continue
+                    transcription = await transcribe_audio_async(wav_in_memory)
                     print(f"Transcription: {transcription}")
                     
                     if not patient_id:
@@ -98,28 +213,28 @@ async def handle_websocket_connection(websocket: WebSocket):
                         print(f"Creando sesión automáticamente para patient_id: {patient_id}")
                         session_service.create_session(patient_id)
                     
-                    audio_bytes = await process_chat_message(transcription, patient_id=patient_id)
-                    current_result = session_service.get_session(patient_id)
-                    
-                    if current_result and "messages" in current_result:
-                        messages = current_result["messages"]
-                        for msg in reversed(messages):
-                            if isinstance(msg, ToolMessage) and msg.name == "show_calendar":
-                                try:
-                                    calendar_data = json.loads(msg.content) if isinstance(msg.content, str) else msg.content
-                                    ui_command = {
-                                        "type": "ui_update",
-                                        "action": "show_calendar",
-                                        "data": calendar_data
-                                    }
-                                    await websocket.send_json(ui_command)
-                                    break 
-                                except Exception as e:
-                                    print(f"Error parseando: {e}")
+                    send_lock = asyncio.Lock()
+
+                    async def forward_tool_message(msg):
+                        # El calendario se muestra apenas termina la herramienta, sin esperar la respuesta
+                        if msg.name != "show_calendar":
+                            return
+                        try:
+                            calendar_data = json.loads(msg.content) if isinstance(msg.content, str) else msg.content
+                            ui_command = {
+                                "type": "ui_update",
+                                "action": "show_calendar",
+                                "data": calendar_data
+                            }
+                            async with send_lock:
+                                await websocket.send_json(ui_command)
+                        except Exception as e:
+                            print(f"Error parseando: {e}")
 
-                    if audio_bytes and len(audio_bytes) > 0:
-                        await websocket.send_bytes(audio_bytes)
-                        print(f"Audio enviado al frontend: {len(audio_bytes)} bytes")
+                    deltas = stream_reply(transcription, patient_id=patient_id, on_tool_message=forward_tool_message)
+                    audio_size = await send_audio_reply(websocket, deltas, send_lock)
+                    if audio_size > 0:
+                        print(f"Audio enviado al frontend: {audio_size} bytes")
                     else:
                         await websocket.send_text("Error: No se generó audio válido")
                         
@@ -146,6 +261,7 @@ async def handle_websocket_connection(websocket: WebSocket):
         print(f"WebSocket connection error: {e}")
     finally:
         print("Closing WebSocket connection")
+        decoder.close()
         try:
             await websocket.close()
         except:
@@ -12,17 +12,147 @@ class Settings:
     SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
     SUPABASE_USERNAME = os.getenv("SUPABASE_USERNAME")
     SUPABASE_PASSWORD = os.getenv("SUPABASE_PASSWORD")
+    # API PostgREST; por defecto la del proyecto ({SUPABASE_URL}/rest/v1), o un stand-in local
+    POSTGREST_URL = os.getenv("POSTGREST_URL")
+    SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "5"))
+    SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "10"))
+    SUPABASE_HEALTH_TABLE = os.getenv("SUPABASE_HEALTH_TABLE", "DoctorsData")
     
     # Email
     EMAIL_SENDER = os.getenv("EMAIL_SENDER")
     EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
     EMAIL_RECEIVER = os.getenv("EMAIL_RECEIVER")
+    SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+    SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+    # SSL implícito (465); con SMTP_SSL=false se usa STARTTLS si SMTP_STARTTLS=true
+    SMTP_SSL = os.getenv("SMTP_SSL", "true").lower() == "true"
+    SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+    SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "20"))
+    # Bandeja de salida: spool SQLite + sender de fondo con una conexión SMTP reutilizada
+    EMAIL_OUTBOX_PATH = os.getenv("EMAIL_OUTBOX_PATH", ".cache/outbox.sqlite")
+    EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+    EMAIL_SMTP_IDLE_SECONDS = float(os.getenv("EMAIL_SMTP_IDLE_SECONDS", "30"))
+    EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "8"))
+    EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "5"))
+    EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "900"))
+    EMAIL_OUTBOX_KEEP_SENT_SECONDS = float(os.getenv("EMAIL_OUTBOX_KEEP_SENT_SECONDS", str(24 * 3600)))
+    # Un sender reserva los mensajes que va a mandar; si el proceso muere, otro los retoma al vencer la reserva
+    EMAIL_LEASE_SECONDS = float(os.getenv("EMAIL_LEASE_SECONDS", "300"))
     
     # Google Calendar
     CREDENTIALS_JSON = os.getenv("CREDENTIALS_JSON")
+    CALENDAR_TIMEZONE = os.getenv("CALENDAR_TIMEZONE", "America/Argentina/Buenos_Aires")
+    # Antigüedad máxima del cache de eventos antes de pedir los cambios con el sync token
+    CALENDAR_SYNC_INTERVAL = float(os.getenv("CALENDAR_SYNC_INTERVAL", "30"))
+    CALENDAR_PAGE_SIZE = int(os.getenv("CALENDAR_PAGE_SIZE", "250"))
+    # Llamadas a la API: executor acotado (un servicio httplib2 por hilo) y timeouts
+    CALENDAR_MAX_WORKERS = int(os.getenv("CALENDAR_MAX_WORKERS", "4"))
+    CALENDAR_CALL_TIMEOUT = float(os.getenv("CALENDAR_CALL_TIMEOUT", "20"))
+    CALENDAR_HTTP_TIMEOUT = float(os.getenv("CALENDAR_HTTP_TIMEOUT", "15"))
+    # El access token se renueva en segundo plano este margen antes de vencer
+    CALENDAR_TOKEN_REFRESH_MARGIN = float(os.getenv("CALENDAR_TOKEN_REFRESH_MARGIN", "300"))
+    CALENDAR_TOKEN_RETRY_SECONDS = float(os.getenv("CALENDAR_TOKEN_RETRY_SECONDS", "30"))
+    # Turnos: horario de atención (hora local del calendario), días hábiles (0 = lunes) y granularidad
+    SCHEDULING_DAY_START = os.getenv("SCHEDULING_DAY_START", "09:00")
+    SCHEDULING_DAY_END = os.getenv("SCHEDULING_DAY_END", "18:00")
+    SCHEDULING_WORKDAYS = [int(day) for day in os.getenv("SCHEDULING_WORKDAYS", "0,1,2,3,4").split(",") if day.strip()]
+    SCHEDULING_SLOT_STEP_MINUTES = int(os.getenv("SCHEDULING_SLOT_STEP_MINUTES", "30"))
+    SCHEDULING_MIN_NOTICE_MINUTES = int(os.getenv("SCHEDULING_MIN_NOTICE_MINUTES", "60"))
     
     # Audio
     AUDIO_SAMPLE_RATE = 16000
+    # Segundos sin recibir chunks para dar por terminada una locución (respaldo del VAD)
+    WS_RECEIVE_TIMEOUT = float(os.getenv("WS_RECEIVE_TIMEOUT", "1.0"))
+    
+    # Detección de actividad de voz (VAD)
+    VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+    VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+    VAD_ENERGY_THRESHOLD_DB = float(os.getenv("VAD_ENERGY_THRESHOLD_DB", "-45"))
+    VAD_ZCR_MAX = float(os.getenv("VAD_ZCR_MAX", "0.35"))
+    VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "600"))
+    VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "200"))
+    VAD_MAX_SILENCE_MS = int(os.getenv("VAD_MAX_SILENCE_MS", "8000"))
+    VAD_MAX_UTTERANCE_MS = int(os.getenv("VAD_MAX_UTTERANCE_MS", "30000"))
+    
+    # Executor de decodificación de audio ("process" o "thread")
+    DECODE_EXECUTOR = os.getenv("DECODE_EXECUTOR", "process")
+    DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", str(os.cpu_count() or 2)))
+    # Máximo de decodificaciones pendientes por worker de uvicorn (0 = 4 por worker de decodificación)
+    DECODE_MAX_PENDING = int(os.getenv("DECODE_MAX_PENDING", "0"))
+    DECODE_MP_START_METHOD = os.getenv("DECODE_MP_START_METHOD", "spawn")
+    
+    # Transcripción (speech-to-text)
+    STT_MODEL = os.getenv("STT_MODEL", "whisper-1")
+    # URL de un servidor compatible con la API de OpenAI (stand-in local para tests/benchmarks)
+    STT_BASE_URL = os.getenv("STT_BASE_URL") or None
+    STT_MAX_IN_FLIGHT = int(os.getenv("STT_MAX_IN_FLIGHT", "8"))
+    STT_MAX_CONNECTIONS = int(os.getenv("STT_MAX_CONNECTIONS", "16"))
+    STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", "30"))
+    
+    # Text-to-speech en streaming por WebSocket ("mp3" u "opus")
+    TTS_STREAM_FORMAT = os.getenv("TTS_STREAM_FORMAT", "mp3")
+    TTS_STREAM_CHUNK_SIZE = int(os.getenv("TTS_STREAM_CHUNK_SIZE", "4096"))
+    # Síntesis por oraciones: requests de TTS en paralelo y tamaño de los segmentos
+    TTS_MAX_PARALLEL = int(os.getenv("TTS_MAX_PARALLEL", "3"))
+    TTS_MIN_SEGMENT_CHARS = int(os.getenv("TTS_MIN_SEGMENT_CHARS", "25"))
+    TTS_MAX_SEGMENT_CHARS = int(os.getenv("TTS_MAX_SEGMENT_CHARS", "220"))
+    
+    # Cache de audio TTS (LRU en memoria + disco)
+    TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+    TTS_CACHE_MEMORY_MB = int(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+    TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".cache/tts")
+    TTS_CACHE_DISK_MB = int(os.getenv("TTS_CACHE_DISK_MB", "512"))
+    # Frases a precalentar al iniciar, separadas por "|"
+    TTS_PREWARM_PHRASES = [p.strip() for p in os.getenv("TTS_PREWARM_PHRASES", "").split("|") if p.strip()]
+    
+    # Historial del agente: presupuesto de tokens y compactación
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+    # Turnos recientes que se mantienen textuales (mínimo, si entran en el presupuesto)
+    HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+    HISTORY_SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini")
+    # Encoding de tiktoken para contar tokens (si no está disponible se estima por caracteres)
+    HISTORY_TOKEN_ENCODING = os.getenv("HISTORY_TOKEN_ENCODING", "cl100k_base")
+    
+    # Checkpointer del grafo ("sqlite" persistente o "memory")
+    CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+    CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", ".cache/checkpoints.sqlite")
+    # Turnos que se conservan por thread (cada uno deja ~7 checkpoints) y segundos
+    # de inactividad antes de borrar un thread
+    CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "5"))
+    CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))
+    # Respaldo: segundos máximos que un batch de checkpoints espera en memoria
+    CHECKPOINT_FLUSH_INTERVAL = float(os.getenv("CHECKPOINT_FLUSH_INTERVAL", "2.0"))
+    CHECKPOINT_SQLITE_SYNCHRONOUS = os.getenv("CHECKPOINT_SQLITE_SYNCHRONOUS", "FULL")
+    
+    # Guía de derivación por especialidades (relativa a la raíz del proyecto)
+    DERIVATION_GUIDE_PATH = os.getenv("DERIVATION_GUIDE_PATH", "doctors_derivation.txt")
+    
+    # Pre-router local de intenciones ("off", "shadow" solo mide, "on" despacha)
+    ROUTER_MODE = os.getenv("ROUTER_MODE", "on")
+    ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.85"))
+    # Fracción de predicciones confiables que igual decide el LLM, para medir precisión
+    ROUTER_VERIFY_RATE = float(os.getenv("ROUTER_VERIFY_RATE", "0.1"))
+    
+    # Búsqueda de médicos: columnas que se traen de DoctorsData y cantidad que ve el LLM
+    DOCTORS_SELECT_COLUMNS = os.getenv("DOCTORS_SELECT_COLUMNS", "id,name,surname,speciality,location,calendly_url")
+    DOCTORS_SEARCH_TOP_K = int(os.getenv("DOCTORS_SEARCH_TOP_K", "5"))
+    DOCTORS_SEARCH_MAX_ROWS = int(os.getenv("DOCTORS_SEARCH_MAX_ROWS", "50"))
+    
+    # Directorio local de médicos (snapshot de DoctorsData refrescado en segundo plano)
+    DOCTOR_DIRECTORY_ENABLED = os.getenv("DOCTOR_DIRECTORY_ENABLED", "true").lower() == "true"
+    DOCTOR_DIRECTORY_REFRESH_SECONDS = float(os.getenv("DOCTOR_DIRECTORY_REFRESH_SECONDS", "300"))
+    DOCTOR_DIRECTORY_FULL_RELOAD_EVERY = int(os.getenv("DOCTOR_DIRECTORY_FULL_RELOAD_EVERY", "12"))
+    # Columna de última modificación para el refresco incremental (vacía: siempre recarga completa)
+    DOCTOR_DIRECTORY_UPDATED_COLUMN = os.getenv("DOCTOR_DIRECTORY_UPDATED_COLUMN", "updated_at")
+    DOCTOR_DIRECTORY_PAGE_SIZE = int(os.getenv("DOCTOR_DIRECTORY_PAGE_SIZE", "1000"))
+    
+    @property
+    def postgrest_url(self):
+        if self.POSTGREST_URL:
+            return self.POSTGREST_URL
+        if self.SUPABASE_URL:
+            return f"{self.SUPABASE_URL.rstrip('/')}/rest/v1"
+        return None
     
     @property
     def db_connection(self):
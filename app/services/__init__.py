@@ -1,5 +1,5 @@
 from .session_service import session_service, SessionService
-from .chat_service import process_chat_message
+from .chat_service import process_chat_message, generate_reply, stream_reply
 
-__all__ = ["session_service", "SessionService", "process_chat_message"]
+__all__ = ["session_service", "SessionService", "process_chat_message", "generate_reply", "stream_reply"]
 
@@ -1,15 +1,26 @@
+import asyncio
+import inspect
 import time
 import logging
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 from core.agents import app_graph
-from core.tools.audio_compat import assistant_response
+from infrastructure.audio import synthesize_reply
 from app.services.session_service import session_service
 
 logger = logging.getLogger(__name__)
 
-async def process_chat_message(user_input: str, patient_id: str):
+# Nodos del grafo cuyos mensajes son la respuesta al paciente (la despedida
+# del router llega como un mensaje completo, no como tokens)
+REPLY_NODES = ("conversational", "farewell")
+
+# Datos del perfil que la sesión (frontend) aporta al estado del grafo
+PROFILE_FIELDS = ("name", "surname", "sex", "patient_id")
+
+async def _prepare_turn(user_input: str, patient_id: str):
     """
-    Procesa un mensaje de chat y retorna el audio de respuesta
+    Valida la sesión y arma (config, input) del grafo para un turno. El
+    historial vive solo en el checkpoint: el input lleva únicamente el mensaje
+    nuevo y los datos no vacíos del perfil.
     """
     # Validar que patient_id sea válido
     if not patient_id or (isinstance(patient_id, str) and patient_id.strip() == ""):
@@ -23,55 +34,169 @@ async def process_chat_message(user_input: str, patient_id: str):
         current_state = session_service.create_session(patient_id)
     
     config = {"configurable": {"thread_id": patient_id}}
-    
-    # Recuperar el estado previo del checkpointer de LangGraph
-    snapshot = app_graph.get_state(config)
-    checkpoint_messages = []
-    if snapshot and snapshot.values:
-        checkpoint_messages = snapshot.values.get("messages", [])
-    
-    # Sincronizar: usar el historial más largo entre session_service y checkpointer
-    session_messages = current_state.get("messages", [])
-    if len(session_messages) > len(checkpoint_messages):
-        # Si session_service tiene más mensajes, usamos ese historial
-        messages_to_use = session_messages
-    else:
-        # Si el checkpointer tiene más mensajes (o están iguales), usamos ese
-        messages_to_use = checkpoint_messages
-    
-    # Agregar el nuevo mensaje del usuario al historial
-    new_user_message = HumanMessage(content=user_input)
-    messages_with_new = messages_to_use + [new_user_message]
+    await _migrate_session_history(patient_id, current_state, config)
     
     graph_input = {
         "query": user_input,
-        "messages": messages_with_new,
-        "name": current_state.get("name"),
-        "surname": current_state.get("surname"),
-        "sex": current_state.get("sex"),
-        "patient_id": current_state.get("patient_id")
+        "messages": [HumanMessage(content=user_input)],
+        **{field: current_state[field] for field in PROFILE_FIELDS if current_state.get(field)}
     }
-    
+    return config, graph_input
+
+async def _migrate_session_history(patient_id: str, current_state: dict, config: dict) -> None:
+    """
+    Migración única de sesiones creadas cuando el historial también se
+    guardaba en session_service: si el checkpoint no tiene historial se
+    carga el de la sesión, y en cualquier caso la copia de la sesión se borra.
+    """
+    legacy_messages = current_state.get("messages")
+    if legacy_messages is None:
+        return
+    if legacy_messages:
+        snapshot = await app_graph.aget_state(config)
+        if not (snapshot and snapshot.values.get("messages")):
+            await app_graph.aupdate_state(config, {"messages": legacy_messages})
+            logger.info(f"Historial de la sesión {patient_id} migrado al checkpoint ({len(legacy_messages)} mensajes)")
+    current_state.pop("messages", None)
+
+async def _finish_turn(patient_id: str, profile_updates: dict) -> None:
+    """Copia a la sesión los datos del perfil que el grafo extrajo en el turno"""
+    updates = {field: profile_updates[field] for field in PROFILE_FIELDS if profile_updates.get(field)}
+    if updates:
+        session_service.update_session(patient_id, **updates)
+    # Con el checkpointer SQLite, el turno queda escrito en disco en una transacción
+    flush = getattr(app_graph.checkpointer, "aflush", None)
+    if flush is not None:
+        await flush()
+
+# Último turno de cada paciente: se resuelve cuando su grafo termina, incluida
+# la extracción que sigue corriendo después de entregar la respuesta
+_pending_turns = {}
+
+def _claim_turn(patient_id: str):
+    """
+    Registra el turno nuevo antes de cualquier await y retorna (anterior,
+    propio). Así dos mensajes seguidos del mismo paciente quedan en fila y
+    nunca corren dos streams del grafo sobre el mismo thread del checkpoint.
+    """
+    previous = _pending_turns.get(patient_id)
+    turn = asyncio.get_running_loop().create_future()
+    _pending_turns[patient_id] = turn
+    return previous, turn
+
+def _release_turn(patient_id: str, turn) -> None:
+    if not turn.done():
+        turn.set_result(None)
+    if _pending_turns.get(patient_id) is turn:
+        del _pending_turns[patient_id]
+
+async def _wait_previous_turn(previous) -> None:
+    """El turno siguiente del mismo paciente parte del checkpoint ya completo"""
+    if previous is not None and not previous.done():
+        await asyncio.wait([previous])
+
+async def stream_reply(user_input: str, patient_id: str, on_tool_message=None):
+    """
+    Procesa un mensaje de chat con el agente y emite la respuesta como deltas
+    de texto a medida que el LLM genera tokens.
+
+    Los turnos con herramientas siguen pasando por el nodo `tools`: los
+    tool_calls no producen texto y las respuestas de las herramientas se
+    entregan a `on_tool_message` (sync o async) apenas el nodo termina.
+    Si el LLM habla antes y después de una herramienta, ambos textos se
+    emiten separados por un espacio.
+
+    El stream termina apenas el nodo conversacional da la respuesta final; el
+    resto del grafo (extracción de datos) sigue en segundo plano y escribe en
+    el checkpoint mientras el paciente escucha la respuesta.
+    """
+    previous, turn = _claim_turn(patient_id)
+    try:
+        await _wait_previous_turn(previous)
+        config, graph_input = await _prepare_turn(user_input, patient_id)
+    except BaseException:
+        _release_turn(patient_id, turn)
+        raise
+    events = asyncio.Queue()
+
+    async def run_graph():
+        t0 = time.perf_counter()
+        reply_done = False
+        profile_updates = {}
+        try:
+            async for mode, payload in app_graph.astream(graph_input, config=config, stream_mode=["messages", "updates"]):
+                if mode == "updates":
+                    for update in payload.values():
+                        if isinstance(update, dict):
+                            profile_updates.update({k: v for k, v in update.items() if k in PROFILE_FIELDS})
+                if reply_done:
+                    continue
+                if mode == "messages":
+                    message, metadata = payload
+                    if isinstance(message, ToolMessage):
+                        await events.put(("tool", message))
+                    elif metadata.get("langgraph_node") in REPLY_NODES and isinstance(message, AIMessage):
+                        if isinstance(message.content, str) and message.content:
+                            await events.put(("text", message))
+                else:
+                    replies = [
+                        message
+                        for node in REPLY_NODES
+                        for message in ((payload.get(node) or {}).get("messages") or [])
+                    ]
+                    if replies and not getattr(replies[-1], "tool_calls", None):
+                        # Respuesta final del turno: el resto no bloquea al paciente
+                        reply_done = True
+                        logger.info(f"respuesta: {time.perf_counter()-t0:.2f}s")
+                        await events.put(None)
+        except Exception as e:
+            if not reply_done:
+                await events.put(("error", e))
+            logger.error(f"Error en el grafo para {patient_id}: {e}")
+            return
+        finally:
+            if not reply_done:
+                await events.put(None)
+
+        await _finish_turn(patient_id, profile_updates)
+        logger.info(f"turno completo: {time.perf_counter()-t0:.2f}s")
+
+    task = asyncio.create_task(run_graph())
+    task.add_done_callback(lambda _: _release_turn(patient_id, turn))
+
+    current_message_id = None
+    while True:
+        event = await events.get()
+        if event is None:
+            break
+        kind, payload = event
+        if kind == "error":
+            raise payload
+        if kind == "tool":
+            if on_tool_message is not None:
+                handled = on_tool_message(payload)
+                if inspect.isawaitable(handled):
+                    await handled
+            continue
+        if current_message_id is not None and payload.id != current_message_id:
+            yield " "
+        current_message_id = payload.id
+        yield payload.content
+
+async def generate_reply(user_input: str, patient_id: str) -> str:
+    """
+    Procesa un mensaje de chat con el agente y retorna el texto completo de la respuesta
+    """
+    return "".join([delta async for delta in stream_reply(user_input, patient_id)])
+
+async def process_chat_message(user_input: str, patient_id: str):
+    """
+    Procesa un mensaje de chat y retorna el audio de respuesta completo
+    """
     t0 = time.perf_counter()
-    result = app_graph.invoke(graph_input, config=config)
+    # Cada oración se sintetiza apenas el LLM la termina, en paralelo con el
+    # resto de la generación, y el audio se concatena en orden (MP3)
+    audio_bytes = await synthesize_reply(stream_reply(user_input, patient_id))
     t1 = time.perf_counter()
-    
-    session_service.update_session(
-        patient_id,
-        messages=result.get("messages", [])
-    )
-    
-    if result.get("name"):
-        session_service.update_session(patient_id, name=result["name"])
-    if result.get("surname"):
-        session_service.update_session(patient_id, surname=result["surname"])
-    if result.get("sex"):
-        session_service.update_session(patient_id, sex=result["sex"])
-    
-    audio_bytes = assistant_response(result["messages"][-1].content)
-    
-    t2 = time.perf_counter()
-    logger.info(f"invoke: {t1-t0:.2f}s, tts: {t2-t1:.2f}s, total: {t2-t0:.2f}s")
-    print("mensajes:", result["messages"])
+    logger.info(f"reply + tts: {t1-t0:.2f}s")
     return audio_bytes
-
@@ -13,8 +13,7 @@ class SessionService:
             "patient_id": user_id,
             "name": name,
             "surname": surname,
-            "sex": sex,
-            "messages": []
+            "sex": sex
         }
         return self._sessions[user_id]
     
@@ -0,0 +1,100 @@
+"""
+Benchmark de webm_bytes_to_wav sobre grabaciones largas.
+
+Compara el conversor actual (PCM escrito directo en un único buffer) con la
+versión anterior (lista de chunks + join + wave.writeframes) en tiempo y pico
+de memoria de Python (tracemalloc).
+
+Uso:
+    python -m benchmarks.bench_audio_converter [segundos ...]
+"""
+import io
+import sys
+import time
+import tracemalloc
+import wave
+import av
+import numpy as np
+from infrastructure.audio.audio_converter import webm_bytes_to_wav
+
+RATE = 16000
+
+def make_recording(seconds: float, rate: int = 48000) -> bytes:
+    """Genera una grabación WebM/Opus sintética (tono modulado con ruido)"""
+    buf = io.BytesIO()
+    container = av.open(buf, mode="w", format="webm")
+    stream = container.add_stream("libopus", rate=rate)
+    stream.layout = "mono"
+    rng = np.random.default_rng(0)
+    frame_size = 960
+    total = int(seconds * rate) // frame_size * frame_size
+    for start in range(0, total, frame_size):
+        t = (np.arange(frame_size) + start) / rate
+        signal = 0.3 * np.sin(2 * np.pi * 180 * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+        signal += 0.02 * rng.standard_normal(frame_size)
+        samples = (signal * 32767).astype(np.int16).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+        frame.sample_rate = rate
+        frame.pts = start
+        for packet in stream.encode(frame):
+            container.mux(packet)
+    for packet in stream.encode(None):
+        container.mux(packet)
+    container.close()
+    return buf.getvalue()
+
+def legacy_webm_bytes_to_wav(webm_bytes: bytes, rate: int) -> io.BytesIO:
+    """Implementación anterior, conservada solo como referencia del benchmark"""
+    container = av.open(io.BytesIO(webm_bytes), mode="r", format="webm")
+    audio_stream = next(s for s in container.streams if s.type == "audio")
+    resampler = av.audio.resampler.AudioResampler(format="s16", layout="mono", rate=rate)
+    pcm_chunks = []
+    for packet in container.demux(audio_stream):
+        for frame in packet.decode():
+            for f in resampler.resample(frame):
+                arr = f.to_ndarray()
+                if arr.ndim == 2:
+                    arr = arr[0]
+                pcm_chunks.append(arr.tobytes())
+    for f in resampler.resample(None):
+        arr = f.to_ndarray()
+        if arr.ndim == 2:
+            arr = arr[0]
+        pcm_chunks.append(arr.tobytes())
+    container.close()
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(b"".join(pcm_chunks))
+    wav_buffer.seek(0)
+    return wav_buffer
+
+def measure(fn, data, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data, RATE)
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    result = fn(data, RATE)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    pcm_size = len(result.getbuffer()) - 44
+    return best, peak, pcm_size
+
+def main(durations):
+    print(f"{'duración':>9} {'conversor':>10} {'tiempo':>9} {'pico MB':>9} {'pico/PCM':>9}")
+    for seconds in durations:
+        recording = make_recording(seconds)
+        for name, fn, data in (
+            ("anterior", legacy_webm_bytes_to_wav, bytes(recording)),
+            ("actual", webm_bytes_to_wav, memoryview(recording)),
+        ):
+            elapsed, peak, pcm_size = measure(fn, data)
+            print(f"{seconds:>8.0f}s {name:>10} {elapsed * 1000:>7.1f}ms {peak / 1e6:>9.2f} {peak / pcm_size:>9.2f}")
+
+if __name__ == "__main__":
+    main([float(arg) for arg in sys.argv[1:]] or [60, 180, 600])
@@ -0,0 +1,97 @@
+"""
+Benchmark de turnos concurrentes por worker.
+
+Corre N turnos de pacientes distintos a la vez sobre el grafo real
+(stream_reply -> conversational -> extract -> compact) con modelos falsos que
+simulan la latencia del proveedor, y mide turnos/segundo y latencia de la
+respuesta. No se llama a ningún proveedor.
+
+Modos:
+    async        el modelo espera con asyncio.sleep (I/O real no bloqueante)
+    bloqueante   el modelo bloquea el event loop con time.sleep, como hacían
+                 las llamadas síncronas (llm.invoke) dentro de los nodos
+
+Uso:
+    python -m benchmarks.bench_concurrent_turns [concurrencia ...]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Checkpointer en memoria y una key ficticia: el benchmark no toca disco ni red
+os.environ.setdefault("CHECKPOINT_BACKEND", "memory")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langgraph.constants import TAG_NOSTREAM
+import core.agents.agent_graph as agent_graph
+from app.services.chat_service import stream_reply
+
+REPLY = "Entiendo, gracias por contarme. ¿Desde cuándo tenés esos síntomas y cómo cambiaron?"
+TOKEN_DELAY = 0.01
+EXTRACT_DELAY = 0.15
+
+class FakeChatModel(BaseChatModel):
+    """Modelo de chat que emite REPLY palabra por palabra con latencia por token"""
+    blocking: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-sleeping"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(TOKEN_DELAY * len(REPLY.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=REPLY))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for word in REPLY.split(" "):
+            if self.blocking:
+                time.sleep(TOKEN_DELAY)
+            else:
+                await asyncio.sleep(TOKEN_DELAY)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(word + " ", chunk=chunk)
+            yield chunk
+
+def install_fakes(blocking: bool) -> None:
+    async def extract(_):
+        if blocking:
+            time.sleep(EXTRACT_DELAY)
+        else:
+            await asyncio.sleep(EXTRACT_DELAY)
+        return {"raw": AIMessage(content=""), "parsed": agent_graph.ExtractedInfo(), "parsing_error": None}
+
+    agent_graph.llm = FakeChatModel(blocking=blocking)
+    agent_graph.llm_extractor = RunnableLambda(extract).with_config(tags=[TAG_NOSTREAM])
+
+async def run_turn(patient_id: str) -> float:
+    t0 = time.perf_counter()
+    async for _ in stream_reply("Hola, me duele la cabeza hace unos días.", patient_id):
+        pass
+    return time.perf_counter() - t0
+
+async def run_level(concurrency: int, run_id: str):
+    t0 = time.perf_counter()
+    latencies = await asyncio.gather(*(run_turn(f"{run_id}-{i}") for i in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return concurrency / elapsed, statistics.median(latencies), max(latencies)
+
+async def main(levels):
+    print(f"{'modo':>11} {'concurrencia':>12} {'turnos/s':>9} {'p50 resp':>9} {'max resp':>9}")
+    for blocking in (True, False):
+        install_fakes(blocking)
+        mode = "bloqueante" if blocking else "async"
+        for concurrency in levels:
+            throughput, p50, worst = await run_level(concurrency, f"{mode}-{concurrency}")
+            print(f"{mode:>11} {concurrency:>12} {throughput:>9.1f} {p50 * 1000:>7.0f}ms {worst * 1000:>7.0f}ms")
+            # Dejar terminar la extracción en segundo plano antes del siguiente nivel
+            await asyncio.sleep(EXTRACT_DELAY * 2)
+
+if __name__ == "__main__":
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]] or [1, 8, 32]))
@@ -0,0 +1,130 @@
+"""
+Benchmark del directorio local de médicos contra la consulta remota.
+
+Genera un dataset ficticio de médicos a partir de las especialidades de
+doctors_derivation.txt (con las variantes de escritura que aparecen en una
+tabla cargada a mano) y compara:
+
+    remota      la consulta que hace search_doctors sin directorio: ILIKE sin
+                ancla sobre especialidad y ubicación, aquí contra SQLite en
+                memoria más una latencia de red simulada (--rtt-ms)
+    directorio  DoctorDirectory.search sobre el mismo snapshot
+
+Reporta la latencia por búsqueda y cuántas búsquedas encontraron médicos, con
+consultas que incluyen tildes faltantes, sinónimos y errores de tipeo.
+
+Uso:
+    python -m benchmarks.bench_doctor_directory [cantidad_de_médicos] [--rtt-ms 40]
+"""
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from core.knowledge import load_derivation_guide
+from core.knowledge.derivation import specialist_forms
+from core.tools.doctor_directory import DoctorDirectory
+from core.tools.doctor_search import ilike_pattern, rank_doctors
+
+CITIES = [
+    "Mendoza", "Godoy Cruz, Mendoza", "San Rafael, Mendoza", "Córdoba", "Villa Carlos Paz, Córdoba",
+    "Rosario, Santa Fe", "Santa Fe", "CABA", "La Plata, Buenos Aires", "Mar del Plata, Buenos Aires",
+    "San Miguel de Tucumán", "Salta", "Neuquén", "Bahía Blanca, Buenos Aires", "San Juan",
+]
+
+QUERIES = [
+    ("Cardiología", "Mendoza"),
+    ("cardiologo", "Mendoza"),
+    ("Cardiologia", "Cordoba"),
+    ("dentista", "Rosario"),
+    ("Dermatólogo", "CABA"),
+    ("neumologo", "Neuquen"),
+    ("Traumatologia", "Mendosa"),
+    ("otorrino", "La Plata"),
+    ("Ginecología", "Salta, Argentina"),
+    ("psicologa", "San Juan"),
+]
+
+def build_dataset(count: int, seed: int = 7):
+    random.seed(seed)
+    specialties = [s for area in load_derivation_guide() for s in area.specialties]
+    rows = []
+    for i in range(count):
+        specialty = random.choice(specialties)
+        # Como en una tabla cargada a mano: especialidad o especialista, con o sin tildes
+        variant = random.random()
+        if variant < 0.3:
+            specialty = specialist_forms(specialty)[-1].capitalize()
+        elif variant < 0.4:
+            specialty = specialty.lower()
+        rows.append({
+            "id": i + 1,
+            "name": f"Nombre{i}",
+            "surname": f"Apellido{i}",
+            "speciality": specialty,
+            "location": random.choice(CITIES),
+            "calendly_url": f"https://calendly.com/doctor-{i}",
+        })
+    return rows
+
+def remote_search(db, speciality, location, rtt_s):
+    # Misma forma que la consulta PostgREST de search_doctors (ILIKE sin ancla)
+    cursor = db.execute(
+        "SELECT id, name, surname, speciality, location, calendly_url FROM doctors "
+        "WHERE speciality LIKE ? AND location LIKE ? LIMIT 50",
+        (ilike_pattern(speciality), ilike_pattern(location)),
+    )
+    columns = [c[0] for c in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    if rtt_s:
+        time.sleep(rtt_s)
+    return rank_doctors(rows, speciality, location), len(rows)
+
+def measure(search, rounds):
+    timings, hits = [], 0
+    for _ in range(rounds):
+        for speciality, location in QUERIES:
+            t0 = time.perf_counter()
+            top, _ = search(speciality, location)
+            timings.append(time.perf_counter() - t0)
+            hits += 1 if top else 0
+    return timings, hits // rounds
+
+def main(count: int, rtt_ms: float, rounds: int = 20):
+    rows = build_dataset(count)
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE doctors (id INTEGER PRIMARY KEY, name TEXT, surname TEXT, speciality TEXT, location TEXT, calendly_url TEXT)")
+    db.executemany("INSERT INTO doctors VALUES (:id, :name, :surname, :speciality, :location, :calendly_url)", rows)
+
+    directory = DoctorDirectory(fetch=lambda since, column: rows)
+    t0 = time.perf_counter()
+    directory.refresh()
+    print(f"{count} médicos, snapshot indexado en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    rtt_s = rtt_ms / 1000
+    results = {
+        "remota": measure(lambda s, l: remote_search(db, s, l, 0), rounds),
+        f"remota+{rtt_ms:.0f}ms": measure(lambda s, l: remote_search(db, s, l, rtt_s), 1) if rtt_s else None,
+        "directorio": measure(directory.search, rounds),
+    }
+    print(f"{'búsqueda':>14} {'p50':>9} {'p99':>9} {'con resultados':>15}")
+    for name, result in results.items():
+        if result is None:
+            continue
+        timings, hits = result
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f"{name:>14} {statistics.median(timings) * 1000:>7.3f}ms {p99 * 1000:>7.3f}ms {hits:>9}/{len(QUERIES)}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    rtt = 40.0
+    if "--rtt-ms" in args:
+        i = args.index("--rtt-ms")
+        rtt = float(args[i + 1])
+        del args[i:i + 2]
+    main(int(args[0]) if args else 5000, rtt)
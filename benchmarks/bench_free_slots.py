@@ -0,0 +1,106 @@
+"""
+Benchmark del motor de turnos libres.
+
+Genera un calendario ficticio con miles de eventos (turnos de 30 a 90
+minutos, superpuestos a veces, más algunos eventos de día completo y
+"disponible") sobre InMemoryCalendarClient y compara, para ventanas de
+búsqueda de una semana:
+
+    ingenuo   para cada turno candidato (cada SCHEDULING_SLOT_STEP_MINUTES
+              dentro del horario de atención) recorre todos los eventos del
+              calendario buscando uno que lo pise, como hacía el LLM con la
+              salida de get_events
+    motor     free_slots: busy_between sobre el cache indexado, merge de
+              intervalos y barrido de las ventanas de atención
+
+Verifica que los dos devuelvan los mismos turnos y reporta la latencia.
+
+Uso:
+    python -m benchmarks.bench_free_slots [cantidad_de_eventos ...]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from app.config.settings import settings
+from infrastructure.google import set_calendar_client, get_event_cache
+from infrastructure.google.calendar_client import InMemoryCalendarClient
+from infrastructure.google.event_cache import _calendar_timezone, parse_event_time
+from infrastructure.google.scheduling import _parse_clock, free_slots, working_windows
+
+DAYS = 365
+
+def build_events(count: int, first_day: datetime, seed: int = 11):
+    random.seed(seed)
+    events = []
+    for i in range(count):
+        day = first_day + timedelta(days=random.randrange(DAYS))
+        if random.random() < 0.02:
+            events.append({"start": {"date": day.date().isoformat()},
+                           "end": {"date": (day + timedelta(days=1)).date().isoformat()}})
+            continue
+        start = day.replace(hour=random.randint(8, 18), minute=random.choice((0, 15, 30, 45)))
+        end = start + timedelta(minutes=random.choice((30, 45, 60, 90)))
+        event = {"start": {"dateTime": start.isoformat()}, "end": {"dateTime": end.isoformat()}}
+        if random.random() < 0.05:
+            event["transparency"] = "transparent"
+        events.append(event)
+    return events
+
+def naive_slots(events, start, end, duration_minutes, limit):
+    """Candidato por candidato, contra todos los eventos del calendario"""
+    tz = _calendar_timezone()
+    step = settings.SCHEDULING_SLOT_STEP_MINUTES * 60
+    duration = duration_minutes * 60
+    bounds = [
+        (parse_event_time(e["start"]).timestamp(), parse_event_time(e["end"]).timestamp())
+        for e in events if e.get("transparency") != "transparent"
+    ]
+    slots = []
+    windows = working_windows(start, end, tz, _parse_clock(settings.SCHEDULING_DAY_START),
+                              _parse_clock(settings.SCHEDULING_DAY_END), settings.SCHEDULING_WORKDAYS)
+    for opens, closes in windows:
+        closes = min(closes, end.timestamp())
+        cursor = opens
+        while cursor < start.timestamp():
+            cursor += step
+        while cursor + duration <= closes and len(slots) < limit:
+            if not any(b_start < cursor + duration and b_end > cursor for b_start, b_end in bounds):
+                slots.append((datetime.fromtimestamp(cursor, tz), datetime.fromtimestamp(cursor + duration, tz)))
+            cursor += step
+        if len(slots) >= limit:
+            break
+    return slots
+
+def main(counts, queries: int = 50, limit: int = 5):
+    tz = _calendar_timezone()
+    first_day = datetime(2025, 1, 1, tzinfo=tz)
+    print(f"{'eventos':>8} {'búsqueda':>9} {'p50':>10} {'p99':>10}")
+    for count in counts:
+        events = build_events(count, first_day)
+        set_calendar_client(InMemoryCalendarClient(events))
+        get_event_cache().sync()
+        random.seed(3)
+        windows = [first_day + timedelta(days=random.randrange(DAYS - 7)) for _ in range(queries)]
+        timings = {"ingenuo": [], "motor": []}
+        for window_start in windows:
+            window_end = window_start + timedelta(days=7)
+            t0 = time.perf_counter()
+            expected = naive_slots(events, window_start, window_end, 60, limit)
+            timings["ingenuo"].append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            got = free_slots(window_start, window_end, 60, limit, not_before=first_day - timedelta(days=1))
+            timings["motor"].append(time.perf_counter() - t0)
+            assert got == expected, (window_start, got, expected)
+        for name, values in timings.items():
+            values.sort()
+            p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+            print(f"{count:>8} {name:>9} {statistics.median(values) * 1000:>8.3f}ms {p99 * 1000:>8.3f}ms")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 5000, 20000])
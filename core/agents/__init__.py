@@ -1,4 +1,4 @@
 from .agent_graph import app_graph, AgentState
+from .history import set_token_counter, count_tokens
 
-__all__ = ["app_graph", "AgentState"]
-
+__all__ = ["app_graph", "AgentState", "set_token_counter", "count_tokens"]
@@ -1,15 +1,22 @@
-from core.tools.agent_tools import create_event_tool, get_events_tool, send_email, update_database, show_calendar, search_doctors
-from langchain_core.messages import SystemMessage, BaseMessage, HumanMessage, ToolMessage
+import asyncio
+import uuid
+from core.tools.agent_tools import create_event_tool, get_events_tool, send_email, update_database, show_calendar, search_doctors, suggest_specialty
+from langchain_core.messages import SystemMessage, BaseMessage, HumanMessage, ToolMessage, AIMessage, RemoveMessage
 from typing import TypedDict, List, Optional, Literal, Annotated
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.constants import TAG_NOSTREAM
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import ToolNode
 from pydantic import BaseModel, Field
 from app.config.settings import settings
+from infrastructure.storage.checkpointer import create_checkpointer
+from .history import render_transcript, trim_history, plan_compaction
+from .prompts import conversation_prompt, extraction_prompt, summary_prompt, prompt_cache_stats, FAREWELL_REPLY, FAREWELL_REPLY_EMAIL_SENT
+from .router import route_message, router_stats, last_turn, email_sent_in, FAREWELL, SEARCH_DOCTORS, ROUTER_MESSAGE_PREFIX
 
-memory = MemorySaver()
+# Checkpointer configurable (SQLite persistente por defecto)
+memory = create_checkpointer()
 
 class AgentState(TypedDict):
     name: Optional[str]
@@ -24,13 +31,14 @@ class AgentState(TypedDict):
     resume: Optional[str]
     birthday: Optional[str]
     med_insurance: Optional[str]
-    med_calendly: Optional[str]
-
-class RouteDecision(BaseModel):
-    decision: Literal["ir_a_mail", "ir_a_calendario", "responder_usuario"] = Field(
-        ..., 
-        description="La acción que debe tomar el agente basada en la conversación"
-    )
+    # Médico elegido: el último cuyo calendario se le mostró al paciente
+    doctor_id: Optional[str]
+    # Id del último mensaje que ya pasó por el extractor
+    extraction_watermark: Optional[str]
+    # Resumen acumulado de los turnos compactados fuera del historial
+    summary: Optional[str]
+    # Intención que detectó el pre-router en el turno actual (ver router.py)
+    route: Optional[dict]
 
 def clean_messages(messages):
     # Ya no filtramos ToolMessage, el agente necesita ver el resultado de las herramientas
@@ -44,97 +52,131 @@ class ExtractedInfo(BaseModel):
     birthday: Optional[str] = Field(None, description="Fecha de nacimiento si se menciona")
     med_insurance: Optional[str] = Field(None, description="Obra social o seguro médico si se menciona")
     resume: Optional[str] = Field(None, description="Resumen de síntomas o situación clínica si se menciona")
-    med_calendly: Optional[str] = Field(None, description="Enlace del calendly del medico deseado")
-llm = ChatOpenAI(model="gpt-3.5-turbo").bind_tools([send_email, update_database, show_calendar, search_doctors])
-llm_extractor = ChatOpenAI(model="gpt-4o-mini").with_structured_output(ExtractedInfo)
-
-def conv_node(state: AgentState) -> AgentState:
-    current_messages = state.get("messages", [])
-    query = state.get("query", "")
-    
-    # Si no hay mensajes, crear el primer mensaje
-    if not current_messages:
-        messages_for_llm = [HumanMessage(content=query)]
+llm = ChatOpenAI(model="gpt-3.5-turbo", stream_usage=True).bind_tools([send_email, update_database, show_calendar, search_doctors, suggest_specialty])
+# El extractor no debe aparecer en el stream de tokens de la respuesta
+llm_extractor = ChatOpenAI(model="gpt-4o-mini").with_structured_output(ExtractedInfo, include_raw=True).with_config(tags=[TAG_NOSTREAM])
+llm_summarizer = ChatOpenAI(model=settings.HISTORY_SUMMARY_MODEL).with_config(tags=[TAG_NOSTREAM])
+
+def router_node(state: AgentState) -> AgentState:
+    """Clasifica el mensaje nuevo con reglas locales, sin llamar al LLM"""
+    turn = last_turn(state.get("messages", []))
+    text = turn[0].content if turn and isinstance(turn[0], HumanMessage) else state.get("query", "")
+    return {"route": route_message(text if isinstance(text, str) else state.get("query", ""))}
+
+def farewell_node(state: AgentState) -> AgentState:
+    """Respuesta fija a una despedida despachada por el router"""
+    reply = FAREWELL_REPLY_EMAIL_SENT if state.get("email_sent") else FAREWELL_REPLY
+    return {"messages": [AIMessage(content=reply, id=f"{ROUTER_MESSAGE_PREFIX}{uuid.uuid4()}")]}
+
+def dispatch_node(state: AgentState) -> AgentState:
+    """
+    Arma el tool_call que el LLM habría generado para la intención del router,
+    así el nodo `tools` lo ejecuta y el historial queda igual que si lo hubiera
+    decidido el modelo.
+    """
+    route = state["route"]
+    if route["intent"] == FAREWELL:
+        missing = "No informado"
+        call = {"name": "send_email", "args": {
+            "name": state.get("name") or missing,
+            "surname": state.get("surname") or missing,
+            "sex": state.get("sex") or missing,
+            "birthday": state.get("birthday") or missing,
+            "resume": state.get("resume") or missing,
+            "med_ins": state.get("med_insurance") or missing,
+            "doctor_id": state.get("doctor_id") or "",
+        }}
     else:
-        # Verificar si el último mensaje es el nuevo mensaje del usuario
-        # Si no lo es, agregarlo al historial
-        last_msg = current_messages[-1]
-        if isinstance(last_msg, HumanMessage) and last_msg.content == query:
-            # El mensaje ya está en el historial, usar todos los mensajes
-            messages_for_llm = current_messages
-        else:
-            # El mensaje no está en el historial, agregarlo
-            messages_for_llm = current_messages + [HumanMessage(content=query)]
-
-    nombre_paciente = state.get("name", "")
-    apellido_paciente = state.get("surname", "")
-    sexo_paciente = state.get("sex", "")
-    id_paciente = state.get("patient_id","")
-    print("ID PACIENTE EN CONV NODE:", id_paciente, nombre_paciente)
-    print(f"Total mensajes en historial: {len(messages_for_llm)}")
-    print(f"Últimos 3 mensajes antes de LLM: {[type(m).__name__ for m in messages_for_llm[-3:]]}")
-
-    sys_msg = SystemMessage(content=f"""
-    Sos CuraAI, un asistente médico. Responde las consultas del paciente. Debes tener una charla amigable y empática con el paciente para obtener informacion sobre su situacion
-    La respuesta debe tener como maximo tres oraciones.
-
-    El objetivo de la charla es obtener informacion relevante sobre la salud del paciente y su situación clínica. Tenes que ir consultando cosas al paciente y repreguntar para profundizar
-    en los temas que el paciente menciona. No debes ofrecer un diagnóstico ni recomendar medicamentos. No debes ofrecer enviar un mail al medico a menos que el paciente se despida.
+        call = {"name": "search_doctors", "args": dict(route["args"])}
+    call["id"] = f"call_{ROUTER_MESSAGE_PREFIX}{uuid.uuid4().hex[:24]}"
+    return {"messages": [AIMessage(content="", tool_calls=[call], id=f"{ROUTER_MESSAGE_PREFIX}{uuid.uuid4()}")]}
 
-    Informacion del paciente:
-    - Nombre: {nombre_paciente}
-    - Apellido: {apellido_paciente}
-    - Sexo biológico: {sexo_paciente}
-    - ID del paciente: {id_paciente}
+async def conv_node(state: AgentState) -> AgentState:
+    # El mensaje nuevo del paciente ya llega en el input del turno
+    messages_for_llm = state.get("messages", [])
 
-    IMPORTANTE: Si el paciente se despide (dice 'gracias', 'chau', 'nos vemos', etc),
-    debes responder calurosamente Y LUEGO invocar la herramienta send_email_tool
-    con los datos que tengas del paciente. No debes hacer un diagnostico sobre los sintomas del paciente
-    ni recomendar medicamentos. 
+    print("ID PACIENTE EN CONV NODE:", state.get("patient_id", ""), state.get("name", ""))
+    print(f"Total mensajes en historial: {len(messages_for_llm)}")
+    print(f"Últimos 3 mensajes antes de LLM: {[type(m).__name__ for m in messages_for_llm[-3:]]}")
 
+    # Prefijo estático + perfil del paciente + historial acotado al presupuesto de tokens
+    prompt = conversation_prompt.format_messages(
+        name=state.get("name") or "",
+        surname=state.get("surname") or "",
+        sex=state.get("sex") or "",
+        patient_id=state.get("patient_id") or "",
+        history=trim_history(messages_for_llm, state.get("summary")),
+    )
+    response = await llm.ainvoke(prompt)
+    prompt_cache_stats.record("conversational", response)
     
-    Si el paciente quiere buscar medicos, utiliza la herramienta 'search_doctors' pasandole como argumentos la especialidad y la ubicacion. Ejemplo: search_doctors('Cardiologo', 'Mendoza, Argentina')
-    Con la informacion que devuelve la herramienta 'search_doctors' tenes que generar una respuesta para ofrecerle al paciente los distintos medicos. NO debes responder con el json que devuelve la herramienta ni ofrecer enlaces
-    IMPORTANTE: SOLO debes ofrecer los médicos que devuelve la herramienta search_doctors. NUNCA inventes médicos. Si ya ejecutaste la herramienta y recibiste resultados, úsalos. NO debes inventar nombres de médicos ni especialidades que no vinieron de la herramienta.
-    Cuando la herramienta responda tenes que tomar del json el atributo 'calendly_url' del medico que quiere contactar el paciente y guardarlo en el estado como med_calendly
-    NO debes ofrecer medicos sin usar la herramienta 'search_doctors'. No debes responder sin usar los medicos que te da la herramienta.
-
-    si el paciente te lo pide podes utilizar la herramienta 'update_database' para actualizar su informacion en la base de datos. Le tenes que pasar como argumentos
-    el id del paciente, el campo a actualizar y el nuevo valor. Utiliza los siguientes nombres de campos: nombre, apellido, sexo, obra_social, fecha_de_nacimiento
-
-    Si el paciente menciona que quiere agendar una cita, utiliza la herramienta 'show_calendar' utilizando el enlace 'med_calendly' del medico seleccionado para mostrarle las fechas disponibles.
-
-    Si el paciente menciona alguno de estos datos, extráelos:
-    - name: Nombre del paciente
-    - surname: Apellido del paciente
-    - sex: Sexo biológico (masculino/femenino/otro)
-    - birthday: Fecha de nacimiento (formato YYYY-MM-DD)
-    - med_insurance: Obra social o seguro médico
-    - resume: Resumen de síntomas o situación clínica
-    - med_calendly: Enlace del calendly del medico deseado
-    """)
-
-    response = llm.invoke([sys_msg] + messages_for_llm)
-    
-    # Extraemos info (usamos los mensajes actuales para contexto)
-    extracting_prompt = SystemMessage(content=f"""
-    Eres un extractor de información de pacientes. Tenes que leer la conversacion y extraer los siguientes datos si estan presentes:
-    - name: Nombre del paciente
-    - surname: Apellido del paciente
-    - sex: Sexo biológico (masculino/femenino/otro)
-    - birthday: Fecha de nacimiento (formato YYYY-MM-DD)
-    - med_insurance: Obra social o seguro médico
-    - resume: Resumen de síntomas o situación clínica
-    - med_calendly: Enlace del calendly del medico deseado
-    Conversación: {messages_for_llm} """)
-
-    extracted = llm_extractor.invoke([extracting_prompt])
+    # Solo devolver la respuesta del asistente, el historial completo ya está en el estado
+    # LangGraph con add_messages se encargará de agregar la respuesta al historial
+    # La extracción de datos del paciente corre después, en el nodo "extract"
+    return {"messages": [response]}
+
+# Campos que completa el extractor, en el orden en que se le muestran
+EXTRACTED_FIELDS = ("name", "surname", "sex", "birthday", "med_insurance", "resume")
+
+def shown_doctor_in(messages: List[BaseMessage]) -> Optional[str]:
+    """ID del último médico cuyo calendario show_calendar mostró sin error en estos mensajes"""
+    shown = {
+        message.tool_call_id for message in messages
+        if isinstance(message, ToolMessage) and message.name == "show_calendar"
+        and message.status != "error" and "open_calendar" in str(message.content)
+    }
+    doctor_id = None
+    for message in messages:
+        for call in getattr(message, "tool_calls", None) or []:
+            if call["name"] == "show_calendar" and call["id"] in shown:
+                doctor_id = str(call["args"].get("doctor_id", "")).strip() or doctor_id
+    return doctor_id
+
+def messages_since(messages: List[BaseMessage], watermark: Optional[str]) -> List[BaseMessage]:
+    """Mensajes posteriores al watermark (todos si no hay o si ya no está en el historial)"""
+    if watermark:
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i].id == watermark:
+                return messages[i + 1:]
+    return messages
+
+async def extract_node(state: AgentState) -> AgentState:
+    """
+    Extrae los datos del paciente una vez por turno, después de la respuesta
+    final: el paciente escucha la respuesta mientras este nodo corre.
+
+    Solo ve los mensajes nuevos desde la última extracción y los datos ya
+    conocidos, así el costo por turno no crece con la conversación.
+    """
+    messages = state.get("messages", [])
+    if not messages:
+        return {}
+    router_stats.record(state.get("route"), messages)
+    updates = {"extraction_watermark": messages[-1].id}
+    turn = last_turn(messages)
+    if not state.get("email_sent") and email_sent_in(turn):
+        updates["email_sent"] = True
+    # El calendly_url no pasa por el transcript: el médico elegido sale de las herramientas
+    doctor_id = shown_doctor_in(turn)
+    if doctor_id and doctor_id != state.get("doctor_id"):
+        updates["doctor_id"] = doctor_id
+    new_messages = messages_since(messages, state.get("extraction_watermark"))
+    transcript = render_transcript(new_messages)
+    if not transcript:
+        return updates
+
+    known = "\n".join(
+        f"- {field}: {state.get(field)}" for field in EXTRACTED_FIELDS if state.get(field)
+    ) or "(ninguno)"
+    print(f"Extrayendo datos de {len(new_messages)} mensajes nuevos ({len(transcript)} caracteres)")
+
+    result = await llm_extractor.ainvoke(extraction_prompt.format_messages(known=known, transcript=transcript))
+    prompt_cache_stats.record("extract", result["raw"])
+    extracted = result["parsed"] or ExtractedInfo()
     
-    updates = {}
     if extracted.name and not state.get("name"): updates["name"] = extracted.name
     if extracted.surname and not state.get("surname"): updates["surname"] = extracted.surname
     if extracted.sex and not state.get("sex"): updates["sex"] = extracted.sex
-    if extracted.med_calendly and not state.get("med_calendly"): updates["med_calendly"] = extracted.med_calendly
     if extracted.birthday and not state.get("birthday"): updates["birthday"] = extracted.birthday
     if extracted.med_insurance and not state.get("med_insurance"): updates["med_insurance"] = extracted.med_insurance
     if extracted.resume:
@@ -142,13 +184,32 @@ def conv_node(state: AgentState) -> AgentState:
             updates["resume"] = state["resume"] + " " + extracted.resume
         else:
             updates["resume"] = extracted.resume
-
-    # Solo devolver la respuesta del asistente, el historial completo ya está en el estado
-    # LangGraph con add_messages se encargará de agregar la respuesta al historial
-    updates["messages"] = [response]
         
     return updates
 
+async def compact_node(state: AgentState) -> AgentState:
+    """
+    Compacta el historial persistido cuando supera HISTORY_TOKEN_BUDGET: los
+    turnos viejos pasan al resumen acumulado y se borran, y los resultados de
+    herramientas fuera de la ventana reciente quedan como stubs. Corre al final
+    del turno, después de que el paciente ya recibió la respuesta.
+    """
+    to_summarize, stubs = plan_compaction(state.get("messages", []))
+    if not to_summarize and not stubs:
+        return {}
+
+    updates = {"messages": list(stubs)}
+    if to_summarize:
+        response = await llm_summarizer.ainvoke(summary_prompt.format_messages(
+            summary=state.get("summary") or "(sin resumen previo)",
+            transcript=render_transcript(to_summarize),
+        ))
+        prompt_cache_stats.record("summary", response)
+        updates["summary"] = response.content
+        updates["messages"] += [RemoveMessage(id=m.id) for m in to_summarize]
+    print(f"Historial compactado: {len(to_summarize)} mensajes resumidos, {len(stubs)} resultados de herramientas reducidos")
+    return updates
+
 def decide_for_tools(state: AgentState):
     last = state["messages"][-1]
     if getattr(last, "tool_calls", None):
@@ -156,44 +217,80 @@ def decide_for_tools(state: AgentState):
     return "continue"
 
 def route_after_conv(state: AgentState):
-    last = state["messages"][-1] 
-
-    if state.get("email_sent", False):
+    # Todo tool_call del LLM se ejecuta: un AIMessage con tool_calls sin su
+    # ToolMessage deja el historial inválido para la próxima llamada
+    return decide_for_tools(state)
+
+def route_after_router(state: AgentState):
+    route = state.get("route")
+    if not route or not route.get("dispatched"):
+        return "conversational"
+    return "farewell" if route["intent"] == FAREWELL else "dispatch"
+
+def route_after_farewell(state: AgentState):
+    return "continue" if state.get("email_sent") else "dispatch"
+
+def route_after_tools(state: AgentState):
+    # El mail de despedida no necesita que el LLM lea el resultado
+    route = state.get("route")
+    if route and route.get("dispatched") and route["intent"] == FAREWELL:
         return "continue"
+    return "conversational"
 
-    if getattr(last, "tool_calls", None):
-        return "tools"
-
-    try:
-        # Intentamos parsear decisión si es texto, pero priorizamos tool_calls
-        decision = RouteDecision.model_validate_json(last.content)
-        if decision.decision == "fin_conversacion":
-            return "mail"
-        else:
-            return "continue"
-    except:
-        return "continue"
-
-tool_node = ToolNode([send_email, update_database, show_calendar, search_doctors])
+# Las herramientas son síncronas: en la ejecución async del grafo el ToolNode
+# las corre en el executor de hilos, sin bloquear el event loop
+tool_node = ToolNode([send_email, update_database, show_calendar, search_doctors, suggest_specialty])
 
 builder = StateGraph(AgentState)
 
+builder.add_node("router", router_node)
+builder.add_node("farewell", farewell_node)
+builder.add_node("dispatch", dispatch_node)
 builder.add_node("conversational", conv_node) 
 builder.add_node("tools", tool_node)        
+builder.add_node("extract", extract_node)
+builder.add_node("compact", compact_node)
 
-builder.add_edge(START, "conversational")
+builder.add_edge(START, "router")
+builder.add_conditional_edges(
+    "router",
+    route_after_router,
+    {
+        "conversational": "conversational",
+        "farewell": "farewell",
+        "dispatch": "dispatch"
+    }
+)
+builder.add_conditional_edges(
+    "farewell",
+    route_after_farewell,
+    {
+        "dispatch": "dispatch",
+        "continue": "extract"
+    }
+)
+builder.add_edge("dispatch", "tools")
 
 builder.add_conditional_edges(
     "conversational",
     route_after_conv,
     {
         "tools": "tools",
-        "continue": END
+        "continue": "extract"
     }
 )
+builder.add_edge("extract", "compact")
+builder.add_edge("compact", END)
 
 # CAMBIO CLAVE: De "tools" volvemos a "conversational" para que el LLM lea el output
-builder.add_edge("tools", "conversational")
+builder.add_conditional_edges(
+    "tools",
+    route_after_tools,
+    {
+        "conversational": "conversational",
+        "continue": "extract"
+    }
+)
 
 app_graph = builder.compile(checkpointer=memory)
 
@@ -211,15 +308,15 @@ def test():
         
         state_to_use = {
             "query": user_input,
+            "messages": [HumanMessage(content=user_input)],
             # Si es la primera vez, podrías necesitar pasar patient_id si no se extrae solo
             # "patient_id": "12345" 
         }
         
         print("\n--- ⚙️ Ejecutando grafo ---")
         
-        # Ejecutamos el stream (esto hace que el agente piense y actúe)
-        for event in app_graph.stream(state_to_use, config=config):
-            pass # Solo dejamos que corra, no necesitamos capturar el evento parcial aquí
+        # Ejecutamos el grafo (los nodos son async, esto hace que el agente piense y actúe)
+        asyncio.run(app_graph.ainvoke(state_to_use, config=config))
         
         # --- AQUÍ ESTÁ LA SOLUCIÓN ---
         # Pedimos a la memoria el estado ACTUAL COMPLETO después de toda la ejecución
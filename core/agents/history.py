@@ -0,0 +1,162 @@
+import json
+import logging
+from typing import Callable, List, Optional, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Tokens fijos que agrega el formato de chat por cada mensaje
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_token_counter: Optional[Callable[[str], int]] = None
+
+def _default_token_counter() -> Callable[[str], int]:
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(settings.HISTORY_TOKEN_ENCODING)
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        logger.warning(f"tiktoken no disponible ({e}), estimando tokens por caracteres")
+        return lambda text: len(text) // 4 + 1
+
+def set_token_counter(counter: Callable[[str], int]) -> None:
+    """
+    Reemplaza la función que cuenta tokens de un texto (por ejemplo con el
+    tokenizer exacto del modelo en uso). El presupuesto se aplica con ella.
+    """
+    global _token_counter
+    _token_counter = counter
+
+def count_tokens(text: str) -> int:
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = _default_token_counter()
+    return _token_counter(text) if text else 0
+
+def message_tokens(message: BaseMessage) -> int:
+    """Tokens de un mensaje tal como se envía al modelo (contenido + tool_calls)"""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        tokens += count_tokens(json.dumps(message.tool_calls, ensure_ascii=False))
+    return tokens
+
+def messages_tokens(messages: List[BaseMessage]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+def render_transcript(messages: List[BaseMessage]) -> str:
+    """
+    Renderiza los mensajes como "Paciente: ..." / "CuraAI: ...". Los tool_calls
+    se reducen al nombre de la herramienta y los payloads de las respuestas de
+    herramientas se descartan.
+    """
+    lines = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage):
+            lines.append(f"Paciente: {msg.text}")
+        elif isinstance(msg, AIMessage):
+            if msg.text:
+                lines.append(f"CuraAI: {msg.text}")
+            for call in msg.tool_calls or []:
+                lines.append(f"CuraAI usó la herramienta {call['name']}")
+    return "\n".join(lines)
+
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """
+    Agrupa el historial en turnos que empiezan en un HumanMessage. Un tool_call
+    y sus ToolMessage quedan siempre en el mismo turno, así que cortar entre
+    turnos mantiene válidos los pares.
+    """
+    turns = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage) or not turns:
+            turns.append([msg])
+        else:
+            turns[-1].append(msg)
+    return turns
+
+def stub_tool_message(message: ToolMessage) -> ToolMessage:
+    """Reemplaza el payload de una herramienta por un stub corto (mismo id)"""
+    return ToolMessage(
+        content=f"[Resultado de {message.name or 'la herramienta'} omitido]",
+        tool_call_id=message.tool_call_id,
+        name=message.name,
+        id=message.id,
+    )
+
+def is_stub(message: BaseMessage) -> bool:
+    return isinstance(message, ToolMessage) and isinstance(message.content, str) and message.content.startswith("[Resultado de ")
+
+def _stub_turns(turns: List[List[BaseMessage]]) -> List[List[BaseMessage]]:
+    return [[stub_tool_message(m) if isinstance(m, ToolMessage) and not is_stub(m) else m for m in turn] for turn in turns]
+
+def summary_message(summary: Optional[str]) -> List[BaseMessage]:
+    if not summary:
+        return []
+    return [SystemMessage(content=f"Resumen de la conversación previa con el paciente: {summary}")]
+
+def trim_history(messages: List[BaseMessage], summary: Optional[str] = None, budget: int = None) -> List[BaseMessage]:
+    """
+    Vista del historial que se envía al LLM, dentro de `budget` tokens
+    (incluido el resumen). Los resultados de herramientas de turnos
+    anteriores al último se reducen a stubs y, si aun así no entra, se
+    descartan turnos completos desde el más viejo. El último turno se envía
+    siempre completo.
+    """
+    budget = settings.HISTORY_TOKEN_BUDGET if budget is None else budget
+    turns = split_turns(messages)
+    if not turns:
+        return summary_message(summary)
+
+    prefix = summary_message(summary)
+    used = messages_tokens(prefix) + messages_tokens(turns[-1])
+    kept = [turns[-1]]
+    for turn in reversed(_stub_turns(turns[:-1])):
+        tokens = messages_tokens(turn)
+        if used + tokens > budget:
+            break
+        kept.append(turn)
+        used += tokens
+
+    if used > budget:
+        logger.warning(f"El último turno ocupa {used} tokens, por encima del presupuesto de {budget}")
+    return prefix + [m for turn in reversed(kept) for m in turn]
+
+def plan_compaction(messages: List[BaseMessage], budget: int = None, keep_turns: int = None) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """
+    Decide qué compactar en el estado persistido. Retorna (a_resumir, stubs):
+    los mensajes de los turnos viejos que pasan al resumen y se borran del
+    historial, y los ToolMessage de turnos fuera de la ventana reciente que se
+    reemplazan por stubs. Se conservan al menos los últimos `keep_turns` turnos
+    (o menos, si no entran en el presupuesto; nunca menos de uno).
+    """
+    budget = settings.HISTORY_TOKEN_BUDGET if budget is None else budget
+    keep_turns = settings.HISTORY_KEEP_TURNS if keep_turns is None else keep_turns
+    turns = split_turns(messages)
+    if messages_tokens(messages) <= budget or len(turns) <= 1:
+        return [], []
+
+    # Ventana reciente textual: los últimos keep_turns, achicada hasta entrar
+    recent = max(1, min(keep_turns, len(turns)))
+    while recent > 1 and messages_tokens([m for turn in turns[-recent:] for m in turn]) > budget:
+        recent -= 1
+
+    # Turnos intermedios: se mantienen con stubs mientras entren en el presupuesto
+    used = messages_tokens([m for turn in turns[-recent:] for m in turn])
+    first_kept = len(turns) - recent
+    for i in range(len(turns) - recent - 1, -1, -1):
+        tokens = messages_tokens(_stub_turns([turns[i]])[0])
+        if used + tokens > budget:
+            break
+        used += tokens
+        first_kept = i
+
+    to_summarize = [m for turn in turns[:first_kept] for m in turn]
+    stubs = [
+        stub_tool_message(m)
+        for turn in turns[first_kept:len(turns) - recent]
+        for m in turn
+        if isinstance(m, ToolMessage) and not is_stub(m)
+    ]
+    return to_summarize, stubs
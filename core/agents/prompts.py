@@ -0,0 +1,110 @@
+import logging
+import threading
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+logger = logging.getLogger(__name__)
+
+# Prefijo estático del agente conversacional. Debe ser idéntico byte a byte en
+# todas las llamadas para aprovechar el cache de prefijos del proveedor: los
+# datos del paciente van en un mensaje aparte, después de este.
+CONVERSATION_INSTRUCTIONS = """Sos CuraAI, un asistente médico. Responde las consultas del paciente. Debes tener una charla amigable y empática con el paciente para obtener informacion sobre su situacion
+La respuesta debe tener como maximo tres oraciones.
+
+El objetivo de la charla es obtener informacion relevante sobre la salud del paciente y su situación clínica. Tenes que ir consultando cosas al paciente y repreguntar para profundizar
+en los temas que el paciente menciona. No debes ofrecer un diagnóstico ni recomendar medicamentos. No debes ofrecer enviar un mail al medico a menos que el paciente se despida.
+
+Los datos del paciente llegan en el mensaje siguiente, bajo "Informacion del paciente".
+
+IMPORTANTE: Si el paciente se despide (dice 'gracias', 'chau', 'nos vemos', etc),
+debes responder calurosamente Y LUEGO invocar la herramienta send_email_tool
+con los datos que tengas del paciente y el ID del medico que eligio, si eligio uno. No debes hacer un diagnostico sobre los sintomas del paciente
+ni recomendar medicamentos.
+
+Si el paciente quiere buscar medicos, utiliza la herramienta 'search_doctors' pasandole como argumentos la especialidad y la ubicacion. Ejemplo: search_doctors('Cardiologo', 'Mendoza, Argentina')
+Con la informacion que devuelve la herramienta 'search_doctors' tenes que generar una respuesta para ofrecerle al paciente los distintos medicos. NO debes leerle los IDs ni ofrecer enlaces
+IMPORTANTE: SOLO debes ofrecer los médicos que devuelve la herramienta search_doctors. NUNCA inventes médicos. Si ya ejecutaste la herramienta y recibiste resultados, úsalos. NO debes inventar nombres de médicos ni especialidades que no vinieron de la herramienta.
+Cada medico que devuelve la herramienta tiene un ID: recordá el ID del medico que elige el paciente
+NO debes ofrecer medicos sin usar la herramienta 'search_doctors'. No debes responder sin usar los medicos que te da la herramienta.
+Si el paciente describe sintomas y no sabe a que especialista ir, utiliza la herramienta 'suggest_specialty' con los sintomas y busca medicos de la especialidad que devuelve.
+
+si el paciente te lo pide podes utilizar la herramienta 'update_database' para actualizar su informacion en la base de datos. Le tenes que pasar como argumentos
+el id del paciente, el campo a actualizar y el nuevo valor. Utiliza los siguientes nombres de campos: nombre, apellido, sexo, obra_social, fecha_de_nacimiento
+
+Si el paciente menciona que quiere agendar una cita, utiliza la herramienta 'show_calendar' con el ID del medico seleccionado para mostrarle las fechas disponibles."""
+
+PATIENT_PROFILE_TEMPLATE = """Informacion del paciente:
+- Nombre: {name}
+- Apellido: {surname}
+- Sexo biológico: {sex}
+- ID del paciente: {patient_id}"""
+
+EXTRACTION_INSTRUCTIONS = """Eres un extractor de información de pacientes. Tenes que leer los mensajes nuevos de la conversacion y extraer los siguientes datos si estan presentes:
+- name: Nombre del paciente
+- surname: Apellido del paciente
+- sex: Sexo biológico (masculino/femenino/otro)
+- birthday: Fecha de nacimiento (formato YYYY-MM-DD)
+- med_insurance: Obra social o seguro médico
+- resume: Resumen de síntomas o situación clínica. Solo lo nuevo, sin repetir el resumen conocido
+Los datos ya conocidos llegan en el mensaje siguiente y la conversación nueva en el último."""
+
+SUMMARY_INSTRUCTIONS = """Actualizá el resumen de una consulta entre CuraAI (asistente médico) y un paciente.
+Conservá síntomas, antecedentes, datos personales, médicos ofrecidos o elegidos y acuerdos.
+Respondé solo con el resumen actualizado, en pocas oraciones."""
+
+# Despedidas que el grafo responde sin llamar al LLM (ver core/agents/router.py)
+FAREWELL_REPLY = "¡Gracias por tu consulta! Le envío tu información al médico para que pueda revisarla. Que te mejores."
+FAREWELL_REPLY_EMAIL_SENT = "¡Gracias por tu consulta! El médico ya tiene tu información. Que te mejores."
+
+# Los mensajes estáticos se pasan como objetos para que no se interpreten como template
+conversation_prompt = ChatPromptTemplate.from_messages([
+    SystemMessage(content=CONVERSATION_INSTRUCTIONS),
+    ("system", PATIENT_PROFILE_TEMPLATE),
+    MessagesPlaceholder("history"),
+])
+
+extraction_prompt = ChatPromptTemplate.from_messages([
+    SystemMessage(content=EXTRACTION_INSTRUCTIONS),
+    ("system", "Datos ya conocidos:\n{known}"),
+    ("human", "{transcript}"),
+])
+
+summary_prompt = ChatPromptTemplate.from_messages([
+    SystemMessage(content=SUMMARY_INSTRUCTIONS),
+    ("system", "Resumen previo: {summary}"),
+    ("human", "{transcript}"),
+])
+
+class PromptCacheStats:
+    """Tokens de entrada y tokens servidos desde el cache de prefijos, por tipo de llamada"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def record(self, call: str, message) -> None:
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return
+        input_tokens = usage.get("input_tokens", 0)
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        with self._lock:
+            stats = self._calls.setdefault(call, {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "cache_hits": 0})
+            stats["calls"] += 1
+            stats["input_tokens"] += input_tokens
+            stats["cached_tokens"] += cached
+            stats["cache_hits"] += 1 if cached else 0
+        logger.info(f"{call}: {input_tokens} tokens de entrada, {cached} desde cache")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                call: {
+                    **stats,
+                    "cached_ratio": stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0,
+                }
+                for call, stats in self._calls.items()
+            }
+
+# Instancia global compartida por los nodos del grafo
+prompt_cache_stats = PromptCacheStats()
@@ -0,0 +1,275 @@
+"""
+Pre-router local de intenciones.
+
+Clasifica el mensaje del paciente con reglas (y un clasificador opcional
+registrado con set_intent_classifier) antes del nodo conversacional. Con
+confianza suficiente el grafo despacha la herramienta directamente, sin la
+llamada al LLM que solo decidiría invocarla:
+
+    farewell        despedida -> send_email con los datos del estado
+    search_doctors  búsqueda de médicos -> search_doctors(especialidad, ubicación)
+
+Las predicciones que no se despachan se comparan al final del turno con las
+herramientas que el LLM realmente llamó, y la precisión por intención y por
+rango de confianza se expone en /metrics para ajustar ROUTER_MIN_CONFIDENCE.
+"""
+import logging
+import random
+import re
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from app.config.settings import settings
+from core.knowledge import match_specialty, normalize_text
+
+logger = logging.getLogger(__name__)
+
+FAREWELL = "farewell"
+SEARCH_DOCTORS = "search_doctors"
+
+# Herramienta que confirma cada intención cuando la llama el LLM
+INTENT_TOOLS = {FAREWELL: "send_email", SEARCH_DOCTORS: "search_doctors"}
+
+# Prefijo de los ids de los mensajes que arma el router (no cuentan como decisión del LLM)
+ROUTER_MESSAGE_PREFIX = "router-"
+
+_FAREWELL_MARKERS = re.compile(r"\b(chau|chao|adios|nos vemos|hasta luego|hasta pronto|hasta manana|me despido)\b")
+_THANKS = re.compile(r"\b(gracias|muchas gracias)\b")
+# Palabras que pueden acompañar a una despedida sin agregar otro pedido
+_FAREWELL_VOCABULARY = {
+    "chau", "chao", "adios", "nos", "vemos", "hasta", "luego", "pronto", "manana",
+    "me", "despido", "gracias", "muchas", "muchisimas", "mil", "por", "todo", "tu", "su",
+    "la", "ayuda", "bueno", "buenas", "listo", "ok", "dale", "perfecto", "genial",
+    "saludos", "que", "tengas", "tenga", "buen", "buena", "dia", "tarde", "noches",
+    "noche", "eso", "es", "seria", "era", "nada", "mas", "si", "no", "y", "muy", "amable",
+}
+_SEARCH_VERBS = re.compile(r"\b(busc\w*|necesit\w*|quier\w*|quisier\w*|recomend\w*|conoc\w*|hay|tenes|tienen|pasame|pasar)\b")
+_DOCTOR_WORDS = re.compile(r"\b(medic[oa]s?|doctor\w*|especialista\w*|profesional\w*|turno)\b")
+# Ubicación: lo que sigue a "en" / "cerca de" / "por", leído palabra por palabra (ver _read_location)
+_LOCATION_TRIGGER = re.compile(r"\b(?:en|cerca de|por)\s+")
+_LOCATION_TOKEN = re.compile(r"[A-Za-zÁÉÍÓÚÑáéíóúñü]+|[^\sA-Za-zÁÉÍÓÚÑáéíóúñü]")
+# Conectores dentro de un nombre de lugar ("San Miguel de Tucumán", "Mar del Plata")
+_LOCATION_CONNECTORS = {"de", "del", "la", "las", "los", "el"}
+# Palabras que terminan la ubicación: lo que sigue ya es otro pedido
+_LOCATION_STOPWORDS = {
+    "por", "que", "y", "e", "o", "u", "gracias", "para", "con", "sin", "porque", "pero", "si", "a", "al",
+    "cerca", "donde", "cuando", "como", "urgente", "hoy", "manana", "ya", "ahora", "favor", "quiero",
+    "necesito", "busco", "atienda", "atiende", "mas",
+}
+MAX_LOCATION_WORDS = 4
+_NOT_LOCATIONS = {"mi", "la zona", "zona", "general", "lo posible", "persona", "linea", "online", "favor"}
+
+@dataclass
+class Intent:
+    """Intención detectada en un mensaje, con los argumentos de la herramienta"""
+    intent: str
+    confidence: float
+    args: Dict[str, str] = field(default_factory=dict)
+    source: str = "reglas"
+
+IntentClassifier = Callable[[str], Optional[Intent]]
+
+_classifier: Optional[IntentClassifier] = None
+
+def set_intent_classifier(classifier: Optional[IntentClassifier]) -> None:
+    """
+    Registra un clasificador local (p. ej. un modelo chico en CPU) que se
+    consulta junto con las reglas; gana la predicción de mayor confianza.
+    """
+    global _classifier
+    _classifier = classifier
+
+def _farewell_intent(text: str) -> Optional[Intent]:
+    normalized = normalize_text(text)
+    if not normalized:
+        return None
+    words = normalized.split()
+    only_farewell = all(word in _FAREWELL_VOCABULARY for word in words)
+    if _FAREWELL_MARKERS.search(normalized):
+        return Intent(FAREWELL, 0.95 if only_farewell else 0.6)
+    if _THANKS.search(normalized) and only_farewell:
+        # "Gracias" suelto también se dice a mitad de la consulta
+        return Intent(FAREWELL, 0.7)
+    return None
+
+def _read_location(text: str) -> Optional[str]:
+    """
+    Nombre de lugar al comienzo del texto. Corta en la primera palabra vacía,
+    en la puntuación y, si el lugar empieza con mayúscula, en la primera
+    palabra en minúscula; después de una coma solo sigue con otra palabra en
+    mayúscula ("Godoy Cruz, Mendoza" sí, "Rosario, gracias" no).
+    """
+    start = end = None
+    words = 0
+    capitalized = False
+    after_comma = False
+    for token in _LOCATION_TOKEN.finditer(text):
+        value = token.group()
+        if not value[0].isalpha():
+            if value == "," and words and not after_comma:
+                after_comma = True
+                continue
+            break
+        lowered = normalize_text(value)
+        if lowered in _LOCATION_STOPWORDS:
+            break
+        if lowered in _LOCATION_CONNECTORS:
+            # Solo forma parte del lugar si le sigue otra palabra del nombre
+            if start is None:
+                start = token.start()
+            continue
+        if words:
+            if (capitalized or after_comma) and not value[0].isupper():
+                break
+            if words == MAX_LOCATION_WORDS:
+                break
+        else:
+            capitalized = value[0].isupper()
+            start = token.start() if start is None else start
+        end = token.end()
+        words += 1
+        after_comma = False
+    return text[start:end] if words else None
+
+def _extract_location(text: str) -> Optional[str]:
+    for match in _LOCATION_TRIGGER.finditer(text):
+        location = _read_location(text[match.end():])
+        if location and normalize_text(location) not in _NOT_LOCATIONS and match_specialty(location) is None:
+            return location
+    return None
+
+def _search_intent(text: str) -> Optional[Intent]:
+    normalized = normalize_text(text)
+    # Solo especialidades nombradas: derivar por síntomas lo decide el LLM (suggest_specialty)
+    specialty = match_specialty(text)
+    if specialty is None:
+        return None
+    name, term = specialty
+    asks = bool(_SEARCH_VERBS.search(normalized))
+    if not asks and not _DOCTOR_WORDS.search(normalized):
+        return None
+    location = _extract_location(text)
+    confidence = 0.9 if asks else 0.75
+    if location is None:
+        confidence = min(confidence, 0.6)
+    elif location[0].islower():
+        confidence -= 0.1
+    return Intent(SEARCH_DOCTORS, round(confidence, 2), {"speciality": name, "location": location or ""})
+
+def classify_intent(text: str) -> Optional[Intent]:
+    """Intención más probable del mensaje, o None si no hay ninguna"""
+    candidates = [intent for intent in (_search_intent(text), _farewell_intent(text)) if intent]
+    if _classifier is not None:
+        try:
+            predicted = _classifier(text)
+            if predicted is not None:
+                candidates.append(predicted)
+        except Exception as e:
+            logger.warning(f"Error en el clasificador de intenciones: {e}")
+    return max(candidates, key=lambda intent: intent.confidence, default=None)
+
+def last_turn(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Mensajes del turno actual, desde el último mensaje del paciente"""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[i:]
+    return messages
+
+def llm_tool_calls(messages: List[BaseMessage]) -> List[str]:
+    """Herramientas que el LLM (no el router) llamó en estos mensajes"""
+    return [
+        call["name"]
+        for message in messages
+        if isinstance(message, AIMessage) and not (message.id or "").startswith(ROUTER_MESSAGE_PREFIX)
+        for call in message.tool_calls
+    ]
+
+def email_sent_in(messages: List[BaseMessage]) -> bool:
+    return any(
+        isinstance(message, ToolMessage) and message.name == "send_email" and message.status != "error"
+        for message in messages
+    )
+
+def _bucket(confidence: float) -> str:
+    low = min(int(confidence * 10), 9) / 10
+    return f"{low:.1f}-{low + 0.1:.1f}"
+
+class RouterStats:
+    """
+    Predicciones del router contrastadas con lo que hizo el LLM. Solo las
+    predicciones no despachadas tienen etiqueta (el LLM decidió el turno); de
+    las despachadas se cuenta cuántas veces el LLM volvió a llamar la misma
+    herramienta en el turno, señal de que los argumentos no servían.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._intents = {}
+        self._buckets = {}
+        self._missed = {}
+
+    def record(self, route: Optional[dict], messages: List[BaseMessage]) -> None:
+        called = set(llm_tool_calls(last_turn(messages)))
+        predicted = (route or {}).get("intent")
+        with self._lock:
+            for intent, tool_name in INTENT_TOOLS.items():
+                if tool_name in called and predicted != intent:
+                    self._missed[intent] = self._missed.get(intent, 0) + 1
+            if not predicted:
+                return
+            stats = self._intents.setdefault(predicted, {
+                "predicted": 0, "dispatched": 0, "redispatched": 0, "verified": 0, "confirmed": 0
+            })
+            stats["predicted"] += 1
+            if route.get("dispatched"):
+                stats["dispatched"] += 1
+                stats["redispatched"] += 1 if INTENT_TOOLS[predicted] in called else 0
+                return
+            confirmed = INTENT_TOOLS[predicted] in called
+            stats["verified"] += 1
+            stats["confirmed"] += 1 if confirmed else 0
+            bucket = self._buckets.setdefault(_bucket(route["confidence"]), {"verified": 0, "confirmed": 0})
+            bucket["verified"] += 1
+            bucket["confirmed"] += 1 if confirmed else 0
+
+    def metrics(self) -> dict:
+        def precision(stats):
+            return stats["confirmed"] / stats["verified"] if stats["verified"] else None
+
+        with self._lock:
+            return {
+                "mode": settings.ROUTER_MODE,
+                "min_confidence": settings.ROUTER_MIN_CONFIDENCE,
+                "intents": {intent: {**stats, "precision": precision(stats)} for intent, stats in self._intents.items()},
+                "confidence_buckets": {
+                    bucket: {**stats, "precision": precision(stats)} for bucket, stats in sorted(self._buckets.items())
+                },
+                "missed": dict(self._missed),
+            }
+
+# Instancia global compartida por los nodos del grafo
+router_stats = RouterStats()
+
+def route_message(text: str) -> Optional[dict]:
+    """
+    Decide si el turno se despacha sin pasar por el LLM. Retorna el dict que
+    se guarda en el estado como `route` (None si no hay intención).
+
+    Con ROUTER_MODE="shadow" nunca se despacha (solo se mide), y con "on" una
+    fracción ROUTER_VERIFY_RATE de las predicciones confiables también queda
+    en manos del LLM para seguir midiendo la precisión.
+    """
+    if settings.ROUTER_MODE == "off":
+        return None
+    intent = classify_intent(text)
+    if intent is None:
+        return None
+    dispatch = (
+        settings.ROUTER_MODE == "on"
+        and intent.confidence >= settings.ROUTER_MIN_CONFIDENCE
+        and random.random() >= settings.ROUTER_VERIFY_RATE
+    )
+    route = {**asdict(intent), "dispatched": dispatch}
+    logger.info(f"router: {intent.intent} ({intent.confidence:.2f}, {intent.source}) {'despachado' if dispatch else 'al LLM'}")
+    return route
@@ -0,0 +1,32 @@
+from .text import normalize_text, strip_accents, tokenize, word_stem
+from .derivation import (
+    DerivationArea,
+    parse_derivation_guide,
+    load_derivation_guide,
+    specialty_terms,
+    match_specialty
+)
+from .referral import (
+    Referral,
+    DerivationIndex,
+    get_derivation_index,
+    suggest_specialties,
+    format_referrals
+)
+
+__all__ = [
+    "normalize_text",
+    "strip_accents",
+    "tokenize",
+    "word_stem",
+    "DerivationArea",
+    "parse_derivation_guide",
+    "load_derivation_guide",
+    "specialty_terms",
+    "match_specialty",
+    "Referral",
+    "DerivationIndex",
+    "get_derivation_index",
+    "suggest_specialties",
+    "format_referrals"
+]
@@ -0,0 +1,111 @@
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from app.config.settings import settings
+from .text import normalize_text, tokenize
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_AREA_LINE = re.compile(r"^([^\-].*):\s*$")
+_LIST_LINE = re.compile(r"^-\s*(Especialidades|Patologías|Patologias)\s*:\s*(.+)$", re.IGNORECASE)
+
+# Formas en que los pacientes nombran a los especialistas y que no salen de
+# las reglas de derivación de palabras (-logía -> -logo, -iatría -> -iatra)
+SPECIALTY_SYNONYMS = {
+    "dentista": "Odontología",
+    "odontologo": "Odontología",
+    "clinico": "Clínica médica",
+    "medico clinico": "Clínica médica",
+    "medico de cabecera": "Clínica médica",
+    "medico general": "Clínica médica",
+    "obstetra": "Obstetricia",
+    "otorrino": "Otorrinolaringología",
+    "nutricionista": "Nutrición",
+    "kinesiologo": "Kinesiología",
+    "kinesio": "Kinesiología",
+    "traumato": "Traumatología",
+    "gastro": "Gastroenterología",
+    "psicologo": "Psicología",
+    "ginecologo": "Ginecología",
+    "alergista": "Alergología",
+}
+
+@dataclass
+class DerivationArea:
+    """Un área de la guía de derivación con sus especialidades y patologías"""
+    name: str
+    specialties: List[str] = field(default_factory=list)
+    pathologies: List[str] = field(default_factory=list)
+
+def parse_derivation_guide(text: str) -> List[DerivationArea]:
+    """Parsea el formato de doctors_derivation.txt (ÁREA: / - Especialidades: / - Patologías:)"""
+    areas = []
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        list_match = _LIST_LINE.match(line)
+        if list_match and areas:
+            items = [item.strip() for item in list_match.group(2).split(",") if item.strip()]
+            if list_match.group(1).lower().startswith("especialidad"):
+                areas[-1].specialties.extend(items)
+            else:
+                areas[-1].pathologies.extend(items)
+            continue
+        area_match = _AREA_LINE.match(line)
+        if area_match:
+            areas.append(DerivationArea(name=area_match.group(1).strip()))
+    return [area for area in areas if area.specialties]
+
+def resolve_guide_path(path: str = None) -> str:
+    path = path or settings.DERIVATION_GUIDE_PATH
+    return path if os.path.isabs(path) else os.path.join(_PROJECT_ROOT, path)
+
+@lru_cache(maxsize=4)
+def load_derivation_guide(path: str = None) -> Tuple[DerivationArea, ...]:
+    """Lee y parsea la guía una sola vez por proceso"""
+    with open(resolve_guide_path(path), "r", encoding="utf-8") as f:
+        return tuple(parse_derivation_guide(f.read()))
+
+def specialist_forms(specialty: str) -> List[str]:
+    """Nombres normalizados de una especialidad y de quien la ejerce"""
+    base = normalize_text(specialty)
+    forms = {base}
+    if base.endswith("logia"):
+        forms |= {base[:-5] + "logo", base[:-5] + "loga", base[:-5] + "logos"}
+    elif base.endswith("iatria"):
+        forms |= {base[:-6] + "iatra"}
+    return sorted(forms)
+
+@lru_cache(maxsize=4)
+def specialty_terms(path: str = None) -> Dict[str, str]:
+    """
+    Términos normalizados con los que se nombra una especialidad o a quien la
+    ejerce -> especialidad canónica de la guía. Las patologías no están acá:
+    la derivación por síntomas la resuelve el índice de core.knowledge.referral.
+    """
+    terms = {}
+    for area in load_derivation_guide(path):
+        for specialty in area.specialties:
+            for form in specialist_forms(specialty):
+                terms[form] = specialty
+    specialties = {s for area in load_derivation_guide(path) for s in area.specialties}
+    for synonym, specialty in SPECIALTY_SYNONYMS.items():
+        if specialty in specialties:
+            terms[synonym] = specialty
+    return terms
+
+def match_specialty(text: str, max_words: int = 5) -> Optional[Tuple[str, str]]:
+    """
+    Busca en el texto la mención más larga de una especialidad o especialista
+    de la guía. Retorna (especialidad, término) o None.
+    """
+    words = tokenize(text)
+    terms = specialty_terms()
+    for size in range(min(max_words, len(words)), 0, -1):
+        for start in range(len(words) - size + 1):
+            candidate = " ".join(words[start:start + size])
+            if candidate in terms:
+                return terms[candidate], candidate
+    return None
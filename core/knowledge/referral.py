@@ -0,0 +1,144 @@
+"""
+Índice invertido de la guía de derivación: síntomas y patologías -> especialidades.
+
+La guía se compila una vez por proceso. Cada patología de cada área es una
+entrada indexada por las raíces de sus palabras (sin tildes, sin ñ, sin
+números ni palabras vacías). Una consulta puntúa las entradas por la
+fracción de su peso (IDF) que aparece en el texto, así "dolor de cabeza"
+encuentra "Dolor de cabeza frecuente" aunque no esté la frase completa. El
+agente consulta el índice con una herramienta en lugar de recibir la guía
+entera en el prompt.
+"""
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Set, Tuple
+from .derivation import load_derivation_guide
+from .text import normalize_text, tokenize, word_stem
+
+# Palabras de las patologías que no distinguen una de otra
+_STOPWORDS = {"de", "del", "la", "el", "los", "las", "en", "por", "a", "al", "y", "e", "o", "sin", "con", "tipo"}
+
+# Fracción mínima del peso de una patología que tiene que aparecer en la consulta
+MIN_COVERAGE = 0.5
+
+# Formas en que los pacientes describen algunas patologías de la guía
+PATIENT_TERMS = {
+    "presion alta": "Hipertensión arterial",
+    "dolor de pecho": "Dolor torácico",
+    "dolor en el pecho": "Dolor torácico",
+    "dolor de panza": "Dolor abdominal",
+    "dolor de estomago": "Dolor abdominal",
+    "dolor de espalda": "Lumbalgia",
+    "dolor de cintura": "Lumbalgia",
+    "dolor de cuello": "Dolor cervical",
+    "dolor de muela": "Infección dental",
+    "dolor de muelas": "Infección dental",
+    "me duele la cabeza": "Dolor de cabeza frecuente",
+    "acidez": "Reflujo gastroesofágico",
+    "no puedo dormir": "Insomnio",
+    "mareo": "Mareos por esfuerzo",
+    "mareos": "Mareos por esfuerzo",
+    "me desmaye": "Desmayo",
+    "granos": "Acné severo",
+    "caida del pelo": "Alopecia",
+    "me zumban los oidos": "Zumbidos en los oídos",
+}
+
+def _key(word: str) -> str:
+    return word_stem(word).replace("ñ", "n")
+
+def _keys(text: str) -> List[str]:
+    # Los números ("Diabetes tipo 1", "Covid-19") no los dice el paciente
+    return [_key(word) for word in tokenize(text) if word not in _STOPWORDS and not word.isdigit()]
+
+@dataclass
+class Referral:
+    """Especialidad sugerida con las patologías de la guía que la justifican"""
+    specialty: str
+    score: float
+    pathologies: List[str] = field(default_factory=list)
+
+class DerivationIndex:
+    """Índice invertido raíz -> patologías de la guía, con sus especialidades"""
+
+    def __init__(self, areas):
+        # Una entrada por (área, patología): la misma patología puede derivar distinto según el área
+        self._entries: List[Tuple[str, Tuple[str, ...]]] = []
+        self._entry_keys: List[Set[str]] = []
+        self._by_name: Dict[str, List[int]] = defaultdict(list)
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for area in areas:
+            for pathology in area.pathologies:
+                entry_id = len(self._entries)
+                keys = set(_keys(pathology))
+                self._entries.append((pathology, tuple(area.specialties)))
+                self._entry_keys.append(keys)
+                self._by_name[normalize_text(pathology)].append(entry_id)
+                for key in keys:
+                    self._postings[key].append(entry_id)
+        total = len(self._entries) or 1
+        self._idf = {key: math.log(1 + total / len(ids)) for key, ids in self._postings.items()}
+        self._weights = [sum(self._idf[key] for key in keys) for keys in self._entry_keys]
+        self._phrases = {
+            normalize_text(term): self._by_name[normalize_text(pathology)]
+            for term, pathology in PATIENT_TERMS.items()
+            if normalize_text(pathology) in self._by_name
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _scores(self, text: str) -> Dict[int, float]:
+        """Puntaje de cada entrada que alcanza MIN_COVERAGE (1.0 si la frase aparece completa)"""
+        keys = set(_keys(text))
+        matched: Dict[int, float] = defaultdict(float)
+        for key in keys:
+            for entry_id in self._postings.get(key, ()):
+                matched[entry_id] += self._idf[key]
+        scores = {
+            entry_id: weight / self._weights[entry_id]
+            for entry_id, weight in matched.items()
+            if self._weights[entry_id] and weight / self._weights[entry_id] >= MIN_COVERAGE
+        }
+        padded = f" {normalize_text(text)} "
+        for phrase, entry_ids in self._phrases.items():
+            if f" {phrase} " in padded:
+                for entry_id in entry_ids:
+                    scores[entry_id] = 1.0
+        return scores
+
+    def lookup(self, text: str, limit: int = 3) -> List[Referral]:
+        """
+        Especialidades sugeridas para los síntomas del texto, de la más a la
+        menos respaldada. Entre patologías igual de cubiertas gana la primera
+        especialidad de su área, que es la derivación principal de la guía.
+        """
+        ranked: Dict[str, list] = {}
+        for entry_id, score in self._scores(text).items():
+            pathology, specialties = self._entries[entry_id]
+            for position, specialty in enumerate(specialties):
+                current = ranked.setdefault(specialty, [0.0, len(specialties), []])
+                current[0] = max(current[0], score)
+                current[1] = min(current[1], position)
+                if pathology not in current[2]:
+                    current[2].append(pathology)
+        order = sorted(ranked.items(), key=lambda item: (-item[1][0], item[1][1], -len(item[1][2]), item[0]))
+        return [Referral(specialty, round(score, 2), pathologies) for specialty, (score, _, pathologies) in order[:limit]]
+
+@lru_cache(maxsize=4)
+def get_derivation_index(path: str = None) -> DerivationIndex:
+    """Índice compilado de la guía, uno por proceso"""
+    return DerivationIndex(load_derivation_guide(path))
+
+def suggest_specialties(text: str, limit: int = 3) -> List[Referral]:
+    return get_derivation_index().lookup(text, limit)
+
+def format_referrals(referrals: List[Referral]) -> str:
+    """Una línea por especialidad, con las patologías de la guía que coinciden"""
+    if not referrals:
+        return "No se encontró una derivación en la guía para esos síntomas."
+    lines = ["Derivación sugerida según la guía:"]
+    lines.extend(f"- {r.specialty} ({', '.join(r.pathologies)})" for r in referrals)
+    return "\n".join(lines)
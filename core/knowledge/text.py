@@ -0,0 +1,27 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+_NON_WORD = re.compile(r"[^a-z0-9ñ]+")
+# Terminaciones que cambian entre especialidad y especialista (cardiología /
+# cardiólogo), género y número (renal / renales)
+_VARIABLE_ENDING = re.compile(r"(ias|ia|os|as|o|a|es|e)$")
+
+def strip_accents(text: str) -> str:
+    """Quita tildes y diéresis conservando la ñ"""
+    decomposed = unicodedata.normalize("NFD", text.replace("ñ", "\0").replace("Ñ", "\1"))
+    stripped = "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+    return stripped.replace("\0", "ñ").replace("\1", "Ñ")
+
+@lru_cache(maxsize=8192)
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin tildes y con la puntuación reducida a espacios simples"""
+    return _NON_WORD.sub(" ", strip_accents(text or "").lower()).strip()
+
+def tokenize(text: str) -> list:
+    normalized = normalize_text(text)
+    return normalized.split() if normalized else []
+
+def word_stem(word: str) -> str:
+    stem = _VARIABLE_ENDING.sub("", word)
+    return stem if len(stem) >= 3 else word
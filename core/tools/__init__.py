@@ -1,18 +1,22 @@
 from .agent_tools import (
     create_event_tool,
     get_events_tool,
+    find_free_slots_tool,
     send_email,
     update_database,
     show_calendar, 
-    search_doctors
+    search_doctors,
+    suggest_specialty
 )
 
 __all__ = [
     "create_event_tool",
     "get_events_tool",
+    "find_free_slots_tool",
     "send_email",
     "update_database",
     "search_doctors",
-    "show_calendar"
+    "show_calendar",
+    "suggest_specialty"
 ]
 
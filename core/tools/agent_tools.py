@@ -1,18 +1,16 @@
 from langchain_core.tools import tool
-from infrastructure.google import create_event, get_events
+from infrastructure.google import create_event, get_events, free_slots, format_slots
 from app.config.settings import settings
-import smtplib
+from infrastructure.storage import get_supabase
+from infrastructure.email import get_outbox
 import json
+from typing import Optional
+from core.tools.doctor_search import ilike_pattern, rank_doctors, format_doctors, doctor_records, doctor_name
+from core.tools.doctor_directory import doctor_directory
+from core.knowledge import suggest_specialties, format_referrals
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-try:
-    from supabase import create_client
-except ImportError:
-    # Si supabase no está instalado, creamos una función stub
-    def create_client(*args, **kwargs):
-        raise ImportError("Supabase dependencies not installed. Install supabase package.")
-
 @tool
 def create_event_tool(title: str, description: str, start_time: str, end_time: str) -> str:
     """Create a Google Calendar event.
@@ -45,7 +43,26 @@ def get_events_tool(time_min: str, time_max: str) -> str:
     return events
 
 @tool
-def send_email(name: str, surname: str, sex: str, birthday: str, resume: str, med_ins: str) -> str:
+def find_free_slots_tool(date_from: str, date_to: str, duration_minutes: int = 60, max_slots: int = 5) -> str:
+    """Busca los primeros turnos libres del médico dentro de su horario de atención.
+    
+    Args:
+        date_from: Desde cuándo buscar, fecha o fecha y hora ISO (e.g., "2024-01-15" o "2024-01-15T14:00:00-03:00")
+        date_to: Hasta cuándo buscar, fecha (incluye el día completo) o fecha y hora ISO
+        duration_minutes: Duración del turno en minutos
+        max_slots: Cantidad máxima de turnos a devolver
+    
+    Returns:
+        Un turno libre por línea, con el inicio y el fin en ISO para crear el evento
+    """
+    try:
+        slots = free_slots(date_from, date_to, duration_minutes=duration_minutes, limit=max_slots)
+    except Exception as e:
+        return f"Error al buscar turnos libres: {e}"
+    return format_slots(slots)
+
+@tool
+def send_email(name: str, surname: str, sex: str, birthday: str, resume: str, med_ins: str, doctor_id: str = "") -> str:
     """Envía un correo electrónico al doctor con la información del paciente.
     
     Args:
@@ -55,9 +72,10 @@ def send_email(name: str, surname: str, sex: str, birthday: str, resume: str, me
         birthday: Fecha de nacimiento del paciente
         resume: Resumen de la situación clínica del paciente
         med_ins: Cobertura médica u obra social del paciente
+        doctor_id: ID del médico que eligió el paciente, tal como lo devolvió search_doctors (vacío si no eligió)
     
     Returns:
-        Mensaje de confirmación indicando que el correo fue enviado exitosamente
+        Mensaje de confirmación indicando que el correo quedó encolado para el envío
     
     Raises:
         ValueError: Si las credenciales de correo no están configuradas en las variables de entorno
@@ -69,6 +87,9 @@ def send_email(name: str, surname: str, sex: str, birthday: str, resume: str, me
     if not all([sender_email, password, receiver_email]):
         raise ValueError("Email credentials not configured. Please set EMAIL_SENDER, EMAIL_PASSWORD, and EMAIL_RECEIVER environment variables.")
     
+    doctor = _doctor_line(doctor_id.strip()) if doctor_id and doctor_id.strip() else ""
+    doctor_html = f'<p style="color: white;">Médico elegido: {doctor}</p>' if doctor else ""
+
     msg = MIMEMultipart("alternative")
     msg["Subject"] = "Información de paciente - CuraAI 🤖"
     msg["From"] = sender_email
@@ -86,6 +107,7 @@ def send_email(name: str, surname: str, sex: str, birthday: str, resume: str, me
         <p style="color: white;">Cobertura médica: {med_ins}</p>
         <p style="color: white;">Sexo: {sex}</p>
         <p style="color: white;">Resumen de la situación del paciente: {resume}</p>
+        {doctor_html}
         </div>
     </body>
     </html>
@@ -94,20 +116,58 @@ def send_email(name: str, surname: str, sex: str, birthday: str, resume: str, me
     msg.attach(MIMEText(text, "plain"))
     msg.attach(MIMEText(html, "html"))
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login(sender_email, password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
+    # El envío lo hace el sender de la bandeja de salida: el turno no espera a SMTP
+    message_id = get_outbox().enqueue(msg, sender_email, [receiver_email])
+    print(f"Correo {message_id} encolado para {receiver_email}")
+
+    return "Correo con la información del paciente encolado para el doctor."
+
+def _doctor_record(doctor_id: str) -> Optional[dict]:
+    """Registro del médico: primero el guardado por search_doctors o el directorio, si no de la base"""
+    record = doctor_records.get(doctor_id) or doctor_directory.get(doctor_id)
+    if record is None:
+        client = get_supabase()
+        res = client.table("DoctorsData").select(settings.DOCTORS_SELECT_COLUMNS).eq("id", doctor_id).limit(1).execute()
+        if not res.data:
+            return None
+        doctor_records.put_many(res.data)
+        record = res.data[0]
+    return record
 
-    return "Correo enviado exitosamente al doctor."
+def _doctor_line(doctor_id: str) -> str:
+    """Médico elegido para el correo; si no se puede resolver, al menos su ID"""
+    try:
+        record = _doctor_record(doctor_id)
+    except Exception as e:
+        print(f"No se pudo resolver el médico {doctor_id}: {e}")
+        record = None
+    if record is None:
+        return f"ID {doctor_id}"
+    details = ", ".join(str(record[key]) for key in ("speciality", "location") if record.get(key))
+    line = f"{doctor_name(record)} ({details})" if details else doctor_name(record)
+    return f"{line} - {record['calendly_url']}" if record.get("calendly_url") else line
 
 @tool()
-def show_calendar(link) -> str:
+def show_calendar(doctor_id: str) -> str:
     """ 
-    Muestra el calendario al paciente.
+    Muestra el calendario del médico elegido al paciente.
+    Args:
+        doctor_id: ID del médico, tal como lo devolvió search_doctors
     Returns:
         JSON string con la configuración.
     """
-    return f'{{"action": "open_calendar", "date": "today", "url": "{link}"}}'
+    # Compatibilidad con historiales en los que el LLM pasaba el enlace directo
+    if str(doctor_id).startswith("http"):
+        url = doctor_id
+    else:
+        try:
+            record = _doctor_record(doctor_id)
+        except Exception as e:
+            return f"Error al buscar el calendario del médico: {e}"
+        url = record.get("calendly_url") if record else None
+        if not url:
+            return f"No se encontró el calendario del médico con ID {doctor_id}."
+    return json.dumps({"action": "open_calendar", "date": "today", "url": url})
 
 @tool
 def update_database(patient_id: str, field: str, value: str) -> str:
@@ -121,7 +181,7 @@ def update_database(patient_id: str, field: str, value: str) -> str:
         Mensaje de confirmación indicando que la base de datos fue actualizada exitosamente
     """
     try:
-        client = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
+        client = get_supabase()
         data = {field: value}      
         res = client.table("UsersData").update(data).eq("user_id", patient_id).execute()
         return f"Base de datos actualizada: {field} establecido a {value} para paciente {patient_id}."    
@@ -137,32 +197,48 @@ def search_doctors(speciality: str, location: str) -> str:
         location: Ubicación geográfica (e.g., "Buenos Aires", "CABA")
     
     Returns:
-        Lista de médicos que coinciden con los criterios de búsqueda en formato JSON string
+        Los médicos que mejor coinciden, uno por línea con su ID
     """
     try:
-        client = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-        
-        # Usar filtros más flexibles en lugar de match exacto
-        query = client.table("DoctorsData").select("*")
-        
-        # Filtrar por especialidad (case-insensitive, búsqueda parcial)
-        if speciality:
-            query = query.ilike("speciality", f"%{speciality}%")
-        
-        # Filtrar por ubicación (case-insensitive, búsqueda parcial)
-        if location:
-            query = query.ilike("location", f"%{location}%")
-        
-        res = query.execute()
-        print(f"Resultados de búsqueda de médicos: {res.data}")
-        
-        # Convertir a JSON string para que LangChain pueda procesarlo correctamente
-        if res.data:
-            return json.dumps(res.data, ensure_ascii=False)
+        if doctor_directory.ready:
+            # Snapshot local indexado: sin ida y vuelta a la base
+            top, total = doctor_directory.search(speciality, location)
         else:
-            return json.dumps([])
+            client = get_supabase()
+            
+            # Solo las columnas necesarias; el ranking fino se hace acá
+            query = client.table("DoctorsData").select(settings.DOCTORS_SELECT_COLUMNS)
+            
+            # Filtrar por especialidad (case-insensitive, tolerante a tildes y a cardiología/cardiólogo)
+            if speciality:
+                query = query.ilike("speciality", ilike_pattern(speciality))
+            
+            # Filtrar por ubicación (case-insensitive, búsqueda parcial)
+            if location:
+                query = query.ilike("location", ilike_pattern(location))
+            
+            res = query.limit(settings.DOCTORS_SEARCH_MAX_ROWS).execute()
+            rows = res.data or []
+            top, total = rank_doctors(rows, speciality, location), len(rows)
+        print(f"Búsqueda de médicos ({speciality}, {location}): {total} resultados, {len(top)} ofrecidos")
+        
+        # El registro completo (calendly_url incluido) queda fuera del contexto del LLM
+        doctor_records.put_many(top)
+        return format_doctors(top, total)
             
     except Exception as e:
         error_msg = f"Error al buscar médicos: {e}"
         print(error_msg)
-        return error_msg
\ No newline at end of file
+        return error_msg
+
+@tool
+def suggest_specialty(symptoms: str) -> str:
+    """Sugiere a qué especialidad derivar al paciente según sus síntomas, usando la guía de derivación.
+    
+    Args:
+        symptoms: Síntomas o patologías que mencionó el paciente (e.g., "dolor de cabeza y visión borrosa")
+    
+    Returns:
+        Las especialidades sugeridas, una por línea, con las patologías de la guía que coinciden
+    """
+    return format_referrals(suggest_specialties(symptoms))
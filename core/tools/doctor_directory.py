@@ -0,0 +1,341 @@
+"""
+Directorio local de médicos.
+
+Snapshot de DoctorsData en memoria, cargado al arrancar y refrescado en
+segundo plano, con índices sobre la especialidad y la ubicación normalizadas
+(sin tildes, en minúsculas): tokens exactos, raíces (cardiología/cardiólogo),
+prefijos y trigramas para errores de tipeo. Las especialidades se agrupan
+además por la especialidad canónica de doctors_derivation.txt, así
+"dentista" encuentra a los médicos cargados como "Odontología".
+"""
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from app.config.settings import settings
+from infrastructure.storage import get_supabase
+from core.knowledge import match_specialty, normalize_text, suggest_specialties, word_stem
+from .doctor_search import rank_doctors
+
+logger = logging.getLogger(__name__)
+
+# Similitud mínima de trigramas para aceptar una palabra mal escrita
+TRIGRAM_MIN_SIMILARITY = 0.5
+# Largo mínimo de una palabra para buscarla como prefijo
+PREFIX_MIN_LENGTH = 4
+
+def trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TokenIndex:
+    """Índice de palabras normalizadas -> ids de médicos, con búsqueda por raíz, prefijo y trigramas"""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = {}
+        self._sorted_stems: List[str] = []
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._dirty = False
+
+    def add(self, doctor_id: str, text: str) -> None:
+        for word in normalize_text(text).split():
+            stem = word_stem(word)
+            if stem not in self._postings:
+                self._postings[stem] = set()
+                for gram in trigrams(stem):
+                    self._trigrams.setdefault(gram, set()).add(stem)
+                self._dirty = True
+            self._postings[stem].add(doctor_id)
+
+    def remove(self, doctor_id: str, text: str) -> None:
+        for word in normalize_text(text).split():
+            postings = self._postings.get(word_stem(word))
+            if postings is not None:
+                postings.discard(doctor_id)
+
+    def _stems(self) -> List[str]:
+        if self._dirty:
+            self._sorted_stems = sorted(self._postings)
+            self._dirty = False
+        return self._sorted_stems
+
+    def _matching_stems(self, word: str) -> List[str]:
+        stem = word_stem(word)
+        if self._postings.get(stem):
+            return [stem]
+        stems = self._stems()
+        if len(word) >= PREFIX_MIN_LENGTH:
+            start = bisect.bisect_left(stems, stem)
+            prefixed = []
+            for candidate in stems[start:]:
+                if not candidate.startswith(stem):
+                    break
+                prefixed.append(candidate)
+            if prefixed:
+                return prefixed
+        grams = trigrams(stem)
+        counts: Dict[str, int] = {}
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        return [
+            candidate for candidate, shared in counts.items()
+            if shared / (len(grams) + len(trigrams(candidate)) - shared) >= TRIGRAM_MIN_SIMILARITY
+        ]
+
+    def lookup(self, text: str, require_all: bool = True) -> Optional[Set[str]]:
+        """
+        Ids que contienen todas las palabras del texto (o alguna, con
+        require_all=False). None si el texto no tiene palabras.
+        """
+        result = None
+        for word in normalize_text(text).split():
+            ids = set()
+            for stem in self._matching_stems(word):
+                ids |= self._postings[stem]
+            if result is None:
+                result = ids
+            else:
+                result = result & ids if require_all else result | ids
+        return result
+
+def fetch_doctor_rows(updated_since: Optional[str] = None, updated_column: Optional[str] = None) -> List[dict]:
+    """
+    Lee DoctorsData por páginas: todo, o lo modificado desde updated_since
+    inclusive (una fila escrita con el mismo timestamp que la última vista
+    también entra). Con updated_column también trae esa columna.
+    """
+    client = get_supabase()
+    if not updated_column:
+        return _fetch_pages(client, settings.DOCTORS_SELECT_COLUMNS)
+    return _fetch_pages(client, f"{settings.DOCTORS_SELECT_COLUMNS},{updated_column}", updated_column, updated_since)
+
+def _fetch_pages(client, columns: str, updated_column: str = None, updated_since: str = None) -> List[dict]:
+    page_size = settings.DOCTOR_DIRECTORY_PAGE_SIZE
+    rows, start = [], 0
+    while True:
+        query = client.table("DoctorsData").select(columns)
+        if updated_since and updated_column:
+            query = query.gte(updated_column, updated_since)
+        res = query.order("id").range(start, start + page_size - 1).execute()
+        page = res.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+class DoctorDirectory:
+    """
+    Snapshot indexado de los médicos. Una recarga completa arma los índices
+    aparte y los reemplaza de una vez; los refrescos incrementales solo
+    reindexan las filas modificadas desde la última lectura.
+    """
+
+    def __init__(self, fetch: Callable[[Optional[str], Optional[str]], List[dict]] = None):
+        self._fetch = fetch or fetch_doctor_rows
+        self._lock = threading.RLock()
+        self._task = None
+        self._refreshes = 0
+        # Se apaga si la tabla no tiene la columna de modificación
+        self._incremental = True
+        self._reset_state()
+        self._metrics = {"full_loads": 0, "incremental_loads": 0, "refresh_errors": 0, "lookups": 0, "lookup_total_s": 0.0}
+
+    def _reset_state(self):
+        self._records: Dict[str, dict] = {}
+        self._specialties = TokenIndex()
+        self._locations = TokenIndex()
+        self._by_canonical: Dict[str, Set[str]] = {}
+        self._canonical_of: Dict[str, Optional[str]] = {}
+        self._updated_at: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at is not None
+
+    def _index(self, doctor_id: str, row: dict) -> None:
+        speciality = row.get("speciality") or ""
+        self._records[doctor_id] = row
+        self._specialties.add(doctor_id, speciality)
+        self._locations.add(doctor_id, row.get("location") or "")
+        canonical = self._canonical(speciality)
+        if canonical:
+            self._by_canonical.setdefault(canonical, set()).add(doctor_id)
+
+    def _unindex(self, doctor_id: str) -> None:
+        row = self._records.pop(doctor_id, None)
+        if row is None:
+            return
+        speciality = row.get("speciality") or ""
+        self._specialties.remove(doctor_id, speciality)
+        self._locations.remove(doctor_id, row.get("location") or "")
+        canonical = self._canonical(speciality)
+        if canonical:
+            self._by_canonical.get(canonical, set()).discard(doctor_id)
+
+    def _canonical(self, speciality: str) -> Optional[str]:
+        # Pocas especialidades distintas: se resuelven una vez
+        if speciality not in self._canonical_of:
+            match = match_specialty(speciality)
+            self._canonical_of[speciality] = match[0] if match else None
+        return self._canonical_of[speciality]
+
+    @property
+    def updated_column(self) -> Optional[str]:
+        """Columna de última modificación, si los refrescos incrementales están disponibles"""
+        return settings.DOCTOR_DIRECTORY_UPDATED_COLUMN if self._incremental else None
+
+    def _track_updated(self, rows: Iterable[dict]) -> None:
+        column = self.updated_column
+        for row in rows:
+            value = row.get(column) if column else None
+            if value and (self._updated_at is None or str(value) > self._updated_at):
+                self._updated_at = str(value)
+
+    def load(self, rows: List[dict]) -> None:
+        """Reemplaza el snapshot completo"""
+        fresh = DoctorDirectory(self._fetch)
+        fresh._incremental = self._incremental
+        for row in rows:
+            if row.get("id") is not None:
+                fresh._index(str(row["id"]), row)
+        fresh._track_updated(rows)
+        with self._lock:
+            self._records = fresh._records
+            self._specialties = fresh._specialties
+            self._locations = fresh._locations
+            self._by_canonical = fresh._by_canonical
+            self._canonical_of = fresh._canonical_of
+            self._updated_at = fresh._updated_at
+            self.loaded_at = time.time()
+            self._metrics["full_loads"] += 1
+        logger.info(f"Directorio de médicos cargado: {len(rows)} médicos")
+
+    def upsert(self, rows: List[dict]) -> None:
+        """Reindexa solo las filas modificadas"""
+        with self._lock:
+            for row in rows:
+                if row.get("id") is None:
+                    continue
+                doctor_id = str(row["id"])
+                self._unindex(doctor_id)
+                self._index(doctor_id, row)
+            self._track_updated(rows)
+            self.loaded_at = time.time()
+            self._metrics["incremental_loads"] += 1
+
+    def refresh(self) -> None:
+        """
+        Refresco incremental por la columna de última modificación; cada
+        DOCTOR_DIRECTORY_FULL_RELOAD_EVERY refrescos (o si no hay columna) se
+        recarga todo para soltar los médicos borrados.
+        """
+        full = (
+            not self.ready
+            or not self.updated_column
+            or self._updated_at is None
+            or self._refreshes % max(settings.DOCTOR_DIRECTORY_FULL_RELOAD_EVERY, 1) == 0
+        )
+        self._refreshes += 1
+        if full:
+            self.load(self._fetch_all())
+        else:
+            rows = self._changed(self._fetch(self._updated_at, self.updated_column))
+            if rows:
+                self.upsert(rows)
+
+    def _changed(self, rows: List[dict]) -> List[dict]:
+        """
+        Una fila por ID, sin las que ya están iguales en el snapshot: el
+        filtro inclusivo vuelve a traer las del último timestamp visto.
+        """
+        by_id = {str(row["id"]): row for row in rows if row.get("id") is not None}
+        with self._lock:
+            return [row for doctor_id, row in by_id.items() if self._records.get(doctor_id) != row]
+
+    def _fetch_all(self) -> List[dict]:
+        column = self.updated_column
+        if not column:
+            return self._fetch(None, None)
+        try:
+            return self._fetch(None, column)
+        except Exception as e:
+            # Tabla sin columna de modificación: solo recargas completas, sin tocar settings
+            self._incremental = False
+            logger.warning(f"DoctorsData sin columna {column} ({e}), el directorio se recarga completo")
+            return self._fetch(None, None)
+
+    def search(self, speciality: str, location: str, top_k: int = None) -> Tuple[List[dict], int]:
+        """Médicos mejor rankeados y total de coincidencias, sin salir del proceso"""
+        t0 = time.perf_counter()
+        with self._lock:
+            candidates = self._specialty_ids(speciality) if speciality else set(self._records)
+            if location and candidates:
+                by_location = self._locations.lookup(location)
+                if by_location is not None and not candidates & by_location:
+                    # "Mendoza, Argentina" también debe encontrar a los cargados como "Mendoza"
+                    by_location = self._locations.lookup(location, require_all=False)
+                if by_location is not None:
+                    candidates = candidates & by_location
+            rows = [self._records[doctor_id] for doctor_id in candidates]
+        top = rank_doctors(rows, speciality, location, top_k)
+        with self._lock:
+            self._metrics["lookups"] += 1
+            self._metrics["lookup_total_s"] += time.perf_counter() - t0
+        return top, len(rows)
+
+    def _specialty_ids(self, speciality: str) -> Set[str]:
+        ids = set(self._specialties.lookup(speciality) or ())
+        match = match_specialty(speciality)
+        if match:
+            ids |= self._by_canonical.get(match[0], set())
+        elif not ids:
+            # El LLM a veces pasa una patología ("migraña"): buscar por la derivación de la guía
+            for referral in suggest_specialties(speciality, limit=1):
+                ids |= self._by_canonical.get(referral.specialty, set())
+        return ids
+
+    def get(self, doctor_id) -> Optional[dict]:
+        with self._lock:
+            record = self._records.get(str(doctor_id).strip())
+            return dict(record) if record else None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                self._metrics["refresh_errors"] += 1
+                logger.warning(f"No se pudo refrescar el directorio de médicos: {e}")
+            await asyncio.sleep(settings.DOCTOR_DIRECTORY_REFRESH_SECONDS)
+
+    def start(self) -> None:
+        """Carga el snapshot y lo refresca en segundo plano (sin bloquear el arranque)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self._metrics["lookups"]
+            return {
+                **self._metrics,
+                "doctors": len(self._records),
+                "ready": self.ready,
+                "age_s": time.time() - self.loaded_at if self.loaded_at else None,
+                "lookup_avg_ms": self._metrics["lookup_total_s"] / lookups * 1000 if lookups else 0.0,
+            }
+
+# Instancia global compartida por las herramientas
+doctor_directory = DoctorDirectory()
@@ -0,0 +1,133 @@
+"""
+Ranking y formato compacto de los resultados de search_doctors.
+
+El LLM recibe solo una línea por médico (ID, nombre, especialidad y
+ubicación). El registro completo, con el calendly_url, queda fuera del
+contexto en `doctor_records` y las herramientas lo resuelven por ID.
+"""
+import heapq
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+from app.config.settings import settings
+from core.knowledge import match_specialty, normalize_text, tokenize, word_stem
+from core.knowledge.derivation import specialist_forms
+
+_VOWELS = re.compile(r"[aeiou]")
+
+def ilike_pattern(value: str) -> str:
+    """
+    Patrón ILIKE tolerante a tildes y a la forma especialidad/especialista:
+    "Cardiólogo" -> "%c_rd__l_g%". Las vocales se reemplazan por el comodín
+    de un caracter porque ILIKE distingue "o" de "ó".
+    """
+    stems = [_VOWELS.sub("_", word_stem(word)) for word in normalize_text(value).split()]
+    return f"%{'%'.join(stems)}%" if stems else "%"
+
+def _match_score(value: str, wanted: str, forms: Iterable[str] = ()) -> int:
+    """3 coincidencia exacta, 2 todas las palabras, 1 alguna palabra, 0 ninguna"""
+    value, wanted = normalize_text(value), normalize_text(wanted)
+    if not wanted:
+        return 0
+    if value == wanted or value in forms:
+        return 3
+    value_stems = {word_stem(word) for word in value.split()}
+    wanted_stems = [word_stem(word) for word in wanted.split()]
+    matched = sum(1 for stem in wanted_stems if stem in value_stems)
+    if matched == len(wanted_stems):
+        return 2
+    return 1 if matched or wanted in value else 0
+
+def _speciality_forms(speciality: str) -> Set[str]:
+    """
+    Formas que cuentan como coincidencia exacta. Si lo pedido nombra entera
+    una especialidad de la guía ("cardiologo", "dentista") se suman las
+    formas de la especialidad canónica, para que "Cardiología" quede por
+    encima de "Cardiología Infantil".
+    """
+    forms = set(specialist_forms(speciality))
+    match = match_specialty(speciality)
+    if match and match[1] == " ".join(tokenize(speciality)):
+        forms |= set(specialist_forms(match[0]))
+    return forms
+
+def rank_doctors(rows: List[dict], speciality: str, location: str, top_k: int = None) -> List[dict]:
+    """
+    Ordena los médicos por calidad de coincidencia (primero la especialidad,
+    después la ubicación) y devuelve los top_k mejores.
+    """
+    top_k = top_k or settings.DOCTORS_SEARCH_TOP_K
+    forms = _speciality_forms(speciality) if speciality else set()
+    # Hay pocas especialidades y ubicaciones distintas: cada una se puntúa una vez
+    speciality_scores, location_scores = {}, {}
+
+    def key(row):
+        row_speciality = row.get("speciality") or ""
+        row_location = row.get("location") or ""
+        if row_speciality not in speciality_scores:
+            speciality_scores[row_speciality] = _match_score(row_speciality, speciality, forms)
+        if row_location not in location_scores:
+            location_scores[row_location] = _match_score(row_location, location)
+        return (speciality_scores[row_speciality], location_scores[row_location], -len(row_location))
+
+    return heapq.nlargest(top_k, rows, key=key)
+
+def doctor_name(row: dict) -> str:
+    return " ".join(str(row[key]) for key in ("name", "surname") if row.get(key)) or "Sin nombre"
+
+def format_doctors(rows: List[dict], total: int) -> str:
+    """Una línea por médico: el texto que entra al historial del agente"""
+    if not rows:
+        return "No se encontraron médicos para esa especialidad y ubicación."
+    lines = [f"{len(rows)} de {total} médicos encontrados (mejores coincidencias):"]
+    lines += [
+        f"- ID {row.get('id')}: {doctor_name(row)}, {row.get('speciality') or ''}, {row.get('location') or ''}"
+        for row in rows
+    ]
+    lines.append("Para mostrar el calendario de un médico usá show_calendar con su ID.")
+    return "\n".join(lines)
+
+class DoctorRecordStore:
+    """
+    Registros completos de los médicos ofrecidos, por ID, fuera del contexto
+    del LLM. Acotado en tamaño y con TTL: un ID que ya no está se vuelve a
+    buscar en la base.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 6 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def put_many(self, rows: Iterable[dict]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for row in rows:
+                if row.get("id") is None:
+                    continue
+                key = str(row["id"])
+                self._records[key] = (now, dict(row))
+                self._records.move_to_end(key)
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+
+    def get(self, doctor_id) -> Optional[Dict]:
+        key = str(doctor_id).strip()
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is None:
+                return None
+            stored_at, record = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._records[key]
+                return None
+            return dict(record)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+# Instancia global compartida por las herramientas
+doctor_records = DoctorRecordStore()
@@ -1,11 +1,40 @@
-from .tts_service import generate_speech, generate_speech_streaming
-from .transcription_service import transcribe_audio
+from .tts_service import generate_speech, generate_speech_streaming, prewarm_speech
+from .tts_cache import tts_cache
+from .tts_pipeline import (
+    split_sentences,
+    SentenceSplitter,
+    sentences_from_deltas,
+    synthesize_segments,
+    synthesize_reply
+)
+from .transcription_service import (
+    transcribe_audio,
+    transcribe_audio_async,
+    set_transcription_backend,
+    close_transcription_backend
+)
 from .audio_converter import webm_bytes_to_wav
+from .streaming_decoder import StreamingAudioDecoder
+from .decode_executor import decode_executor
+from .vad import VoiceActivityDetector, contains_speech
 
 __all__ = [
     "generate_speech",
     "generate_speech_streaming", 
+    "prewarm_speech",
+    "tts_cache",
+    "split_sentences",
+    "SentenceSplitter",
+    "sentences_from_deltas",
+    "synthesize_segments",
+    "synthesize_reply",
     "transcribe_audio",
-    "webm_bytes_to_wav"
+    "transcribe_audio_async",
+    "set_transcription_backend",
+    "close_transcription_backend",
+    "webm_bytes_to_wav",
+    "StreamingAudioDecoder",
+    "decode_executor",
+    "VoiceActivityDetector",
+    "contains_speech"
 ]
-
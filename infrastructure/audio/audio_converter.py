@@ -1,99 +1,179 @@
-import wave
-import av
 import io
+import struct
+import av
 from app.config.settings import settings
 
-def webm_bytes_to_wav(webm_bytes: bytes, rate: int = None) -> io.BytesIO:
-    """Convierte bytes de WebM a formato WAV"""
+# Firmas de cabecera EBML con las que arranca un contenedor WebM
+WEBM_SIGNATURES = (
+    b'\x1a\x45\xdf\xa3',  # EBML header estándar
+    b'\x1a\x45\xdf\xa7',  # Variante EBML
+)
+
+WAV_HEADER_SIZE = 44
+SAMPLE_WIDTH = 2  # PCM s16
+
+def is_webm_header(data) -> bool:
+    """Indica si los bytes comienzan con una cabecera EBML (WebM)"""
+    return bytes(data[:4]) in WEBM_SIGNATURES
+
+class _MemoryReader:
+    """
+    Lector de solo lectura sobre un memoryview. PyAV pide bloques con read(),
+    así que el contenedor de entrada nunca se copia completo.
+    """
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        chunk = bytes(self._view[self._pos:end])
+        self._pos = end
+        return chunk
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, min(offset, len(self._view)))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+class PcmBuffer:
+    """
+    Buffer PCM s16 mono que termina siendo el WAV en memoria.
+
+    Reserva la cabecera WAV al inicio, copia cada frame re-muestreado una sola
+    vez desde el plano de PyAV (sin to_ndarray/tobytes ni join) y al final
+    escribe la cabecera in-place, de modo que el pico de memoria es ~1x el PCM.
+    """
+
+    def __init__(self, rate: int, capacity: int = 0):
+        self.rate = rate
+        self._buf = io.BytesIO()
+        if capacity > 0:
+            # Preasignar cuando se conoce la duración evita realocaciones al crecer
+            self._buf.seek(WAV_HEADER_SIZE + capacity - 1)
+            self._buf.write(b"\0")
+        self._buf.seek(WAV_HEADER_SIZE)
+        self._size = WAV_HEADER_SIZE
+
+    @property
+    def pcm_bytes(self) -> int:
+        return self._size - WAV_HEADER_SIZE
+
+    def write_frames(self, frames) -> None:
+        """Copia frames s16 mono (empaquetados) al final del buffer"""
+        for frame in frames:
+            nbytes = frame.samples * SAMPLE_WIDTH
+            if nbytes:
+                # El plano puede traer padding: solo se copian las muestras válidas
+                self._buf.write(memoryview(frame.planes[0])[:nbytes])
+                self._size += nbytes
+
+    def read(self, start: int = 0) -> bytes:
+        """Devuelve una copia del PCM desde el byte `start` (para análisis incremental)"""
+        with self._buf.getbuffer() as view:
+            return bytes(view[WAV_HEADER_SIZE + start:self._size])
+
+    def to_wav(self) -> io.BytesIO:
+        """Escribe la cabecera WAV in-place y devuelve el buffer listo para leer"""
+        self._buf.truncate(self._size)
+        data_size = self.pcm_bytes
+        with self._buf.getbuffer() as view:
+            struct.pack_into(
+                "<4sI4s4sIHHIIHH4sI", view, 0,
+                b"RIFF", 36 + data_size, b"WAVE",
+                b"fmt ", 16, 1, 1, self.rate, self.rate * SAMPLE_WIDTH, SAMPLE_WIDTH, 8 * SAMPLE_WIDTH,
+                b"data", data_size,
+            )
+        self._buf.seek(0)
+        self._buf.name = "audio.wav"
+        return self._buf
+
+def write_resampled(resampler, frame, pcm: PcmBuffer) -> None:
+    """Re-muestrea un frame (o None para vaciar el resampler) directo al buffer PCM"""
+    out = resampler.resample(frame)
+    if out:
+        pcm.write_frames(out if isinstance(out, list) else [out])
+
+def _estimated_pcm_capacity(container, audio_stream, rate: int) -> int:
+    """Bytes de PCM esperados según la duración declarada del contenedor (0 si no se conoce)"""
+    seconds = None
+    if audio_stream.duration and audio_stream.time_base:
+        seconds = float(audio_stream.duration * audio_stream.time_base)
+    elif container.duration:
+        seconds = container.duration / av.time_base
+    if not seconds or seconds <= 0:
+        return 0
+    return int(seconds * rate) * SAMPLE_WIDTH
+
+def webm_bytes_to_wav(webm_bytes, rate: int = None) -> io.BytesIO:
+    """Convierte bytes de WebM (bytes, bytearray o memoryview) a formato WAV"""
     if rate is None:
         rate = settings.AUDIO_SAMPLE_RATE
-    
+
+    view = memoryview(webm_bytes).cast("B")
+
     # Validar que el buffer tenga datos
-    if not webm_bytes or len(webm_bytes) == 0:
+    if len(view) == 0:
         raise ValueError("Buffer de audio vacío")
-    
+
     # Validar tamaño mínimo (WebM necesita al menos ~100 bytes para headers básicos)
-    if len(webm_bytes) < 100:
-        raise ValueError(f"Buffer de audio demasiado pequeño: {len(webm_bytes)} bytes (mínimo ~100 bytes)")
-    
+    if len(view) < 100:
+        raise ValueError(f"Buffer de audio demasiado pequeño: {len(view)} bytes (mínimo ~100 bytes)")
+
     # Validar headers de WebM (EBML: 0x1A 0x45 0xDF 0xA3)
-    # WebM puede empezar con diferentes variantes, pero generalmente tiene estos bytes
-    webm_signatures = [
-        b'\x1a\x45\xdf\xa3',  # EBML header estándar
-        b'\x1a\x45\xdf\xa7',  # Variante EBML
-    ]
-    
-    is_valid_webm = any(webm_bytes.startswith(sig) for sig in webm_signatures)
+    is_valid_webm = is_webm_header(view)
     detected_format = None
-    
+
     try:
         # Intentar abrir como WebM primero
         try:
-            container = av.open(io.BytesIO(webm_bytes), mode="r", format="webm")
+            container = av.open(_MemoryReader(view), mode="r", format="webm")
             detected_format = "webm"
         except Exception as format_error:
-            # Si falla con formato webm, intentar detección automática
+            # Si falla con formato webm, intentar detección automática sobre el mismo buffer
             # Esto es normal para dispositivos iOS/iPad que envían MP4/MOV
             try:
-                container = av.open(io.BytesIO(webm_bytes), mode="r")
+                container = av.open(_MemoryReader(view), mode="r")
                 detected_format = container.format.name if container.format else "desconocido"
                 print(f"Info: Formato detectado automáticamente: {detected_format} (dispositivo puede estar enviando formato diferente a WebM)")
             except Exception as auto_error:
                 raise RuntimeError(f"No se pudo abrir el contenedor de audio. Error WebM: {format_error}, Error auto-detección: {auto_error}")
-        
+
         audio_stream = next((s for s in container.streams if s.type == "audio"), None)
         if audio_stream is None:
             raise RuntimeError("No se encontró stream de audio en el contenedor.")
 
         resampler = av.audio.resampler.AudioResampler(format="s16", layout="mono", rate=rate)
-        pcm_chunks = []
+        pcm = PcmBuffer(rate, capacity=_estimated_pcm_capacity(container, audio_stream, rate))
 
         for packet in container.demux(audio_stream):
             try:
                 for frame in packet.decode():
-                    out = resampler.resample(frame)
-                    if not out: 
-                        continue
-                    frames = out if isinstance(out, list) else [out]
-                    for f in frames:
-                        arr = f.to_ndarray() 
-                        if arr.ndim == 2: 
-                            arr = arr[0]      
-                        pcm_chunks.append(arr.tobytes())
+                    write_resampled(resampler, frame, pcm)
             except Exception as decode_error:
                 # Ignorar errores de decodificación de frames individuales
                 print(f"Warning: Error decodificando frame: {decode_error}")
                 continue
 
-        out = resampler.resample(None)
-        if out:
-            frames = out if isinstance(out, list) else [out]
-            for f in frames:
-                arr = f.to_ndarray()
-                if arr.ndim == 2: 
-                    arr = arr[0]
-                pcm_chunks.append(arr.tobytes())
+        write_resampled(resampler, None, pcm)
 
         container.close()
 
-        if not pcm_chunks:
+        if pcm.pcm_bytes == 0:
             format_name = detected_format or "audio"
             raise RuntimeError(f"No se pudo decodificar ningún frame de audio del contenedor {format_name}.")
 
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)   
-            wf.setframerate(rate)
-            wf.writeframes(b"".join(pcm_chunks))
-        
-        wav_buffer.seek(0)
-        wav_buffer.name = "audio.wav" 
-        return wav_buffer
-    
+        return pcm.to_wav()
+
     except Exception as e:
         format_name = detected_format or "audio"
         error_msg = f"Error decodificando {format_name}: {e}"
         print(error_msg)
         raise RuntimeError(error_msg) from e
-
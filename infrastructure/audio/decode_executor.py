@@ -0,0 +1,147 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.config.settings import settings
+from .audio_converter import webm_bytes_to_wav
+
+logger = logging.getLogger(__name__)
+
+def _warm_up() -> int:
+    """Tarea vacía para forzar el arranque de un worker con PyAV ya importado"""
+    import av  # noqa: F401
+    time.sleep(0.05)
+    return os.getpid()
+
+def _decode_job(data, rate: int):
+    """Decodifica en el worker y devuelve (wav, instante en que empezó a ejecutarse)"""
+    started_at = time.time()
+    wav = webm_bytes_to_wav(data, rate=rate)
+    return wav.getvalue(), started_at
+
+class DecodeExecutor:
+    """
+    Executor para la decodificación de audio (CPU-bound) fuera del event loop.
+
+    Usa un pool de procesos con workers precalentados y cae a un pool de hilos
+    si no se puede crear (o si se configura DECODE_EXECUTOR=thread). La cantidad
+    de trabajos pendientes está acotada: al superarla los llamadores esperan, y
+    ese tiempo cuenta como espera en cola en las métricas.
+    """
+
+    def __init__(self, kind: str = None, workers: int = None, max_pending: int = None):
+        self.kind = kind or settings.DECODE_EXECUTOR
+        self.workers = workers or settings.DECODE_WORKERS
+        self.max_pending = max_pending or settings.DECODE_MAX_PENDING or self.workers * 4
+        self._pool = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "queue_wait_total_s": 0.0,
+            "queue_wait_max_s": 0.0,
+            "decode_total_s": 0.0,
+        }
+
+    def start(self) -> None:
+        """Crea el pool y arranca los workers para que la primera decodificación no pague el spawn"""
+        with self._lock:
+            if self._pool is not None:
+                return
+            if self.kind == "process":
+                try:
+                    context = multiprocessing.get_context(settings.DECODE_MP_START_METHOD)
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                    futures = [self._pool.submit(_warm_up) for _ in range(self.workers)]
+                    pids = {f.result(timeout=30) for f in futures}
+                    logger.info(f"Decode executor: {len(pids)} procesos listos")
+                    return
+                except Exception as e:
+                    logger.warning(f"No se pudo crear el pool de procesos ({e}), usando hilos")
+                    if self._pool is not None:
+                        self._pool.shutdown(wait=False, cancel_futures=True)
+                    self.kind = "thread"
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="audio-decode")
+            logger.info(f"Decode executor: {self.workers} hilos")
+
+    def _fall_back_to_threads(self, broken) -> None:
+        """
+        Reemplaza un pool de procesos caído por uno de hilos. Bloquea (shutdown
+        y arranque): se llama desde un hilo, nunca en el event loop. Si fallan
+        varios trabajos a la vez el pool se reemplaza una sola vez.
+        """
+        with self._lock:
+            if self._pool is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self.kind = "thread"
+        self.start()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    async def decode_to_wav(self, data, rate: int = None) -> io.BytesIO:
+        """Convierte un contenedor completo a WAV en el pool sin bloquear el event loop"""
+        rate = rate or settings.AUDIO_SAMPLE_RATE
+        if self._pool is None:
+            await asyncio.to_thread(self.start)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        # Los procesos necesitan bytes serializables; los hilos leen el memoryview directo
+        payload = bytes(data) if self.kind == "process" else data
+        queued_at = time.time()
+        self._metrics["submitted"] += 1
+        async with self._slots:
+            self._metrics["in_flight"] += 1
+            try:
+                loop = asyncio.get_running_loop()
+                pool = self._pool
+                try:
+                    wav_bytes, started_at = await loop.run_in_executor(pool, _decode_job, payload, rate)
+                except BrokenProcessPool:
+                    logger.warning("Pool de procesos caído, reintentando con hilos")
+                    await asyncio.to_thread(self._fall_back_to_threads, pool)
+                    wav_bytes, started_at = await loop.run_in_executor(self._pool, _decode_job, data, rate)
+            except Exception:
+                self._metrics["failed"] += 1
+                raise
+            finally:
+                self._metrics["in_flight"] -= 1
+
+        queue_wait = max(0.0, started_at - queued_at)
+        self._metrics["completed"] += 1
+        self._metrics["queue_wait_total_s"] += queue_wait
+        self._metrics["queue_wait_max_s"] = max(self._metrics["queue_wait_max_s"], queue_wait)
+        self._metrics["decode_total_s"] += time.time() - started_at
+
+        wav = io.BytesIO(wav_bytes)
+        wav.name = "audio.wav"
+        return wav
+
+    def metrics(self) -> dict:
+        """Métricas del executor: profundidad de cola y tiempos de espera"""
+        completed = self._metrics["completed"]
+        queued = self._metrics["submitted"] - completed - self._metrics["failed"] - self._metrics["in_flight"]
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            **self._metrics,
+            "queued": max(0, queued),
+            "queue_wait_avg_s": self._metrics["queue_wait_total_s"] / completed if completed else 0.0,
+        }
+
+# Instancia global compartida por todas las conexiones del worker de uvicorn
+decode_executor = DecodeExecutor()
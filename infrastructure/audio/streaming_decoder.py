@@ -0,0 +1,229 @@
+import asyncio
+import io
+import threading
+from collections import deque
+import av
+from app.config.settings import settings
+from .audio_converter import is_webm_header, PcmBuffer, write_resampled, webm_bytes_to_wav
+from .decode_executor import decode_executor
+
+def is_container_header(data: bytes) -> bool:
+    """Indica si el chunk abre un contenedor nuevo (WebM o MP4/MOV)"""
+    return is_webm_header(data) or data[4:8] == b"ftyp"
+
+class _ChunkPipe:
+    """
+    Archivo de solo lectura alimentado por chunks del WebSocket.
+    read() bloquea hasta que llegan datos o se cierra el pipe (EOF para PyAV).
+    """
+
+    def __init__(self):
+        self._chunks = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def write(self, data: bytes) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._chunks.append(data)
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def read(self, size: int = -1) -> bytes:
+        with self._cond:
+            while not self._chunks and not self._closed:
+                self._cond.wait()
+            if not self._chunks:
+                return b""
+            chunk = self._chunks.popleft()
+            if 0 < size < len(chunk):
+                self._chunks.appendleft(chunk[size:])
+                chunk = chunk[:size]
+            return chunk
+
+class _DecodeSession:
+    """Estado de la decodificación de un contenedor (una locución)"""
+
+    def __init__(self, rate: int, container_format):
+        self.rate = rate
+        self.container_format = container_format
+        self.raw = bytearray()
+        self.pcm = PcmBuffer(rate)
+        # Posición hasta la que el VAD ya leyó el PCM de la locución actual
+        self.pcm_read_offset = 0
+        self.pcm_lock = threading.Lock()
+        self.was_cut = False
+        self.pipe = _ChunkPipe()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="streaming-audio-decoder", daemon=True)
+        self.thread.start()
+
+    def feed(self, chunk: bytes) -> None:
+        # Se conserva el contenedor crudo para el fallback de decodificación completa
+        self.raw.extend(chunk)
+        self.pipe.write(bytes(chunk))
+
+    def _run(self) -> None:
+        container = None
+        try:
+            container = av.open(self.pipe, mode="r", format=self.container_format)
+            audio_stream = next((s for s in container.streams if s.type == "audio"), None)
+            if audio_stream is None:
+                raise RuntimeError("No se encontró stream de audio en el contenedor.")
+
+            resampler = av.audio.resampler.AudioResampler(format="s16", layout="mono", rate=self.rate)
+            for packet in container.demux(audio_stream):
+                try:
+                    for frame in packet.decode():
+                        with self.pcm_lock:
+                            write_resampled(resampler, frame, self.pcm)
+                except Exception as decode_error:
+                    # Ignorar errores de decodificación de frames individuales
+                    print(f"Warning: Error decodificando frame: {decode_error}")
+                    continue
+
+            with self.pcm_lock:
+                write_resampled(resampler, None, self.pcm)
+        except Exception as e:
+            self.error = e
+        finally:
+            # Si el demuxer terminó antes de tiempo, liberar al productor
+            self.pipe.close()
+            if container is not None:
+                try:
+                    container.close()
+                except Exception:
+                    pass
+
+class StreamingAudioDecoder:
+    """
+    Decodificador incremental de WebM/MP4 para una conexión WebSocket.
+
+    Cada chunk recibido se entrega a un demuxer/resampler de PyAV que corre en
+    un hilo propio, de modo que el PCM ya está decodificado cuando termina la
+    locución y finish() solo tiene que esperar el último frame.
+    """
+
+    def __init__(self, rate: int = None):
+        self.rate = rate or settings.AUDIO_SAMPLE_RATE
+        self._session = None
+
+    @property
+    def received_bytes(self) -> int:
+        """Cantidad de bytes de contenedor recibidos en la locución actual"""
+        return len(self._session.raw) if self._session else 0
+
+    @property
+    def was_cut(self) -> bool:
+        """Indica si el contenedor en curso ya se cortó con cut() o discard() y sigue abierto"""
+        return self._session is not None and self._session.was_cut
+
+    def feed(self, chunk: bytes) -> None:
+        """Agrega un chunk del contenedor y lo entrega al demuxer en segundo plano"""
+        if not chunk:
+            return
+        if self._session is not None and is_container_header(chunk):
+            # El cliente empezó una grabación nueva: lo que quedaba del contenedor
+            # anterior es la cola de una locución ya cortada por el VAD
+            self.close()
+        if self._session is None:
+            # Sin cabecera EBML dejamos que FFmpeg detecte el formato (MP4/MOV de iOS)
+            container_format = "webm" if is_webm_header(chunk) else None
+            self._session = _DecodeSession(self.rate, container_format)
+        self._session.feed(chunk)
+
+    def read_pcm(self) -> bytes:
+        """Devuelve el PCM decodificado desde la última lectura (para el VAD)"""
+        session = self._session
+        if session is None:
+            return b""
+        with session.pcm_lock:
+            pcm = session.pcm.read(session.pcm_read_offset)
+            session.pcm_read_offset = session.pcm.pcm_bytes
+        return pcm
+
+    def cut(self) -> io.BytesIO:
+        """
+        Corta la locución con el PCM decodificado hasta ahora, sin cerrar el
+        contenedor: los chunks que sigan llegando pertenecen a la próxima locución.
+        """
+        session = self._session
+        if session is None:
+            raise ValueError("Buffer de audio vacío")
+        with session.pcm_lock:
+            pcm, session.pcm = session.pcm, PcmBuffer(self.rate)
+            session.pcm_read_offset = 0
+        if not pcm.pcm_bytes:
+            raise ValueError("Buffer de audio vacío")
+        # La decodificación en streaming funciona: ya no hace falta el contenedor crudo
+        session.raw.clear()
+        session.was_cut = True
+        return pcm.to_wav()
+
+    def discard(self) -> None:
+        """
+        Descarta lo acumulado (silencio o una cola sin voz) manteniendo el
+        contenedor abierto. Como en cut(), el contenedor crudo también se
+        descarta: sin la cabecera ya no sirve para el fallback y un cliente que
+        solo envía silencio no debe hacerlo crecer.
+        """
+        session = self._session
+        if session is not None:
+            with session.pcm_lock:
+                session.pcm = PcmBuffer(self.rate)
+                session.pcm_read_offset = 0
+            session.raw.clear()
+            session.was_cut = True
+
+    def _finish_streaming(self, timeout: float):
+        """Cierra la sesión y espera al demuxer; devuelve (sesión, WAV o None si hace falta el fallback)"""
+        session, self._session = self._session, None
+        if session is None:
+            raise ValueError("Buffer de audio vacío")
+
+        session.pipe.close()
+        session.thread.join(timeout)
+        if session.thread.is_alive():
+            raise RuntimeError("Timeout esperando al decodificador de audio")
+
+        if session.error is not None:
+            print(f"Info: Decodificación en streaming falló ({session.error}), decodificando buffer completo")
+        elif session.pcm.pcm_bytes:
+            return session, session.pcm.to_wav()
+        return session, None
+
+    def finish(self, timeout: float = 10.0) -> io.BytesIO:
+        """
+        Marca el fin de la locución, espera al demuxer y devuelve el WAV en memoria.
+        Bloquea: desde código async usar afinish().
+
+        Si la decodificación en streaming falló (por ejemplo un MP4 con el átomo
+        moov al final, que no se puede leer sin seek) se decodifica el contenedor
+        completo con webm_bytes_to_wav. Devuelve None si después de un cut()
+        no quedó audio por decodificar.
+        """
+        session, wav = self._finish_streaming(timeout)
+        if wav is not None or session.was_cut:
+            return wav
+        return webm_bytes_to_wav(memoryview(session.raw), rate=self.rate)
+
+    async def afinish(self, timeout: float = 10.0) -> io.BytesIO:
+        """
+        Versión async de finish(): la espera al demuxer corre en un hilo y el
+        fallback de decodificación completa en el executor de decodificación.
+        """
+        session, wav = await asyncio.to_thread(self._finish_streaming, timeout)
+        if wav is not None or session.was_cut:
+            return wav
+        return await decode_executor.decode_to_wav(memoryview(session.raw), rate=self.rate)
+
+    def close(self) -> None:
+        """Descarta la locución en curso y libera el hilo del demuxer"""
+        session, self._session = self._session, None
+        if session is not None:
+            session.pipe.close()
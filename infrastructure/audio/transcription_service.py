@@ -1,56 +1,163 @@
+import asyncio
 import os
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI
 from app.config.settings import settings
 import io
 
 client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
+STT_LANGUAGE = "es"
+STT_PROMPT = "Paciente médico describiendo síntomas."
+
+def _open_audio_input(audio_input):
+    """
+    Normaliza la entrada (bytes, io.BytesIO o path) a un archivo legible.
+    Devuelve (archivo, debe_cerrarse) o (None, False) si la entrada no es válida.
+    """
+    # CASO 1: Ya es un objeto en memoria (io.BytesIO)
+    if isinstance(audio_input, io.BytesIO):
+        audio_input.seek(0)
+        audio_input.name = "audio.wav"
+        return audio_input, False
+
+    # CASO 2: Son bytes crudos
+    if isinstance(audio_input, (bytes, bytearray)):
+        audio_file = io.BytesIO(audio_input)
+        audio_file.name = "audio.wav"
+        return audio_file, False
+
+    # CASO 3: Es una ruta de archivo (String)
+    if isinstance(audio_input, str):
+        if os.path.exists(audio_input):
+            return open(audio_input, "rb"), True
+        print(f"Archivo no encontrado: {audio_input}")
+        return None, False
+
+    print(f"Tipo de entrada no soportado: {type(audio_input)}")
+    return None, False
+
 def transcribe_audio(audio_input):
     """
     Transcribe audio recibiendo bytes, io.BytesIO o un path (string).
+    Versión síncrona: desde código async usar transcribe_audio_async.
     """
-    audio_file = None
-    should_close = False
+    audio_file, should_close = _open_audio_input(audio_input)
+    if audio_file is None:
+        return ""
 
     try:
-        # CASO 1: Ya es un objeto en memoria (io.BytesIO)
-        if isinstance(audio_input, io.BytesIO):
-            audio_file = audio_input
-            audio_file.seek(0)
-            audio_file.name = "audio.wav"
-
-        # CASO 2: Son bytes crudos
-        elif isinstance(audio_input, bytes):
-            audio_file = io.BytesIO(audio_input)
-            audio_file.name = "audio.wav"
-
-        # CASO 3: Es una ruta de archivo (String)
-        elif isinstance(audio_input, str):
-            if os.path.exists(audio_input):
-                audio_file = open(audio_input, "rb")
-                should_close = True
-            else:
-                print(f"Archivo no encontrado: {audio_input}")
-                return ""
-        
-        else:
-            print(f"Tipo de entrada no soportado: {type(audio_input)}")
-            return ""
-
         transcript = client.audio.transcriptions.create(
-            model="whisper-1", 
+            model=settings.STT_MODEL,
             file=audio_file,
-            language="es",
-            prompt="Paciente médico describiendo síntomas."
+            language=STT_LANGUAGE,
+            prompt=STT_PROMPT
         )
-        
+
         return transcript.text if transcript else ""
 
     except Exception as e:
         print(f"Error transcribiendo audio: {e}")
         return ""
-    
+
     finally:
         if should_close and audio_file:
             audio_file.close()
 
+class OpenAITranscriptionBackend:
+    """
+    Backend de transcripción sobre la API de OpenAI con un pool HTTP keep-alive
+    compartido. Con STT_BASE_URL apunta a cualquier servidor compatible (por
+    ejemplo un stand-in local para tests y benchmarks).
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None, max_connections: int = None, timeout: float = None):
+        max_connections = max_connections or settings.STT_MAX_CONNECTIONS
+        timeout = timeout or settings.STT_TIMEOUT
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60,
+            ),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+        )
+        self._client = AsyncOpenAI(
+            api_key=api_key or settings.OPENAI_API_KEY,
+            base_url=base_url or settings.STT_BASE_URL,
+            http_client=self._http,
+            max_retries=1,
+        )
+
+    async def transcribe(self, audio_file, model: str, language: str, prompt: str) -> str:
+        transcript = await self._client.audio.transcriptions.create(
+            model=model,
+            file=audio_file,
+            language=language,
+            prompt=prompt
+        )
+        return transcript.text if transcript else ""
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+_backend = None
+_in_flight = None
+
+def set_transcription_backend(backend) -> None:
+    """
+    Reemplaza el backend de transcripción. Cualquier objeto con
+    `async transcribe(audio_file, model, language, prompt) -> str` sirve.
+    """
+    global _backend
+    _backend = backend
+
+def get_transcription_backend():
+    global _backend
+    if _backend is None:
+        _backend = OpenAITranscriptionBackend()
+    return _backend
+
+async def close_transcription_backend() -> None:
+    """Cierra el pool HTTP del backend (al apagar la aplicación)"""
+    global _backend
+    backend, _backend = _backend, None
+    if backend is not None and hasattr(backend, "aclose"):
+        await backend.aclose()
+
+async def transcribe_audio_async(audio_input, timeout: float = None) -> str:
+    """
+    Transcribe audio (bytes, io.BytesIO o path) sin bloquear el event loop.
+    Limita las transcripciones en vuelo a STT_MAX_IN_FLIGHT y corta cada
+    request a los `timeout` segundos (STT_TIMEOUT por defecto).
+    """
+    global _in_flight
+    if _in_flight is None:
+        _in_flight = asyncio.Semaphore(settings.STT_MAX_IN_FLIGHT)
+
+    audio_file, should_close = _open_audio_input(audio_input)
+    if audio_file is None:
+        return ""
+
+    try:
+        async with _in_flight:
+            return await asyncio.wait_for(
+                get_transcription_backend().transcribe(
+                    audio_file,
+                    model=settings.STT_MODEL,
+                    language=STT_LANGUAGE,
+                    prompt=STT_PROMPT
+                ),
+                timeout=timeout or settings.STT_TIMEOUT,
+            )
+
+    except asyncio.TimeoutError:
+        print("Error transcribiendo audio: timeout")
+        return ""
+    except Exception as e:
+        print(f"Error transcribiendo audio: {e}")
+        return ""
+
+    finally:
+        if should_close and audio_file:
+            audio_file.close()
@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from app.config.settings import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_tts_text(text: str) -> str:
+    """Normaliza el texto para que variaciones de espacios o Unicode compartan entrada"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+class TTSCache:
+    """
+    Cache de audio TTS direccionado por contenido.
+
+    La clave es el hash de (texto normalizado, voz, modelo, formato). Un LRU en
+    memoria acotado por bytes va delante de un tier en disco, también acotado
+    por tamaño, que sobrevive a reinicios y se comparte entre workers.
+
+    El tier en disco lleva su propio lock y un índice en memoria (ruta ->
+    tamaño, en orden de último acceso) que se arma con un solo recorrido del
+    directorio: la eviction no vuelve a recorrerlo y nunca toma el lock del
+    LRU en memoria, que es el que consultan las lecturas desde el event loop.
+    """
+
+    def __init__(self, memory_max_bytes: int = None, disk_dir: str = None, disk_max_bytes: int = None):
+        self.memory_max_bytes = memory_max_bytes if memory_max_bytes is not None else settings.TTS_CACHE_MEMORY_MB * 1024 * 1024
+        self.disk_dir = disk_dir if disk_dir is not None else settings.TTS_CACHE_DIR
+        self.disk_max_bytes = disk_max_bytes if disk_max_bytes is not None else settings.TTS_CACHE_DISK_MB * 1024 * 1024
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        # ruta -> tamaño, del menos al más recientemente usado; None hasta el primer write
+        self._disk_index = None
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._metrics = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bytes_served": 0,
+            "bytes_stored": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    @staticmethod
+    def make_key(text: str, voice: str, model: str, response_format: str) -> str:
+        payload = "\0".join((model, voice, response_format, normalize_tts_text(text)))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def get(self, key: str):
+        """Retorna el audio cacheado o None"""
+        audio = self._get_memory(key)
+        if audio is not None:
+            return audio
+        return self._get_disk(key)
+
+    async def aget(self, key: str):
+        """Como get, pero el tier en disco se lee en un hilo para no bloquear el event loop"""
+        audio = self._get_memory(key)
+        if audio is not None:
+            return audio
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def _get_memory(self, key: str):
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._metrics["memory_hits"] += 1
+                self._metrics["bytes_served"] += len(audio)
+            return audio
+
+    def _get_disk(self, key: str):
+        audio = self._read_disk(key)
+        with self._lock:
+            if audio is None:
+                self._metrics["misses"] += 1
+                return None
+            self._metrics["disk_hits"] += 1
+            self._metrics["bytes_served"] += len(audio)
+            self._put_memory(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        """Guarda el audio en ambos tiers"""
+        if not audio:
+            return
+        with self._lock:
+            self._metrics["bytes_stored"] += len(audio)
+            self._put_memory(key, audio)
+        self._write_disk(key, audio)
+
+    async def aput(self, key: str, audio: bytes) -> None:
+        """Como put; la escritura y la eviction en disco van en un hilo"""
+        await asyncio.to_thread(self.put, key, audio)
+
+    def _put_memory(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.memory_max_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._metrics["memory_evictions"] += 1
+
+    def _read_disk(self, key: str):
+        if not self.disk_dir or self.disk_max_bytes <= 0:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            # El mtime hace de "último acceso" para la eviction en disco (y entre workers)
+            os.utime(path)
+            with self._disk_lock:
+                if self._disk_index is not None and path in self._disk_index:
+                    self._disk_index.move_to_end(path)
+            return audio
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, audio: bytes) -> None:
+        if not self.disk_dir or self.disk_max_bytes <= 0 or len(audio) > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: no se pudo escribir el cache de TTS: {e}")
+            return
+        self._account_disk(path, len(audio))
+
+    def _account_disk(self, path: str, size: int) -> None:
+        evicted = 0
+        with self._disk_lock:
+            if self._disk_index is None:
+                # Primer write del proceso: lo que ya había en disco, del más viejo al más nuevo
+                self._disk_index = OrderedDict((p, sz) for _, sz, p in sorted(self._disk_entries()))
+                self._disk_bytes = sum(self._disk_index.values())
+            else:
+                self._disk_bytes += size - self._disk_index.pop(path, 0)
+                self._disk_index[path] = size
+            # Eviction por tamaño: se borran primero los archivos menos usados
+            while self._disk_bytes > self.disk_max_bytes and len(self._disk_index) > 1:
+                victim, victim_size = next(iter(self._disk_index.items()))
+                if victim == path:
+                    break
+                del self._disk_index[victim]
+                self._disk_bytes -= victim_size
+                try:
+                    os.remove(victim)
+                    evicted += 1
+                except OSError:
+                    # Ya lo borró otro worker
+                    pass
+        if evicted:
+            with self._lock:
+                self._metrics["disk_evictions"] += evicted
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self._metrics["memory_hits"] + self._metrics["disk_hits"] + self._metrics["misses"]
+            hits = lookups - self._metrics["misses"]
+            metrics = {
+                **self._metrics,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+        metrics["disk_bytes"] = self._disk_bytes
+        return metrics
+
+# Instancia global compartida por el servicio de TTS
+tts_cache = TTSCache()
@@ -0,0 +1,156 @@
+import asyncio
+import re
+from app.config.settings import settings
+from .tts_service import generate_speech_streaming
+
+# Fin de oración seguido de espacio (el texto del agente es en español: ¿...? ¡...!)
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?…])["\')\]]*\s+')
+# Separadores de cláusula para partir oraciones demasiado largas
+_CLAUSE_BREAK = re.compile(r'(?<=[,;:])\s+')
+
+def split_sentences(text: str, min_chars: int = None, max_chars: int = None) -> list:
+    """
+    Divide la respuesta en segmentos para sintetizar por separado.
+    Los fragmentos muy cortos ("Sí.") se unen al siguiente para no pagar un
+    request de TTS por dos palabras, y las oraciones muy largas se parten por
+    cláusulas.
+    """
+    min_chars = settings.TTS_MIN_SEGMENT_CHARS if min_chars is None else min_chars
+    max_chars = settings.TTS_MAX_SEGMENT_CHARS if max_chars is None else max_chars
+
+    pieces = []
+    for sentence in _SENTENCE_BREAK.split(text.strip()):
+        if len(sentence) > max_chars:
+            pieces.extend(_CLAUSE_BREAK.split(sentence))
+        elif sentence:
+            pieces.append(sentence)
+
+    segments = []
+    pending = ""
+    for piece in pieces:
+        pending = f"{pending} {piece}" if pending else piece
+        if len(pending) >= min_chars:
+            segments.append(pending)
+            pending = ""
+    if pending:
+        if segments and len(pending) < min_chars:
+            segments[-1] = f"{segments[-1]} {pending}"
+        else:
+            segments.append(pending)
+    return segments
+
+class SentenceSplitter:
+    """
+    Versión incremental de split_sentences para texto que llega por tokens:
+    feed() devuelve los segmentos que ya quedaron completos y flush() el resto.
+    """
+
+    def __init__(self, min_chars: int = None, max_chars: int = None):
+        self.min_chars = settings.TTS_MIN_SEGMENT_CHARS if min_chars is None else min_chars
+        self.max_chars = settings.TTS_MAX_SEGMENT_CHARS if max_chars is None else max_chars
+        self._buffer = ""
+        # Oración completa pero corta, retenida para unirla con la siguiente
+        self._carry = ""
+
+    def feed(self, delta: str) -> list:
+        self._buffer += delta
+        last_break = None
+        for last_break in _SENTENCE_BREAK.finditer(self._buffer):
+            pass
+        if last_break is None:
+            return []
+
+        complete = self._buffer[:last_break.start()]
+        self._buffer = self._buffer[last_break.end():]
+        if self._carry:
+            complete = f"{self._carry} {complete}"
+            self._carry = ""
+
+        segments = split_sentences(complete, self.min_chars, self.max_chars)
+        if segments and len(segments[-1]) < self.min_chars:
+            self._carry = segments.pop()
+        return segments
+
+    def flush(self) -> list:
+        rest = f"{self._carry} {self._buffer}".strip()
+        self._carry = ""
+        self._buffer = ""
+        return split_sentences(rest, self.min_chars, self.max_chars) if rest else []
+
+async def sentences_from_deltas(deltas, min_chars: int = None, max_chars: int = None):
+    """Agrupa un stream async de deltas de texto en segmentos a medida que se completan"""
+    splitter = SentenceSplitter(min_chars, max_chars)
+    async for delta in deltas:
+        for segment in splitter.feed(delta):
+            yield segment
+    for segment in splitter.flush():
+        yield segment
+
+async def _iterate(segments):
+    if hasattr(segments, "__aiter__"):
+        async for segment in segments:
+            yield segment
+    else:
+        for segment in segments:
+            yield segment
+
+async def synthesize_segments(segments, max_parallel: int = None, response_format: str = None):
+    """
+    Sintetiza los segmentos en paralelo (como máximo `max_parallel` a la vez)
+    y emite el audio en orden como tuplas (índice, texto_del_segmento, chunk).
+
+    `segments` puede ser una lista o un iterable async (por ejemplo oraciones
+    que se completan mientras el LLM genera tokens). El segmento 0 se reenvía
+    chunk a chunk mientras los siguientes ya se están sintetizando; sus chunks
+    quedan en cola hasta que les toca salir.
+    """
+    slots = asyncio.Semaphore(max_parallel or settings.TTS_MAX_PARALLEL)
+    ordered = asyncio.Queue()
+    tasks = []
+
+    async def produce(segment: str, queue: asyncio.Queue):
+        try:
+            async with slots:
+                async for chunk in generate_speech_streaming(segment, response_format=response_format):
+                    await queue.put(chunk)
+        finally:
+            await queue.put(None)
+
+    async def dispatch():
+        try:
+            async for segment in _iterate(segments):
+                queue = asyncio.Queue()
+                tasks.append(asyncio.create_task(produce(segment, queue)))
+                await ordered.put((segment, queue))
+        finally:
+            await ordered.put(None)
+
+    dispatcher = asyncio.create_task(dispatch())
+    try:
+        index = 0
+        while True:
+            item = await ordered.get()
+            if item is None:
+                break
+            segment, queue = item
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                yield index, segment, chunk
+            index += 1
+        # Propagar errores de la fuente de segmentos (por ejemplo del LLM)
+        await dispatcher
+    finally:
+        dispatcher.cancel()
+        for task in tasks:
+            task.cancel()
+
+async def synthesize_reply(text, response_format: str = "mp3") -> bytes:
+    """
+    Sintetiza la respuesta completa con el pipeline por oraciones y retorna los bytes.
+    `text` puede ser el texto final o un stream async de deltas del LLM.
+    """
+    segments = sentences_from_deltas(text) if hasattr(text, "__aiter__") else split_sentences(text)
+    chunks = [chunk async for _, _, chunk in synthesize_segments(segments, response_format=response_format)]
+    return b"".join(chunks) if chunks else None
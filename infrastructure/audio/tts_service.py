@@ -1,14 +1,22 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from app.config.settings import settings
 from pathlib import Path
+from .tts_cache import tts_cache
 
 client = OpenAI(api_key=settings.OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 def generate_speech(text: str, voice: str = "alloy", model: str = "tts-1") -> bytes:
     """
     Genera audio y retorna los bytes (no guarda archivo).
     Versión síncrona para compatibilidad con endpoints HTTP.
     """
+    cache_key = tts_cache.make_key(text, voice, model, "mp3") if settings.TTS_CACHE_ENABLED else None
+    if cache_key:
+        cached = tts_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     try:
         response = client.audio.speech.create(
             model=model,
@@ -16,34 +24,68 @@ def generate_speech(text: str, voice: str = "alloy", model: str = "tts-1") -> by
             input=text,
             response_format="mp3" 
         )
+        if cache_key:
+            tts_cache.put(cache_key, response.content)
         return response.content
     except Exception as e:
         print(f"❌ Error en TTS: {e}")
         return None
 
-async def generate_speech_streaming(text: str, voice: str = "alloy", model: str = "tts-1"):
+async def generate_speech_streaming(text: str, voice: str = "alloy", model: str = "tts-1", response_format: str = None):
     """
     Genera audio con STREAMING y retorna chunks progresivamente.
     Útil para WebSocket donde se puede enviar audio tan pronto como se genera.
+    Las frases ya sintetizadas se sirven desde el cache sin llamar al proveedor.
     
     Args:
         text: Texto a convertir a audio
+        response_format: "mp3" u "opus" (TTS_STREAM_FORMAT por defecto)
         
     Yields:
-        bytes: Chunks de audio MP3
+        bytes: Chunks de audio a medida que los produce el proveedor.
+        Si hay un error se registra y el stream termina.
     """
+    response_format = response_format or settings.TTS_STREAM_FORMAT
+    cache_key = tts_cache.make_key(text, voice, model, response_format) if settings.TTS_CACHE_ENABLED else None
+    if cache_key:
+        cached = await tts_cache.aget(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    chunks = []
     try:
-        with client.audio.speech.with_streaming_response.create(
+        async with async_client.audio.speech.with_streaming_response.create(
             model=model, 
             voice=voice,
             input=text,
-            response_format="opus" 
+            response_format=response_format
         ) as response:
-            chunk_size = 4096
-            async for chunk in response.stream.iter_bytes(chunk_size=chunk_size):
+            async for chunk in response.iter_bytes(chunk_size=settings.TTS_STREAM_CHUNK_SIZE):
                 if chunk:
+                    chunks.append(chunk)
                     yield chunk
     except Exception as e:
         print(f"❌ Error en TTS streaming: {e}")
-        yield None
+        return
+
+    # Solo se cachea el audio de un stream que terminó completo
+    if cache_key and chunks:
+        await tts_cache.aput(cache_key, b"".join(chunks))
 
+async def prewarm_speech(phrases, voice: str = "alloy", model: str = "tts-1", formats=None) -> int:
+    """
+    Sintetiza y cachea frases conocidas (saludos, despedidas, mensajes de error)
+    para que sus respuestas no pasen por el proveedor. Retorna cuántas se sintetizaron.
+    """
+    formats = formats or {"mp3", settings.TTS_STREAM_FORMAT}
+    synthesized = 0
+    for phrase in phrases:
+        for response_format in formats:
+            key = tts_cache.make_key(phrase, voice, model, response_format)
+            if await tts_cache.aget(key) is not None:
+                continue
+            async for _ in generate_speech_streaming(phrase, voice=voice, model=model, response_format=response_format):
+                pass
+            synthesized += 1
+    return synthesized
@@ -0,0 +1,108 @@
+import numpy as np
+from app.config.settings import settings
+
+def _energy_zcr_classifier(energy_threshold_db: float, zcr_max: float):
+    """Clasificador por defecto: energía (dBFS) por encima del umbral y tasa de cruces por cero acotada"""
+    def classify(frames: np.ndarray) -> np.ndarray:
+        samples = frames.astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        energy_db = 20.0 * np.log10(rms + 1e-10)
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+        return (energy_db >= energy_threshold_db) & (zcr <= zcr_max)
+    return classify
+
+class VoiceActivityDetector:
+    """
+    Detector de actividad de voz sobre PCM s16 mono (16 kHz).
+
+    Clasifica el audio en frames de duración fija y decide cuándo termina una
+    locución: se exige un mínimo de voz acumulada y luego `hangover_ms` de
+    silencio continuo. También informa cuánto silencio lleva un buffer sin voz
+    para poder descartarlo antes de transcribirlo.
+
+    `classifier` permite reemplazar el criterio energía/cruces por cero por otro
+    clasificador de frames: recibe un array (n_frames, samples_per_frame) int16
+    y devuelve un array booleano de n_frames.
+    """
+
+    def __init__(
+        self,
+        rate: int = None,
+        frame_ms: int = None,
+        energy_threshold_db: float = None,
+        zcr_max: float = None,
+        hangover_ms: int = None,
+        min_speech_ms: int = None,
+        classifier=None,
+    ):
+        self.rate = rate or settings.AUDIO_SAMPLE_RATE
+        self.frame_ms = frame_ms or settings.VAD_FRAME_MS
+        self.hangover_ms = hangover_ms if hangover_ms is not None else settings.VAD_HANGOVER_MS
+        self.min_speech_ms = min_speech_ms if min_speech_ms is not None else settings.VAD_MIN_SPEECH_MS
+        self.classifier = classifier or _energy_zcr_classifier(
+            energy_threshold_db if energy_threshold_db is not None else settings.VAD_ENERGY_THRESHOLD_DB,
+            zcr_max if zcr_max is not None else settings.VAD_ZCR_MAX,
+        )
+        self._frame_bytes = int(self.rate * self.frame_ms / 1000) * 2
+        self.reset()
+
+    def reset(self) -> None:
+        """Reinicia el estado para una nueva locución"""
+        self._pending = bytearray()
+        self.frames_seen = 0
+        self.speech_frames = 0
+        self._trailing_silence = 0
+        self.ended = False
+
+    @property
+    def speech_ms(self) -> int:
+        return self.speech_frames * self.frame_ms
+
+    @property
+    def silence_ms(self) -> int:
+        """Milisegundos de silencio continuo al final del audio analizado"""
+        return self._trailing_silence * self.frame_ms
+
+    @property
+    def audio_ms(self) -> int:
+        return self.frames_seen * self.frame_ms
+
+    @property
+    def speech_detected(self) -> bool:
+        return self.speech_ms >= self.min_speech_ms
+
+    def feed(self, pcm: bytes) -> bool:
+        """Analiza PCM nuevo y devuelve True cuando la locución terminó"""
+        if self.ended or not pcm:
+            return self.ended
+
+        self._pending.extend(pcm)
+        n_frames = len(self._pending) // self._frame_bytes
+        if n_frames == 0:
+            return False
+
+        usable = n_frames * self._frame_bytes
+        frames = np.frombuffer(self._pending, dtype=np.int16, count=usable // 2).reshape(n_frames, -1)
+        voiced = self.classifier(frames)
+        del frames
+        del self._pending[:usable]
+
+        hangover_frames = max(1, self.hangover_ms // self.frame_ms)
+        for is_speech in voiced:
+            self.frames_seen += 1
+            if is_speech:
+                self.speech_frames += 1
+                self._trailing_silence = 0
+                continue
+            self._trailing_silence += 1
+            if self.speech_detected and self._trailing_silence >= hangover_frames:
+                self.ended = True
+                break
+
+        return self.ended
+
+def contains_speech(pcm: bytes, rate: int = None) -> bool:
+    """Indica si un buffer PCM completo tiene voz suficiente para transcribirlo"""
+    vad = VoiceActivityDetector(rate=rate, hangover_ms=0)
+    vad.feed(pcm)
+    return vad.speech_detected
@@ -0,0 +1,3 @@
+from .outbox import EmailOutbox, get_outbox, close_outbox
+
+__all__ = ["EmailOutbox", "get_outbox", "close_outbox"]
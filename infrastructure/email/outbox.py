@@ -0,0 +1,352 @@
+"""
+Bandeja de salida de correos.
+
+send_email ya no habla SMTP: guarda el mensaje renderizado en un spool SQLite
+y retorna. Un hilo de fondo lo envía reutilizando una conexión SMTP
+autenticada (varios mensajes por sesión), reintenta con backoff exponencial
+los errores transitorios y marca como fallidos los permanentes. Los mensajes
+pendientes sobreviven a un reinicio del proceso.
+
+Cada worker de uvicorn arranca su propio sender sobre el mismo spool: antes de
+mandar, un sender reserva los mensajes vencidos con un UPDATE atómico
+(status 'sending' + lease_until), así dos procesos nunca mandan el mismo
+correo. Si un proceso muere con mensajes reservados, cualquier sender los
+retoma cuando vence la reserva.
+"""
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from email.message import Message
+from typing import List, Optional
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    sender TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    message BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    sent_at REAL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+PENDING, SENDING, SENT, FAILED = "pending", "sending", "sent", "failed"
+
+def is_permanent_error(error: Exception) -> bool:
+    """Errores 5xx del destinatario o del mensaje: reintentar no cambia el resultado"""
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        # Credenciales: se corrigen en la configuración, los mensajes esperan
+        return False
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+class EmailOutbox:
+    """
+    Spool durable de correos con un sender de fondo.
+
+    `enqueue` solo escribe en SQLite (WAL) y despierta al sender. El sender
+    toma los mensajes vencidos de a EMAIL_BATCH_SIZE, los manda por la misma
+    conexión y la mantiene abierta EMAIL_SMTP_IDLE_SECONDS por si llegan más.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.EMAIL_OUTBOX_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if "lease_until" not in columns:
+            # Spool creado antes de las reservas
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN lease_until REAL")
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._smtp = None
+        self._smtp_used_at = 0.0
+        self._metrics = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retries": 0,
+            "connections_opened": 0,
+            "delivery_total_s": 0.0,
+        }
+
+    # --- spool ---
+
+    def enqueue(self, message: Message, sender: str, recipients: List[str]) -> int:
+        """Guarda el mensaje para envío y retorna su id; no toca la red"""
+        now = time.time()
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (created_at, sender, recipients, message, next_attempt_at) VALUES (?, ?, ?, ?, ?)",
+                (now, sender, ",".join(recipients), message.as_bytes(), now),
+            )
+            self._metrics["enqueued"] += 1
+        self.start()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def _claim(self, limit: int) -> List[tuple]:
+        """
+        Reserva hasta `limit` mensajes vencidos (o con la reserva de otro sender
+        vencida) y los retorna. El UPDATE corre en una transacción IMMEDIATE:
+        SQLite serializa a los escritores entre procesos, así que cada fila la
+        reserva un solo sender.
+        """
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "UPDATE outbox SET status = ?, lease_until = ? WHERE id IN ("
+                    "SELECT id FROM outbox WHERE (status = ? AND next_attempt_at <= ?) "
+                    "OR (status = ? AND lease_until <= ?) ORDER BY next_attempt_at, id LIMIT ?"
+                    ") RETURNING id, sender, recipients, message, attempts",
+                    (SENDING, now + settings.EMAIL_LEASE_SECONDS, PENDING, now, SENDING, now, limit),
+                ).fetchall()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        # RETURNING no garantiza el orden
+        return sorted(rows, key=lambda row: row[0])
+
+    def _release(self, batch: List[tuple]) -> None:
+        """Devuelve al spool los mensajes reservados que no se llegaron a intentar"""
+        if not batch:
+            return
+        with self._db_lock:
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, lease_until = NULL WHERE id = ? AND status = ?",
+                [(PENDING, row[0], SENDING) for row in batch],
+            )
+
+    def _next_due_in(self) -> Optional[float]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT MIN(CASE WHEN status = ? THEN next_attempt_at ELSE lease_until END) "
+                "FROM outbox WHERE status IN (?, ?)",
+                (PENDING, PENDING, SENDING),
+            ).fetchone()
+        return None if row[0] is None else max(row[0] - time.time(), 0.0)
+
+    def _mark_sent(self, message_id: int) -> None:
+        with self._db_lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, sent_at = ?, attempts = attempts + 1, last_error = NULL, lease_until = NULL WHERE id = ?",
+                (SENT, time.time(), message_id),
+            )
+            self._metrics["sent"] += 1
+
+    def _mark_failed_attempt(self, message_id: int, attempts: int, error: Exception) -> None:
+        attempts += 1
+        permanent = is_permanent_error(error) or attempts >= settings.EMAIL_MAX_ATTEMPTS
+        delay = min(settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.EMAIL_RETRY_MAX_SECONDS)
+        delay *= random.uniform(0.8, 1.2)
+        with self._db_lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, lease_until = NULL WHERE id = ?",
+                (FAILED if permanent else PENDING, attempts, time.time() + delay, str(error)[:500], message_id),
+            )
+            self._metrics["failed" if permanent else "retries"] += 1
+        if permanent:
+            logger.error(f"Correo {message_id} descartado tras {attempts} intentos: {error}")
+        else:
+            logger.warning(f"Correo {message_id} falló (intento {attempts}), reintento en {delay:.0f}s: {error}")
+
+    def _prune_sent(self) -> None:
+        with self._db_lock:
+            self._conn.execute(
+                "DELETE FROM outbox WHERE status = ? AND sent_at < ?",
+                (SENT, time.time() - settings.EMAIL_OUTBOX_KEEP_SENT_SECONDS),
+            )
+
+    # --- SMTP ---
+
+    def _connect(self) -> smtplib.SMTP:
+        timeout = settings.SMTP_TIMEOUT
+        if settings.SMTP_SSL:
+            smtp = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, timeout=timeout)
+        else:
+            smtp = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=timeout)
+            if settings.SMTP_STARTTLS:
+                smtp.starttls()
+        smtp.ehlo()
+        if settings.EMAIL_PASSWORD and smtp.has_extn("auth"):
+            smtp.login(settings.EMAIL_SENDER, settings.EMAIL_PASSWORD)
+        self._metrics["connections_opened"] += 1
+        return smtp
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            try:
+                # Gmail corta las sesiones inactivas: verificar antes de reusar
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except OSError:
+                # SMTPException también es OSError
+                pass
+            self._close_smtp()
+        self._smtp = self._connect()
+        return self._smtp
+
+    def _close_smtp(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _send_batch(self, batch: List[tuple]) -> None:
+        try:
+            smtp = self._connection()
+        except Exception as e:
+            # Sin conexión ningún mensaje del batch puede salir
+            for message_id, _, _, _, attempts in batch:
+                self._mark_failed_attempt(message_id, attempts, e)
+            return
+        for i, (message_id, sender, recipients, message, attempts) in enumerate(batch):
+            t0 = time.perf_counter()
+            try:
+                smtp.sendmail(sender, recipients.split(","), message)
+            except smtplib.SMTPServerDisconnected as e:
+                self._close_smtp()
+                self._mark_failed_attempt(message_id, attempts, e)
+                self._release(batch[i + 1:])
+                return
+            except smtplib.SMTPException as e:
+                # Rechazo de este mensaje: la sesión sigue sirviendo para los demás
+                self._mark_failed_attempt(message_id, attempts, e)
+                continue
+            except OSError as e:
+                self._close_smtp()
+                self._mark_failed_attempt(message_id, attempts, e)
+                self._release(batch[i + 1:])
+                return
+            self._metrics["delivery_total_s"] += time.perf_counter() - t0
+            self._mark_sent(message_id)
+        self._smtp_used_at = time.monotonic()
+
+    # --- sender de fondo ---
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                batch = self._claim(settings.EMAIL_BATCH_SIZE)
+                if batch:
+                    self._send_batch(batch)
+                    continue
+                self._prune_sent()
+            except Exception as e:
+                logger.error(f"Error en el sender de correos: {e}")
+            wait = self._next_due_in()
+            if self._smtp is not None:
+                idle_left = settings.EMAIL_SMTP_IDLE_SECONDS - (time.monotonic() - self._smtp_used_at)
+                if idle_left <= 0:
+                    self._close_smtp()
+                else:
+                    wait = idle_left if wait is None else min(wait, idle_left)
+            self._wakeup.wait(timeout=wait)
+            self._wakeup.clear()
+        self._close_smtp()
+
+    def start(self) -> None:
+        """Arranca el sender (idempotente); también retoma lo que quedó pendiente de una ejecución anterior"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Detiene el sender al terminar el batch en curso; lo pendiente queda en el spool"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Espera a que no queden mensajes vencidos ni en envío (útil en tests y al apagar)"""
+        self.start()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._db_lock:
+                busy = self._conn.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE (status = ? AND next_attempt_at <= ?) OR status = ?",
+                    (PENDING, time.time(), SENDING),
+                ).fetchone()[0]
+            if not busy:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def metrics(self) -> dict:
+        with self._db_lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM outbox WHERE status = ?", (PENDING,)
+            ).fetchone()[0]
+            metrics = dict(self._metrics)
+        sent = metrics["sent"]
+        return {
+            **metrics,
+            "queue_depth": counts.get(PENDING, 0) + counts.get(SENDING, 0),
+            "in_flight": counts.get(SENDING, 0),
+            "failed_in_spool": counts.get(FAILED, 0),
+            "oldest_pending_age_s": time.time() - oldest if oldest else 0.0,
+            "messages_per_connection": sent / metrics["connections_opened"] if metrics["connections_opened"] else 0.0,
+            "delivery_avg_ms": metrics["delivery_total_s"] / sent * 1000 if sent else 0.0,
+            "sender_running": self._thread is not None and self._thread.is_alive(),
+        }
+
+    def close(self) -> None:
+        self.stop()
+        with self._db_lock:
+            self._conn.close()
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_outbox() -> EmailOutbox:
+    """Bandeja compartida del proceso (se crea al primer uso)"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = EmailOutbox()
+        return _outbox
+
+def close_outbox() -> None:
+    global _outbox
+    with _outbox_lock:
+        outbox, _outbox = _outbox, None
+    if outbox is not None:
+        outbox.close()
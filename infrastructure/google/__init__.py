@@ -1,6 +1,9 @@
+from .calendar_client import CalendarClient, GoogleCalendarClient, InMemoryCalendarClient, SyncTokenExpired
+from .event_cache import CalendarEventCache, get_event_cache, set_calendar_client, calendar_metrics
+from .scheduling import merge_intervals, find_free_slots, free_slots, format_slots
+
 try:
-    from .calendar_service import create_event, get_events
-    __all__ = ["create_event", "get_events"]
+    from .calendar_service import create_event, get_events, start_calendar_service, stop_calendar_service, calendar_api_metrics
 except ImportError as e:
     # Si las dependencias de Google no están instaladas, creamos funciones stub
     def create_event(*args, **kwargs):
@@ -9,5 +12,31 @@ except ImportError as e:
     def get_events(*args, **kwargs):
         raise ImportError("Google Calendar dependencies not installed. Install google-api-python-client and google-auth-oauthlib")
     
-    __all__ = ["create_event", "get_events"]
+    def start_calendar_service():
+        raise ImportError("Google Calendar dependencies not installed. Install google-api-python-client and google-auth-oauthlib")
+    
+    def stop_calendar_service():
+        pass
+    
+    def calendar_api_metrics():
+        return {"available": False}
 
+__all__ = [
+    "create_event",
+    "get_events",
+    "start_calendar_service",
+    "stop_calendar_service",
+    "calendar_api_metrics",
+    "CalendarClient",
+    "GoogleCalendarClient",
+    "InMemoryCalendarClient",
+    "SyncTokenExpired",
+    "CalendarEventCache",
+    "get_event_cache",
+    "set_calendar_client",
+    "calendar_metrics",
+    "merge_intervals",
+    "find_free_slots",
+    "free_slots",
+    "format_slots"
+]
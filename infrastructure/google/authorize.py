@@ -0,0 +1,36 @@
+"""
+Autorización OAuth interactiva de Google Calendar.
+
+Abre el navegador para dar acceso al calendario y muestra los tokens que hay
+que agregar a CREDENTIALS_JSON. El servidor nunca corre este flujo: si faltan
+los tokens, calendar_service falla con un error que remite a este comando.
+
+Uso:
+    python -m infrastructure.google.authorize [--port 4000]
+"""
+import json
+import sys
+from google_auth_oauthlib.flow import InstalledAppFlow
+from app.config.settings import settings
+from .calendar_service import SCOPES, client_config
+
+def main(port: int = 4000):
+    if not settings.CREDENTIALS_JSON:
+        raise SystemExit("CREDENTIALS_JSON environment variable is not set")
+    full_credentials = json.loads(settings.CREDENTIALS_JSON.strip())
+    credentials_dict = client_config(full_credentials)
+
+    print("Starting OAuth flow...")
+    print("A browser window will open for you to authenticate.")
+    flow = InstalledAppFlow.from_client_config({'installed': credentials_dict}, SCOPES)
+    creds = flow.run_local_server(port=port)
+
+    print("OAuth authentication completed successfully!")
+    print(f"Access Token: {creds.token[:20]}...")
+    print(f"Refresh Token: {'Present' if creds.refresh_token else 'Not present'}")
+    print("\nIMPORTANT: Save these tokens in your CREDENTIALS_JSON:")
+    print(f'Add to your .env: "refresh_token":"{creds.refresh_token}","access_token":"{creds.token}"')
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[args.index("--port") + 1]) if "--port" in args else 4000)
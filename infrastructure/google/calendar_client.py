@@ -0,0 +1,120 @@
+"""
+Interfaz mínima sobre la API de Google Calendar que usa el cache de eventos.
+
+GoogleCalendarClient es la implementación real (googleapiclient se importa
+recién al usarla); InMemoryCalendarClient es un fake local con la misma
+semántica de páginas y sync tokens, para tests y benchmarks.
+"""
+import itertools
+from typing import Callable, Dict, List, Optional
+
+class SyncTokenExpired(Exception):
+    """El sync token ya no es válido (HTTP 410): hay que volver a sincronizar todo"""
+
+class CalendarClient:
+    """Operaciones de Google Calendar que necesita el cache"""
+
+    def list_events(self, calendar_id: str, page_token: str = None, sync_token: str = None, page_size: int = 250) -> dict:
+        """
+        Una página de events.list con singleEvents=True y showDeleted=True.
+        Retorna {"items": [...], "nextPageToken": ..., "nextSyncToken": ...};
+        el nextSyncToken solo viene en la última página.
+        Lanza SyncTokenExpired si el servidor rechaza el sync_token.
+        """
+        raise NotImplementedError
+
+    def insert_event(self, calendar_id: str, body: dict) -> dict:
+        raise NotImplementedError
+
+class GoogleCalendarClient(CalendarClient):
+    """
+    Cliente sobre googleapiclient. Sin service_factory, cada request corre en
+    el executor de calendar_service con el servicio autenticado de ese hilo.
+    """
+
+    def __init__(self, service_factory: Callable = None):
+        self._service_factory = service_factory
+
+    def _execute(self, request: Callable):
+        """Ejecuta request(service).execute()"""
+        if self._service_factory is not None:
+            return request(self._service_factory()).execute()
+        from .calendar_service import calendar_call
+        return calendar_call(lambda service: request(service).execute())
+
+    def list_events(self, calendar_id: str, page_token: str = None, sync_token: str = None, page_size: int = 250) -> dict:
+        from googleapiclient.errors import HttpError
+        params = {
+            "calendarId": calendar_id,
+            "singleEvents": True,
+            "showDeleted": True,
+            "maxResults": page_size,
+        }
+        if page_token:
+            params["pageToken"] = page_token
+        if sync_token:
+            params["syncToken"] = sync_token
+        try:
+            return self._execute(lambda service: service.events().list(**params))
+        except HttpError as e:
+            if getattr(e, "status_code", None) == 410 or getattr(e.resp, "status", None) == 410:
+                raise SyncTokenExpired(str(e)) from e
+            raise
+
+    def insert_event(self, calendar_id: str, body: dict) -> dict:
+        return self._execute(lambda service: service.events().insert(calendarId=calendar_id, body=body))
+
+class InMemoryCalendarClient(CalendarClient):
+    """
+    Calendario local con páginas y sync tokens como los de la API: cada
+    cambio incrementa una versión y un sync token devuelve lo modificado desde
+    la versión en que se emitió.
+    """
+
+    def __init__(self, events: List[dict] = None):
+        self._ids = itertools.count(1)
+        self._version = 0
+        self._events: Dict[str, dict] = {}
+        self._changed_at: Dict[str, int] = {}
+        self.list_calls = 0
+        self.expired_tokens = set()
+        for event in events or []:
+            self.insert_event("primary", event)
+
+    def _touch(self, event: dict) -> None:
+        self._version += 1
+        self._events[event["id"]] = event
+        self._changed_at[event["id"]] = self._version
+
+    def insert_event(self, calendar_id: str, body: dict) -> dict:
+        event = {"status": "confirmed", **body}
+        event.setdefault("id", f"evt{next(self._ids)}")
+        self._touch(event)
+        return dict(event)
+
+    def update_event(self, event_id: str, **changes) -> None:
+        self._touch({**self._events[event_id], **changes})
+
+    def delete_event(self, event_id: str) -> None:
+        self._touch({"id": event_id, "status": "cancelled"})
+
+    def list_events(self, calendar_id: str, page_token: str = None, sync_token: str = None, page_size: int = 250) -> dict:
+        self.list_calls += 1
+        if sync_token in self.expired_tokens:
+            raise SyncTokenExpired(sync_token)
+        since = int(sync_token) if sync_token else 0
+        changed = sorted(
+            (event_id for event_id, version in self._changed_at.items() if version > since),
+            key=self._changed_at.get,
+        )
+        if not sync_token:
+            # La sincronización completa no devuelve los eventos ya borrados
+            changed = [event_id for event_id in changed if self._events[event_id].get("status") != "cancelled"]
+        start = int(page_token or 0)
+        page = changed[start:start + page_size]
+        result = {"items": [dict(self._events[event_id]) for event_id in page]}
+        if start + page_size < len(changed):
+            result["nextPageToken"] = str(start + page_size)
+        else:
+            result["nextSyncToken"] = str(self._version)
+        return result
@@ -1,96 +1,247 @@
-import os
+"""
+Acceso a la API de Google Calendar.
+
+Las credenciales se cargan de CREDENTIALS_JSON y un hilo de fondo renueva el
+access token antes de que venza, así ninguna consulta paga el refresco. El
+flujo OAuth interactivo no corre nunca en el servidor: si faltan los tokens
+hay que generarlos con `python -m infrastructure.google.authorize`.
+
+Las llamadas HTTP corren en un executor acotado (CALENDAR_MAX_WORKERS) con un
+servicio de googleapiclient por hilo: httplib2 no es thread-safe y con un
+único servicio global los pacientes concurrentes se serializaban.
+"""
 import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Optional
+import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 from app.config.settings import settings
+from .event_cache import get_event_cache
+
+logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
-# Variable global para el servicio (inicialización lazy)
-_service = None
+def client_config(full_credentials: dict) -> dict:
+    """Datos del cliente OAuth de CREDENTIALS_JSON (formato "web" o plano), validados"""
+    credentials_dict = full_credentials.get('web', full_credentials)
+    required_fields = ['token_uri', 'client_id', 'client_secret']
+    missing_fields = [field for field in required_fields if not credentials_dict.get(field)]
+    if missing_fields:
+        raise ValueError(
+            f"Missing required credential fields: {', '.join(missing_fields)}. "
+            f"Please ensure your CREDENTIALS_JSON contains: {', '.join(required_fields)}"
+        )
+    return credentials_dict
 
-def get_authenticated_service():
-    """Obtiene el servicio autenticado de Google Calendar con manejo mejorado de credenciales"""
-    global _service
-    
-    if _service is not None:
-        return _service
-    
-    credentials_json = settings.CREDENTIALS_JSON
+def load_credentials(credentials_json: str = None) -> Credentials:
+    """Credenciales de CREDENTIALS_JSON; nunca abre el flujo OAuth interactivo"""
+    credentials_json = credentials_json or settings.CREDENTIALS_JSON
     if not credentials_json:
         raise ValueError("CREDENTIALS_JSON environment variable is not set")
-    
-    credentials_json = credentials_json.strip()
-    
     try:
-        full_credentials = json.loads(credentials_json)
-        
-        if 'web' in full_credentials:
-            credentials_dict = full_credentials['web']
-        else:
-            credentials_dict = full_credentials
-        
-        required_fields = ['token_uri', 'client_id', 'client_secret']
-        missing_fields = [field for field in required_fields if not credentials_dict.get(field)]
-        
-        if missing_fields:
-            raise ValueError(
-                f"Missing required credential fields: {', '.join(missing_fields)}. "
-                f"Please ensure your CREDENTIALS_JSON contains: {', '.join(required_fields)}"
-            )
-        
-        refresh_token = credentials_dict.get('refresh_token') or full_credentials.get('refresh_token')
-        access_token = credentials_dict.get('access_token') or full_credentials.get('access_token')
-        
-        if not refresh_token and not access_token:
-            print("No tokens found. Starting OAuth flow...")
-            print("A browser window will open for you to authenticate.")
-            
-            if 'web' in full_credentials:
-                client_config = {'installed': credentials_dict}
-            else:
-                client_config = full_credentials
-            
-            flow = InstalledAppFlow.from_client_config(client_config, SCOPES)
-            creds = flow.run_local_server(port=4000)
-            
-            print("OAuth authentication completed successfully!")
-            print(f"Access Token: {creds.token[:20]}...")
-            print(f"Refresh Token: {'Present' if creds.refresh_token else 'Not present'}")
-            print("\nIMPORTANT: Save these tokens in your CREDENTIALS_JSON:")
-            print(f'Add to your .env: "refresh_token":"{creds.refresh_token}","access_token":"{creds.token}"')
-            
-        else:
-            creds = Credentials(
-                token=access_token,
-                refresh_token=refresh_token,
-                token_uri=credentials_dict['token_uri'],
-                client_id=credentials_dict['client_id'],
-                client_secret=credentials_dict['client_secret'],
-                scopes=SCOPES
-            )
-            
-            if not creds.valid:
-                if creds.expired and creds.refresh_token:
-                    print("Refreshing expired credentials...")
-                    creds.refresh(Request())
-                    print("Credentials refreshed successfully")
-                else:
-                    raise ValueError("Credentials are invalid and cannot be refreshed")
-        
-        _service = build('calendar', 'v3', credentials=creds)
-        return _service
-        
+        full_credentials = json.loads(credentials_json.strip())
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in CREDENTIALS_JSON: {e}")
-    except Exception as e:
-        raise ValueError(f"Error loading credentials: {e}")
+    credentials_dict = client_config(full_credentials)
+
+    refresh_token = credentials_dict.get('refresh_token') or full_credentials.get('refresh_token')
+    access_token = credentials_dict.get('access_token') or full_credentials.get('access_token')
+    if not refresh_token and not access_token:
+        raise ValueError(
+            "CREDENTIALS_JSON has no refresh_token or access_token. "
+            "Run `python -m infrastructure.google.authorize` once and add the tokens it prints."
+        )
+    return Credentials(
+        token=access_token,
+        refresh_token=refresh_token,
+        token_uri=credentials_dict['token_uri'],
+        client_id=credentials_dict['client_id'],
+        client_secret=credentials_dict['client_secret'],
+        scopes=SCOPES
+    )
+
+def _expires_in(creds: Credentials) -> Optional[float]:
+    """Segundos hasta que vence el access token (None si no se conoce)"""
+    if creds.expiry is None:
+        return None
+    # google-auth guarda expiry como UTC sin zona
+    return (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+
+class CalendarAuth:
+    """
+    Credenciales compartidas con renovación de fondo. Todos los servicios
+    usan el mismo objeto Credentials, que el refresher actualiza en su lugar;
+    si una consulta lo encuentra vencido (refresher caído) lo renueva una
+    sola vez bajo el lock.
+    """
+
+    def __init__(self, loader: Callable[[], Credentials] = None):
+        self._loader = loader or load_credentials
+        self._creds: Optional[Credentials] = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._metrics = {"refreshes": 0, "inline_refreshes": 0, "refresh_errors": 0}
+        self._last_error: Optional[str] = None
+
+    def _load(self) -> Credentials:
+        if self._creds is None:
+            self._creds = self._loader()
+        return self._creds
+
+    def _refresh_locked(self) -> None:
+        creds = self._creds
+        if not creds.refresh_token:
+            raise ValueError("Credentials are invalid and cannot be refreshed")
+        try:
+            creds.refresh(Request())
+        except Exception as e:
+            self._metrics["refresh_errors"] += 1
+            self._last_error = str(e)
+            raise
+        self._metrics["refreshes"] += 1
+        self._last_error = None
+
+    def credentials(self) -> Credentials:
+        with self._lock:
+            creds = self._load()
+            # Se revisa bajo el lock: si otro hilo ya lo renovó, no se repite
+            if not creds.valid:
+                logger.warning("Access token de Google Calendar vencido en una consulta, renovando")
+                self._metrics["inline_refreshes"] += 1
+                self._refresh_locked()
+            return creds
+
+    def refresh_if_needed(self) -> Optional[float]:
+        """Renueva si vence dentro del margen; retorna los segundos hasta el próximo vencimiento"""
+        with self._lock:
+            creds = self._load()
+            expires_in = _expires_in(creds)
+            expiring = expires_in is None or expires_in <= settings.CALENDAR_TOKEN_REFRESH_MARGIN
+            # Con solo un access token no hay nada que renovar hasta que venza
+            if not creds.valid or (creds.refresh_token and expiring):
+                self._refresh_locked()
+                expires_in = _expires_in(creds)
+            return expires_in
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                expires_in = self.refresh_if_needed()
+                wait = max((expires_in or 3600) - settings.CALENDAR_TOKEN_REFRESH_MARGIN, settings.CALENDAR_TOKEN_RETRY_SECONDS)
+            except ValueError as e:
+                # Configuración inválida o sin refresh_token: reintentar no sirve
+                logger.error(f"Credenciales de Google Calendar: {e}")
+                self._last_error = str(e)
+                return
+            except Exception as e:
+                logger.warning(f"No se pudo renovar el token de Google Calendar: {e}")
+                wait = settings.CALENDAR_TOKEN_RETRY_SECONDS
+            self._stopping.wait(wait)
+
+    def start(self) -> None:
+        """Arranca el refresher (idempotente); la primera renovación corre enseguida"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="calendar-auth", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
 
-def create_event(title, description, start_time, end_time):
-    service = get_authenticated_service()
+    def metrics(self) -> dict:
+        creds = self._creds
+        return {
+            **self._metrics,
+            "token_expires_in_s": _expires_in(creds) if creds else None,
+            "refresher_running": self._thread is not None and self._thread.is_alive(),
+            "last_error": self._last_error,
+        }
+
+calendar_auth = CalendarAuth()
+
+_local = threading.local()
+
+def get_authenticated_service():
+    """Servicio de Google Calendar del hilo actual, sobre su propia conexión httplib2"""
+    creds = calendar_auth.credentials()
+    service = getattr(_local, "service", None)
+    if service is None or _local.creds is not creds:
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=settings.CALENDAR_HTTP_TIMEOUT))
+        service = build('calendar', 'v3', http=http, cache_discovery=False)
+        _local.service, _local.creds = service, creds
+    return service
+
+_EXECUTOR_PREFIX = "calendar-api"
+_executor = ThreadPoolExecutor(max_workers=settings.CALENDAR_MAX_WORKERS, thread_name_prefix=_EXECUTOR_PREFIX)
+_call_metrics = {"calls": 0, "errors": 0, "timeouts": 0, "in_flight": 0, "call_total_s": 0.0}
+_call_lock = threading.Lock()
+
+def _run_with_service(fn: Callable):
+    with _call_lock:
+        _call_metrics["in_flight"] += 1
+    t0 = time.perf_counter()
+    try:
+        return fn(get_authenticated_service())
+    except Exception:
+        with _call_lock:
+            _call_metrics["errors"] += 1
+        raise
+    finally:
+        with _call_lock:
+            _call_metrics["in_flight"] -= 1
+            _call_metrics["calls"] += 1
+            _call_metrics["call_total_s"] += time.perf_counter() - t0
+
+def calendar_call(fn: Callable, timeout: float = None):
+    """
+    Ejecuta fn(service) en el executor del calendario y espera el resultado.
+    Las llamadas que ya corren en el executor se ejecutan directo (sin encolarse
+    detrás de sí mismas).
+    """
+    if threading.current_thread().name.startswith(_EXECUTOR_PREFIX):
+        return _run_with_service(fn)
+    future = _executor.submit(_run_with_service, fn)
+    try:
+        return future.result(timeout or settings.CALENDAR_CALL_TIMEOUT)
+    except TimeoutError:
+        with _call_lock:
+            _call_metrics["timeouts"] += 1
+        future.cancel()
+        raise
+
+def start_calendar_service() -> None:
+    """Arranca la renovación de fondo del token (el servidor la llama al iniciar)"""
+    calendar_auth.start()
+
+def stop_calendar_service() -> None:
+    calendar_auth.stop()
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+def calendar_api_metrics() -> dict:
+    with _call_lock:
+        metrics = dict(_call_metrics)
+    calls = metrics.pop("call_total_s")
+    return {
+        **metrics,
+        "call_avg_ms": calls / metrics["calls"] * 1000 if metrics["calls"] else 0.0,
+        "max_workers": settings.CALENDAR_MAX_WORKERS,
+        "auth": calendar_auth.metrics(),
+    }
+
+def create_event(title, description, start_time, end_time, calendar_id: str = "primary"):
     event = {
         "summary": title,
         "description": description,
@@ -101,27 +252,16 @@ def create_event(title, description, start_time, end_time):
             "dateTime": end_time
         }
     }
-    event = service.events().insert(calendarId="primary", body=event).execute()
-    return event
+    # Alta en Google y en el cache local, así la disponibilidad la refleja enseguida
+    return get_event_cache(calendar_id).insert(event)
 
-def get_events(params: dict):
-    service = get_authenticated_service()
-    print("PARAMS: ", params)
+def get_events(params: dict, calendar_id: str = "primary"):
+    """
+    Eventos que se superponen con [time_min, time_max), desde el cache del
+    calendario (sincronizado de forma incremental con la API).
+    """
     time_min = params.get("time_min")
     time_max = params.get("time_max")
-    events_result = service.events().list(
-        calendarId='primary', timeMin=time_min, timeMax=time_max,
-        maxResults=10, singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    events = events_result.get('items', [])
-
-    if not events:
-        print('No upcoming events found.')
-    else:
-        for event in events:
-            start = event['start'].get('dateTime', event['start'].get('date'))
-            print(start, event['summary'], event['id'])
-    
+    events = get_event_cache(calendar_id).events_between(time_min, time_max)
+    print(f"Eventos entre {time_min} y {time_max}: {len(events)}")
     return events
-
@@ -0,0 +1,258 @@
+"""
+Cache de eventos de Google Calendar por calendario.
+
+Se llena con una sincronización completa (paginada) y después se mantiene al
+día con los sync tokens de la API: cada consulta de disponibilidad pide solo
+los cambios desde la última sincronización, como mucho una vez cada
+CALENDAR_SYNC_INTERVAL segundos. Las consultas por rango se resuelven sobre un
+índice en memoria ordenado por inicio.
+"""
+import bisect
+import logging
+import threading
+import time
+from datetime import datetime, time as dt_time, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+from app.config.settings import settings
+from .calendar_client import CalendarClient, GoogleCalendarClient, SyncTokenExpired
+
+logger = logging.getLogger(__name__)
+
+def _calendar_timezone():
+    try:
+        return ZoneInfo(settings.CALENDAR_TIMEZONE)
+    except Exception:
+        return timezone.utc
+
+def parse_event_time(value) -> Optional[datetime]:
+    """datetime con zona de una fecha ISO o del start/end de un evento ({"dateTime"} o {"date"})"""
+    if isinstance(value, dict):
+        value = value.get("dateTime") or value.get("date")
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif len(value) == 10:
+        # Evento de día completo: la fecha es local al calendario
+        parsed = datetime.combine(datetime.fromisoformat(value).date(), dt_time(), _calendar_timezone())
+    else:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=_calendar_timezone())
+
+class CalendarEventCache:
+    """
+    Eventos de un calendario indexados por inicio. Los eventos se guardan por
+    id; el índice es una lista ordenada de (inicio, id) más la duración máxima
+    vista, que acota cuánto antes del rango puede empezar un evento que lo pisa.
+    """
+
+    def __init__(self, client: CalendarClient, calendar_id: str = "primary"):
+        self.client = client
+        self.calendar_id = calendar_id
+        self._lock = threading.RLock()
+        # Serializa las sincronizaciones; el pull a la API corre fuera de _lock
+        self._sync_lock = threading.Lock()
+        # Eventos insertados durante una sincronización en curso (None si no hay ninguna)
+        self._local_writes: Optional[Dict[str, dict]] = None
+        self._events: Dict[str, dict] = {}
+        self._bounds: Dict[str, Tuple[float, float]] = {}
+        self._starts: List[Tuple[float, str]] = []
+        self._max_duration = 0.0
+        self._sync_token: Optional[str] = None
+        self._synced_at: Optional[float] = None
+        self._metrics = {"full_syncs": 0, "incremental_syncs": 0, "expired_tokens": 0, "pages": 0, "lookups": 0}
+
+    # --- índice ---
+
+    def _remove(self, event_id: str) -> None:
+        bounds = self._bounds.pop(event_id, None)
+        self._events.pop(event_id, None)
+        if bounds is not None:
+            i = bisect.bisect_left(self._starts, (bounds[0], event_id))
+            if i < len(self._starts) and self._starts[i] == (bounds[0], event_id):
+                del self._starts[i]
+
+    def _upsert(self, event: dict) -> None:
+        event_id = event["id"]
+        self._remove(event_id)
+        if event.get("status") == "cancelled":
+            return
+        start, end = parse_event_time(event.get("start")), parse_event_time(event.get("end"))
+        if start is None:
+            return
+        start_ts = start.timestamp()
+        end_ts = end.timestamp() if end else start_ts
+        self._events[event_id] = event
+        self._bounds[event_id] = (start_ts, end_ts)
+        bisect.insort(self._starts, (start_ts, event_id))
+        self._max_duration = max(self._max_duration, end_ts - start_ts)
+
+    def _clear(self) -> None:
+        self._events.clear()
+        self._bounds.clear()
+        self._starts.clear()
+        self._max_duration = 0.0
+        self._sync_token = None
+
+    # --- sincronización ---
+
+    def _pull(self, sync_token: Optional[str]) -> Tuple[List[dict], str, int]:
+        """Todas las páginas de una sincronización (completa o incremental), sin tomar el lock del cache"""
+        items, page_token, pages = [], None, 0
+        while True:
+            page = self.client.list_events(
+                self.calendar_id,
+                page_token=page_token,
+                sync_token=sync_token,
+                page_size=settings.CALENDAR_PAGE_SIZE,
+            )
+            pages += 1
+            items.extend(page.get("items", []))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return items, page.get("nextSyncToken"), pages
+
+    def sync(self) -> None:
+        """
+        Trae los cambios desde el último sync token (o todo, la primera vez o
+        si expiró). Las páginas se piden sin el lock del cache: las consultas
+        siguen respondiendo con el índice actual y el resultado se aplica de
+        una vez al final. Dos sincronizaciones del mismo calendario no corren
+        a la vez.
+        """
+        with self._sync_lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        with self._lock:
+            sync_token = self._sync_token
+            self._local_writes = {}
+        full, expired, pages = not sync_token, False, 0
+        if sync_token:
+            try:
+                items, token, pages = self._pull(sync_token)
+            except SyncTokenExpired:
+                logger.info(f"Sync token del calendario {self.calendar_id} expirado, sincronizando todo")
+                full = expired = True
+        if full:
+            items, token, full_pages = self._pull(None)
+            pages += full_pages
+            logger.info(f"Calendario {self.calendar_id}: {len(items)} eventos en la sincronización completa")
+
+        with self._lock:
+            if full:
+                self._clear()
+            for event in items:
+                self._upsert(event)
+            # Eventos creados con insert() mientras se pedían las páginas y que el pull no trajo
+            pulled = {event.get("id") for event in items}
+            for event_id, event in self._local_writes.items():
+                if event_id not in pulled:
+                    self._upsert(event)
+            self._local_writes = None
+            self._sync_token = token
+            self._synced_at = time.monotonic()
+            self._metrics["pages"] += pages
+            self._metrics["full_syncs" if full else "incremental_syncs"] += 1
+            self._metrics["expired_tokens"] += int(expired)
+
+    def ensure_fresh(self, max_age: float = None) -> None:
+        """
+        Sincroniza si el índice tiene más de max_age segundos. Si otro hilo ya
+        está sincronizando, se responde con el índice actual en lugar de
+        esperarlo; solo se espera cuando todavía no hay ninguna sincronización.
+        """
+        max_age = settings.CALENDAR_SYNC_INTERVAL if max_age is None else max_age
+        if not self._stale(max_age):
+            return
+        if self._synced_at is None:
+            with self._sync_lock:
+                if self._synced_at is None:
+                    self._sync()
+            return
+        if self._sync_lock.acquire(blocking=False):
+            try:
+                if self._stale(max_age):
+                    self._sync()
+            finally:
+                self._sync_lock.release()
+
+    def _stale(self, max_age: float) -> bool:
+        with self._lock:
+            return self._synced_at is None or time.monotonic() - self._synced_at >= max_age
+
+    # --- consultas ---
+
+    def _events_between(self, time_min, time_max) -> List[dict]:
+        low = parse_event_time(time_min).timestamp() if time_min else float("-inf")
+        high = parse_event_time(time_max).timestamp() if time_max else float("inf")
+        self._metrics["lookups"] += 1
+        first = bisect.bisect_left(self._starts, (low - self._max_duration, ""))
+        last = bisect.bisect_left(self._starts, (high, ""))
+        return [
+            self._events[event_id]
+            for _, event_id in self._starts[first:last]
+            if self._bounds[event_id][1] > low or self._bounds[event_id][0] >= low
+        ]
+
+    def events_between(self, time_min=None, time_max=None, max_age: float = None) -> List[dict]:
+        """Eventos que se superponen con [time_min, time_max), ordenados por inicio"""
+        self.ensure_fresh(max_age)
+        with self._lock:
+            return self._events_between(time_min, time_max)
+
+    def busy_between(self, time_min, time_max, max_age: float = None) -> List[Tuple[float, float]]:
+        """Intervalos (inicio, fin) en timestamps de los eventos que ocupan tiempo en el rango"""
+        self.ensure_fresh(max_age)
+        with self._lock:
+            return [
+                self._bounds[event["id"]]
+                for event in self._events_between(time_min, time_max)
+                # Los eventos marcados como "disponible" no bloquean turnos
+                if event.get("transparency") != "transparent"
+            ]
+
+    def insert(self, body: dict) -> dict:
+        """Crea el evento y lo agrega al cache sin esperar a la próxima sincronización"""
+        event = self.client.insert_event(self.calendar_id, body)
+        with self._lock:
+            self._upsert(event)
+            if self._local_writes is not None:
+                self._local_writes[event["id"]] = event
+        return event
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                **self._metrics,
+                "events": len(self._events),
+                "synced_age_s": time.monotonic() - self._synced_at if self._synced_at else None,
+            }
+
+_client: Optional[CalendarClient] = None
+_caches: Dict[str, CalendarEventCache] = {}
+_caches_lock = threading.Lock()
+
+def set_calendar_client(client: Optional[CalendarClient]) -> None:
+    """Reemplaza el cliente de Google Calendar (p. ej. por un fake local) y vacía los caches"""
+    global _client
+    with _caches_lock:
+        _client = client
+        _caches.clear()
+
+def get_event_cache(calendar_id: str = "primary") -> CalendarEventCache:
+    """Cache compartido del calendario"""
+    global _client
+    with _caches_lock:
+        if _client is None:
+            _client = GoogleCalendarClient()
+        cache = _caches.get(calendar_id)
+        if cache is None:
+            cache = _caches[calendar_id] = CalendarEventCache(_client, calendar_id)
+        return cache
+
+def calendar_metrics() -> dict:
+    with _caches_lock:
+        caches = dict(_caches)
+    return {calendar_id: cache.metrics() for calendar_id, cache in caches.items()}
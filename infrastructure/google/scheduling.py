@@ -0,0 +1,112 @@
+"""
+Motor de turnos libres.
+
+Une los intervalos ocupados del calendario con un barrido ordenado, los
+recorta al horario de atención de cada día (en la zona horaria del
+calendario) y devuelve los primeros turnos libres de la duración pedida. El
+LLM ya no tiene que deducir los huecos a partir de la lista de eventos.
+"""
+import bisect
+from datetime import datetime, time as dt_time, timedelta, tzinfo
+from typing import Iterable, List, Optional, Sequence, Tuple
+from app.config.settings import settings
+from .event_cache import _calendar_timezone, get_event_cache, parse_event_time
+
+Interval = Tuple[float, float]
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Une intervalos superpuestos o contiguos (barrido sobre los inicios ordenados)"""
+    merged: List[List[float]] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+def _parse_clock(value: str) -> dt_time:
+    hours, _, minutes = value.partition(":")
+    return dt_time(int(hours), int(minutes or 0))
+
+def working_windows(start: datetime, end: datetime, tz: tzinfo, day_start: dt_time, day_end: dt_time,
+                    workdays: Sequence[int]) -> Iterable[Interval]:
+    """Horario de atención completo de cada día hábil que se superpone con [start, end), como timestamps"""
+    day = start.astimezone(tz).date()
+    last_day = end.astimezone(tz).date()
+    while day <= last_day:
+        if day.weekday() in workdays:
+            # combine con tzinfo resuelve bien los cambios de horario de verano
+            opens = datetime.combine(day, day_start, tz).timestamp()
+            closes = datetime.combine(day, day_end, tz).timestamp()
+            if opens < end.timestamp() and closes > start.timestamp():
+                yield opens, closes
+        day += timedelta(days=1)
+
+def _align_up(value: float, origin: float, step: float) -> float:
+    """Primer origin + k * step que es >= value"""
+    return origin + max(-(-(value - origin) // step), 0) * step
+
+def find_free_slots(busy: Iterable[Interval], start: datetime, end: datetime, duration_minutes: int = 60,
+                    limit: int = 5, tz: tzinfo = None, day_start: str = None, day_end: str = None,
+                    workdays: Sequence[int] = None, step_minutes: int = None) -> List[Tuple[datetime, datetime]]:
+    """
+    Primeros `limit` turnos libres de `duration_minutes` entre start y end,
+    dentro del horario de atención. Los inicios se alinean a `step_minutes`
+    desde la apertura de cada día: si start cae a media mañana o un evento
+    termina fuera de la grilla, el turno empieza en el siguiente paso.
+    """
+    tz = tz or _calendar_timezone()
+    day_start = _parse_clock(day_start or settings.SCHEDULING_DAY_START)
+    day_end = _parse_clock(day_end or settings.SCHEDULING_DAY_END)
+    workdays = settings.SCHEDULING_WORKDAYS if workdays is None else workdays
+    step = (step_minutes or settings.SCHEDULING_SLOT_STEP_MINUTES) * 60
+    duration = duration_minutes * 60
+
+    merged = merge_intervals(busy)
+    busy_ends = [busy_end for _, busy_end in merged]
+    slots = []
+    for opens, closes in working_windows(start, end, tz, day_start, day_end, workdays):
+        closes = min(closes, end.timestamp())
+        cursor = _align_up(max(opens, start.timestamp()), opens, step)
+        # Primer intervalo ocupado que termina después del primer turno posible
+        i = bisect.bisect_right(busy_ends, cursor)
+        while cursor + duration <= closes and len(slots) < limit:
+            if i < len(merged) and merged[i][0] < cursor + duration:
+                # El turno pisa un intervalo ocupado: saltar a su fin, alineado al paso
+                cursor = max(cursor, _align_up(merged[i][1], opens, step))
+                i += 1
+                continue
+            slots.append((datetime.fromtimestamp(cursor, tz), datetime.fromtimestamp(cursor + duration, tz)))
+            cursor += step
+        if len(slots) >= limit:
+            break
+    return slots
+
+def free_slots(time_min, time_max, duration_minutes: int = 60, limit: int = 5,
+               calendar_id: str = "primary", not_before: Optional[datetime] = None) -> List[Tuple[datetime, datetime]]:
+    """Turnos libres del calendario entre time_min y time_max (ISO 8601 o fecha), desde el cache de eventos"""
+    tz = _calendar_timezone()
+    start = parse_event_time(time_min)
+    end = parse_event_time(time_max)
+    if isinstance(time_max, str) and len(time_max) == 10:
+        # Una fecha sola como fin incluye ese día completo
+        end += timedelta(days=1)
+    earliest = (not_before or datetime.now(tz)) + timedelta(minutes=settings.SCHEDULING_MIN_NOTICE_MINUTES)
+    start = max(start, earliest)
+    if start >= end:
+        return []
+    busy = get_event_cache(calendar_id).busy_between(start, end)
+    return find_free_slots(busy, start, end, duration_minutes, limit, tz)
+
+_WEEKDAYS = ("lun", "mar", "mié", "jue", "vie", "sáb", "dom")
+
+def format_slots(slots: List[Tuple[datetime, datetime]]) -> str:
+    """Una línea por turno, con la fecha legible y el inicio/fin en ISO para create_event"""
+    if not slots:
+        return "No hay turnos libres en ese rango."
+    return "\n".join(
+        f"- {_WEEKDAYS[start.weekday()]} {start:%d/%m %H:%M}-{end:%H:%M} (inicio {start.isoformat()}, fin {end.isoformat()})"
+        for start, end in slots
+    )
@@ -0,0 +1,18 @@
+from .checkpointer import SQLiteCheckpointSaver, create_checkpointer
+from .supabase_client import (
+    SupabaseStore,
+    PostgrestError,
+    get_supabase,
+    set_supabase,
+    close_supabase
+)
+
+__all__ = [
+    "SQLiteCheckpointSaver",
+    "create_checkpointer",
+    "SupabaseStore",
+    "PostgrestError",
+    "get_supabase",
+    "set_supabase",
+    "close_supabase"
+]
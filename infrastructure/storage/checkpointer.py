@@ -0,0 +1,424 @@
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any, Optional
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Blobs más chicos que esto no se comprimen (zlib no gana nada y cuesta CPU)
+_COMPRESS_MIN_BYTES = 512
+_ZLIB_SUFFIX = "+zlib"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    turn_start INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_updated_at ON threads (updated_at);
+"""
+
+_CHECKPOINT_COLUMNS = (
+    "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+)
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    Checkpointer de LangGraph sobre SQLite en modo WAL, local y compartible
+    entre workers de uvicorn que usen el mismo archivo.
+
+    - Los checkpoints y writes de un turno se acumulan en memoria y se
+      escriben en una sola transacción (un fsync por turno, no uno por nodo).
+      El batch se vacía al leer (get_tuple/list), con flush() explícito o,
+      como respaldo, `flush_interval` segundos después del primer write.
+    - Se conservan los checkpoints de los últimos `keep_last` turnos por
+      thread. Un turno arranca en el checkpoint con source "input" y deja
+      varios más (uno por paso del grafo), así que se poda desde el inicio
+      de turno más viejo que se conserva y nunca se corta un turno a medias.
+    - Los threads sin actividad por más de `ttl_seconds` se borran.
+    - Los blobs se serializan con el serde de LangGraph y se comprimen con zlib.
+    """
+
+    def __init__(self, path: str = None, keep_last: int = None, ttl_seconds: float = None,
+                 flush_interval: float = None, serde=None):
+        super().__init__(serde=serde)
+        self.path = path or settings.CHECKPOINT_DB_PATH
+        self.keep_last = keep_last or settings.CHECKPOINT_KEEP_LAST
+        self.ttl_seconds = settings.CHECKPOINT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.flush_interval = settings.CHECKPOINT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={settings.CHECKPOINT_SQLITE_SYNCHRONOUS}")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(checkpoints)")}
+        if "turn_start" not in columns:
+            # Base creada antes de la poda por turnos
+            self._conn.execute("ALTER TABLE checkpoints ADD COLUMN turn_start INTEGER NOT NULL DEFAULT 0")
+
+        self._lock = threading.RLock()
+        self._pending_checkpoints = {}
+        self._pending_writes = {}
+        self._flush_timer = None
+        self._last_eviction = 0.0
+        self._metrics = {
+            "flushes": 0,
+            "checkpoints_written": 0,
+            "writes_written": 0,
+            "checkpoints_pruned": 0,
+            "threads_expired": 0,
+        }
+
+    # --- serialización ---
+
+    def _dumps(self, value) -> tuple:
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) >= _COMPRESS_MIN_BYTES:
+            return type_ + _ZLIB_SUFFIX, zlib.compress(data, 6)
+        return type_, data
+
+    def _loads(self, type_: str, data: bytes):
+        if type_.endswith(_ZLIB_SUFFIX):
+            return self.serde.loads_typed((type_[:-len(_ZLIB_SUFFIX)], zlib.decompress(data)))
+        return self.serde.loads_typed((type_, data))
+
+    # --- batch de escritura ---
+
+    def _schedule_flush(self) -> None:
+        if self._flush_timer is None and self.flush_interval > 0:
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self) -> None:
+        """Escribe el batch pendiente en una transacción y aplica la retención"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending_checkpoints and not self._pending_writes:
+                return
+            checkpoints = list(self._pending_checkpoints.values())
+            writes = list(self._pending_writes.values())
+            threads = {row[0] for row in checkpoints} | {row[0] for row in writes}
+            now = time.time()
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", checkpoints
+                )
+                # Los writes especiales (índice negativo) se reemplazan; el resto no se pisa
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [w for w in writes if w[4] < 0]
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [w for w in writes if w[4] >= 0]
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO threads VALUES (?, ?)", [(t, now) for t in threads]
+                )
+                pruned = sum(self._prune_thread(t) for t in threads)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._pending_checkpoints.clear()
+            self._pending_writes.clear()
+            self._metrics["flushes"] += 1
+            self._metrics["checkpoints_written"] += len(checkpoints)
+            self._metrics["writes_written"] += len(writes)
+            self._metrics["checkpoints_pruned"] += pruned
+
+        if self.ttl_seconds and now - self._last_eviction >= min(self.ttl_seconds, 300):
+            self.evict_expired()
+
+    def _prune_thread(self, thread_id: str) -> int:
+        """Borra los checkpoints (y sus writes) anteriores a los últimos keep_last turnos"""
+        rows = self._conn.execute(
+            "SELECT checkpoint_ns, checkpoint_id FROM checkpoints WHERE thread_id = ? AND turn_start = 1"
+            " ORDER BY checkpoint_ns, checkpoint_id DESC",
+            (thread_id,),
+        ).fetchall()
+        turns_per_ns = {}
+        oldest_kept = {}
+        for ns, checkpoint_id in rows:
+            turns_per_ns[ns] = turns_per_ns.get(ns, 0) + 1
+            if turns_per_ns[ns] == self.keep_last:
+                oldest_kept[ns] = checkpoint_id
+        pruned = 0
+        # Los ids de checkpoint (uuid6) crecen con el tiempo: todo lo anterior al corte es de turnos viejos
+        for ns, checkpoint_id in oldest_kept.items():
+            params = (thread_id, ns, checkpoint_id)
+            pruned += self._conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?", params
+            ).rowcount
+            self._conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?", params
+            )
+        return pruned
+
+    def evict_expired(self) -> int:
+        """Borra los threads sin actividad en los últimos ttl_seconds. Retorna cuántos"""
+        if not self.ttl_seconds:
+            return 0
+        with self._lock:
+            self._last_eviction = time.time()
+            cutoff = self._last_eviction - self.ttl_seconds
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,)
+            )]
+            for thread_id in expired:
+                self._delete_thread_rows(thread_id)
+            self._metrics["threads_expired"] += len(expired)
+        if expired:
+            logger.info(f"Checkpointer: {len(expired)} threads expirados")
+        return len(expired)
+
+    def _delete_thread_rows(self, thread_id: str) -> None:
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("checkpoints", "writes", "threads"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    # --- API de BaseCheckpointSaver ---
+
+    def _row_to_tuple(self, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value, task_path, idx FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        writes.sort(key=lambda w: writes_sort_key(w[4], w[0], w[5]))
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint=self._loads(type_, checkpoint),
+            metadata=self._loads(metadata_type, metadata),
+            parent_config=(
+                {"configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": parent_id,
+                }}
+                if parent_id
+                else None
+            ),
+            pending_writes=[(task_id, channel, self._loads(t, v)) for task_id, channel, t, v, _, _ in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self.flush()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints"
+                    " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._row_to_tuple(row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: dict = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        self.flush()
+        query = f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints"
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                item = self._row_to_tuple(row)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(item)
+        yield from results
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, data = self._dumps(checkpoint)
+        metadata = get_checkpoint_metadata(config, metadata)
+        metadata_type, metadata_data = self._dumps(metadata)
+        with self._lock:
+            self._pending_checkpoints[(thread_id, checkpoint_ns, checkpoint["id"])] = (
+                thread_id,
+                checkpoint_ns,
+                checkpoint["id"],
+                config["configurable"].get("checkpoint_id"),
+                type_,
+                data,
+                metadata_type,
+                metadata_data,
+                int(metadata.get("source") == "input"),
+            )
+            self._schedule_flush()
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                key = (thread_id, checkpoint_ns, checkpoint_id, task_id, write_idx)
+                if write_idx >= 0 and key in self._pending_writes:
+                    continue
+                type_, data = self._dumps(value)
+                self._pending_writes[key] = (*key, channel, type_, data, task_path)
+            self._schedule_flush()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._pending_checkpoints if k[0] == thread_id]:
+                del self._pending_checkpoints[key]
+            for key in [k for k in self._pending_writes if k[0] == thread_id]:
+                del self._pending_writes[key]
+            self._delete_thread_rows(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # Las lecturas pueden tener que hacer fsync del batch y los writes
+    # serializan y comprimen con zlib: todo va a un hilo, fuera del loop.
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: dict = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: [*self.list(config, filter=filter, before=before, limit=limit)])
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aflush(self) -> None:
+        await asyncio.to_thread(self.flush)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                **self._metrics,
+                "pending_checkpoints": len(self._pending_checkpoints),
+                "pending_writes": len(self._pending_writes),
+            }
+
+def create_checkpointer(backend: str = None):
+    """
+    Crea el checkpointer configurado en CHECKPOINT_BACKEND: "sqlite" (por
+    defecto, persistente) o "memory" (MemorySaver, para desarrollo).
+    """
+    backend = (backend or settings.CHECKPOINT_BACKEND).lower()
+    if backend == "memory":
+        return MemorySaver()
+    if backend == "sqlite":
+        return SQLiteCheckpointSaver()
+    raise ValueError(f"CHECKPOINT_BACKEND desconocido: {backend}")
@@ -0,0 +1,275 @@
+"""
+Acceso a las tablas de Supabase a través de su API PostgREST.
+
+Un único cliente por proceso con pools HTTP keep-alive (sync para las
+herramientas, que corren en el executor, y async para el event loop), timeout
+por llamada y health check. La interfaz imita la del cliente de supabase-py
+(`table(...).select(...).eq(...).execute()`), así las herramientas no cambian
+de forma. Con POSTGREST_URL se apunta a cualquier PostgREST, por ejemplo un
+stand-in local para tests y benchmarks.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import httpx
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class PostgrestError(Exception):
+    """Error devuelto por PostgREST (status HTTP >= 400) o de conexión"""
+
+    def __init__(self, message: str, status_code: int = None, details: Any = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+class QueryResult:
+    """Resultado de una consulta, con la misma forma que el de supabase-py"""
+
+    def __init__(self, data: List[dict], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+class TableQuery:
+    """Builder de una consulta PostgREST sobre una tabla"""
+
+    def __init__(self, store: "SupabaseStore", table: str):
+        self._store = store
+        self._table = table
+        self._method = "GET"
+        self._params: List[tuple] = []
+        self._body = None
+
+    def select(self, columns: str = "*") -> "TableQuery":
+        self._params.append(("select", columns.replace(" ", "")))
+        return self
+
+    def update(self, data: Dict[str, Any]) -> "TableQuery":
+        self._method = "PATCH"
+        self._body = data
+        return self
+
+    def _filter(self, column: str, operator: str, value) -> "TableQuery":
+        self._params.append((column, f"{operator}.{value}"))
+        return self
+
+    def eq(self, column: str, value) -> "TableQuery":
+        return self._filter(column, "eq", value)
+
+    def gt(self, column: str, value) -> "TableQuery":
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value) -> "TableQuery":
+        return self._filter(column, "gte", value)
+
+    def ilike(self, column: str, pattern: str) -> "TableQuery":
+        return self._filter(column, "ilike", pattern)
+
+    def order(self, column: str, desc: bool = False) -> "TableQuery":
+        self._params.append(("order", f"{column}.{'desc' if desc else 'asc'}"))
+        return self
+
+    def limit(self, count: int) -> "TableQuery":
+        self._params.append(("limit", str(count)))
+        return self
+
+    def range(self, start: int, end: int) -> "TableQuery":
+        self._params.append(("offset", str(start)))
+        return self.limit(end - start + 1)
+
+    def _request(self) -> dict:
+        headers = {"Prefer": "return=representation"} if self._method != "GET" else {}
+        return {
+            "method": self._method,
+            "url": f"/{self._table}",
+            "params": self._params,
+            "json": self._body,
+            "headers": headers,
+        }
+
+    def execute(self, timeout: float = None) -> QueryResult:
+        """Ejecuta la consulta con el cliente sync compartido"""
+        return self._store.request(self._request(), timeout)
+
+    async def aexecute(self, timeout: float = None) -> QueryResult:
+        """Ejecuta la consulta con el cliente async compartido"""
+        return await self._store.arequest(self._request(), timeout)
+
+class SupabaseStore:
+    """
+    Clientes HTTP compartidos contra PostgREST. Se crean al primer uso y se
+    reutilizan en todas las llamadas: el handshake TLS se paga una vez por
+    conexión del pool y no por cada herramienta.
+    """
+
+    def __init__(self, base_url: str = None, api_key: str = None, timeout: float = None, max_connections: int = None):
+        self.base_url = (base_url or settings.postgrest_url or "").rstrip("/")
+        self.api_key = api_key or settings.SUPABASE_ANON_KEY
+        self.timeout = timeout or settings.SUPABASE_TIMEOUT
+        self.max_connections = max_connections or settings.SUPABASE_MAX_CONNECTIONS
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+        self._metrics = {"requests": 0, "errors": 0, "timeouts": 0, "request_total_s": 0.0, "healthy": None}
+
+    def _client_options(self) -> dict:
+        if not self.base_url:
+            raise PostgrestError("SUPABASE_URL (o POSTGREST_URL) no está configurada")
+        headers = {"Accept": "application/json"}
+        if self.api_key:
+            headers["apikey"] = self.api_key
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return {
+            "base_url": self.base_url,
+            "headers": headers,
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=60,
+            ),
+            "timeout": httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(**self._client_options())
+            return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(**self._client_options())
+            return self._async_client
+
+    def table(self, name: str) -> TableQuery:
+        return TableQuery(self, name)
+
+    def _send_kwargs(self, request: dict, timeout: Optional[float]) -> dict:
+        kwargs = dict(request)
+        if kwargs["json"] is None:
+            del kwargs["json"]
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=min(timeout, 5.0))
+        return kwargs
+
+    def _record(self, started: float, error: Exception = None) -> None:
+        with self._lock:
+            self._metrics["requests"] += 1
+            self._metrics["request_total_s"] += time.perf_counter() - started
+            if error is not None:
+                self._metrics["errors"] += 1
+                if isinstance(error, httpx.TimeoutException):
+                    self._metrics["timeouts"] += 1
+
+    @staticmethod
+    def _result(response: httpx.Response) -> QueryResult:
+        if response.status_code >= 400:
+            try:
+                details = response.json()
+            except ValueError:
+                details = response.text
+            message = details.get("message") if isinstance(details, dict) else details
+            raise PostgrestError(f"PostgREST {response.status_code}: {message}", response.status_code, details)
+        data = response.json() if response.content else []
+        return QueryResult(data if isinstance(data, list) else [data])
+
+    def request(self, request: dict, timeout: float = None) -> QueryResult:
+        started = time.perf_counter()
+        try:
+            response = self.client.request(**self._send_kwargs(request, timeout))
+            result = self._result(response)
+        except httpx.HTTPError as e:
+            self._record(started, e)
+            raise PostgrestError(f"Error de conexión con PostgREST: {e}") from e
+        except PostgrestError as e:
+            self._record(started, e)
+            raise
+        self._record(started)
+        return result
+
+    async def arequest(self, request: dict, timeout: float = None) -> QueryResult:
+        started = time.perf_counter()
+        try:
+            response = await self.async_client.request(**self._send_kwargs(request, timeout))
+            result = self._result(response)
+        except httpx.HTTPError as e:
+            self._record(started, e)
+            raise PostgrestError(f"Error de conexión con PostgREST: {e}") from e
+        except PostgrestError as e:
+            self._record(started, e)
+            raise
+        self._record(started)
+        return result
+
+    def _health_query(self) -> TableQuery:
+        return self.table(settings.SUPABASE_HEALTH_TABLE).select("id").limit(1)
+
+    def health_check(self, timeout: float = 2.0) -> bool:
+        """Consulta mínima contra SUPABASE_HEALTH_TABLE; también abre la primera conexión del pool"""
+        try:
+            self._health_query().execute(timeout=timeout)
+            healthy = True
+        except Exception as e:
+            logger.warning(f"Health check de Supabase falló: {e}")
+            healthy = False
+        self._metrics["healthy"] = healthy
+        return healthy
+
+    async def ahealth_check(self, timeout: float = 2.0) -> bool:
+        try:
+            await self._health_query().aexecute(timeout=timeout)
+            healthy = True
+        except Exception as e:
+            logger.warning(f"Health check de Supabase falló: {e}")
+            healthy = False
+        self._metrics["healthy"] = healthy
+        return healthy
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        self.close()
+        with self._lock:
+            client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.aclose()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            requests = self._metrics["requests"]
+            return {
+                **self._metrics,
+                "request_avg_ms": self._metrics["request_total_s"] / requests * 1000 if requests else 0.0,
+            }
+
+_store = None
+_store_lock = threading.Lock()
+
+def set_supabase(store: Optional[SupabaseStore]) -> None:
+    """Reemplaza el cliente compartido (p. ej. por uno apuntado a un PostgREST local)"""
+    global _store
+    _store = store
+
+def get_supabase() -> SupabaseStore:
+    """Cliente compartido del proceso"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SupabaseStore()
+        return _store
+
+async def close_supabase() -> None:
+    """Cierra los pools HTTP (al apagar la aplicación)"""
+    global _store
+    store, _store = _store, None
+    if store is not None:
+        await store.aclose()
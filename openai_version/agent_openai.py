@@ -1,14 +1,9 @@
 from agents import Agent, Runner
 from dotenv import load_dotenv
-import os
-from tools import create_event_tool, send_email_tool, get_events_tool, assistant_response
+from tools import create_event_tool, send_email_tool, find_free_slots_tool, suggest_specialty, assistant_response
 from datetime import datetime
 load_dotenv()
 
-relative_path = os.path.dirname(os.path.abspath(__file__))
-with open(os.path.join(relative_path, "doctors_derivation.txt"), "r", encoding="utf-8") as f:
-    derivation = f.read()
-
 date = datetime.now().strftime("%Y-%m-%d")
 
 prompt= f"""
@@ -43,7 +38,7 @@ Don't ask all the questions at once; Gather information gradually, within the co
 
 -- ### ⚙️ Available tool: Use the `set_info` tool to save relevant patient data. Use it once you have all the necessary information and pass it to the tool as a dictionary.
 
-Use the send_email tool to send an email to the doctor after saving all the information. Provide a single dictionary (JSON object) with these keys: first name, last name, gender, date of birth, resume, med_ins. In the "resume" key, include a brief summary of the symptoms and, if applicable, a suggested referral using this information: {derivation}
+Use the send_email tool to send an email to the doctor after saving all the information. Provide a single dictionary (JSON object) with these keys: first name, last name, gender, date of birth, resume, med_ins. In the "resume" key, include a brief summary of the symptoms and, if applicable, the suggested referral returned by the suggest_specialty tool for those symptoms
 
 Example (describe the structure, do not include literal curly braces):
 - send_email with a dict containing the keys: first name, last name, gender, date of birth, resume, med_ins
@@ -55,10 +50,10 @@ If you don't have the necessary information, just ask the user.
 
 Before creating an event, ask the user for their time zone.
 
-Use the get_events tool to retrieve upcoming events within a specific date range. Provide two fields: time_min and time_max (both ISO 8601 date and time).
-Example fields: time_min="2025-10-20T10:00:00Z", time_max="2025-10-20T11:00:00Z"
+Use the find_free_slots tool to get the doctor's free appointment slots within a date range. Provide date_from and date_to (ISO 8601 dates or date-times) and duration_minutes=60.
+Example fields: date_from="2025-10-20", date_to="2025-10-24", duration_minutes=60
 
-With the information returned by get_events, it looks for free times to schedule an appointment, which must last one hour. If there is no appointment on that date, let the patient choose the time
+Offer the patient the slots returned by find_free_slots; do not compute free times yourself. Use the start and end it returns to create the event
 
 ---### 🧩 Important rule:
 
@@ -77,7 +72,7 @@ agente_memoria = Agent(
         name="AgenteMemoria",
         instructions=prompt,
         model="gpt-4o",
-        tools=[create_event_tool, send_email_tool, get_events_tool]
+        tools=[create_event_tool, send_email_tool, find_free_slots_tool, suggest_specialty]
     )
 
 conversation_history = []
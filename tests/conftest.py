@@ -0,0 +1,4 @@
+import os
+
+# core.agents arma el grafo (y el cliente de OpenAI) al importarse; los tests no llaman al modelo
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from app.services import chat_service
+
+
+class FakeGraph:
+    """Grafo que responde enseguida y sigue "extrayendo" un rato, como app_graph"""
+
+    checkpointer = None
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.order = []
+
+    async def astream(self, graph_input, config, stream_mode):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.order.append(graph_input["query"])
+        try:
+            await asyncio.sleep(0.01)
+            reply = AIMessage(content=f"eco: {graph_input['query']}", id=graph_input["query"])
+            yield "messages", (reply, {"langgraph_node": "conversational"})
+            yield "updates", {"conversational": {"messages": [reply]}}
+            await asyncio.sleep(0.05)
+            yield "updates", {"extract": {"name": "Ana"}}
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    graph = FakeGraph()
+    monkeypatch.setattr(chat_service, "app_graph", graph)
+    yield graph
+    chat_service._pending_turns.clear()
+
+
+def test_turns_of_the_same_patient_never_overlap(graph):
+    async def main():
+        replies = await asyncio.gather(*(chat_service.generate_reply(f"mensaje {i}", "p1") for i in range(3)))
+        await asyncio.sleep(0.2)
+        return replies
+
+    replies = asyncio.run(main())
+    assert replies == ["eco: mensaje 0", "eco: mensaje 1", "eco: mensaje 2"]
+    assert graph.order == ["mensaje 0", "mensaje 1", "mensaje 2"]
+    assert graph.max_active == 1
+    assert chat_service._pending_turns == {}
+
+
+def test_different_patients_run_concurrently(graph):
+    async def main():
+        await asyncio.gather(*(chat_service.generate_reply("hola", f"p{i}") for i in range(3)))
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+    assert graph.max_active == 3
+
+
+def test_a_failed_turn_does_not_block_the_next(graph):
+    async def main():
+        with pytest.raises(ValueError):
+            await chat_service.generate_reply("hola", "")
+        assert chat_service._pending_turns == {}
+        return await asyncio.wait_for(chat_service.generate_reply("hola", "p1"), timeout=2)
+
+    assert asyncio.run(main()) == "eco: hola"
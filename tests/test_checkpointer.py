@@ -0,0 +1,126 @@
+import asyncio
+import time
+from operator import add
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.graph import END, START, StateGraph
+
+from infrastructure.storage.checkpointer import SQLiteCheckpointSaver
+
+
+class TurnState(TypedDict):
+    notes: Annotated[list, add]
+
+
+def three_step_graph(checkpointer):
+    # Tres nodos por turno: cada invoke deja un checkpoint "input" y varios "loop"
+    graph = StateGraph(TurnState)
+    for name in ("extract", "agent", "reply"):
+        graph.add_node(name, lambda state, name=name: {"notes": [name]})
+    graph.add_edge(START, "extract")
+    graph.add_edge("extract", "agent")
+    graph.add_edge("agent", "reply")
+    graph.add_edge("reply", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+@pytest.fixture
+def saver(tmp_path):
+    saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), keep_last=2, ttl_seconds=0, flush_interval=0)
+    yield saver
+    saver.close()
+
+
+def thread(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_checkpoint_and_writes_round_trip(saver):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"transcript": "Paciente con dolor de cabeza. " * 100}
+    config = saver.put(thread("t1"), checkpoint, {"source": "input", "step": -1}, {})
+    saver.put_writes(config, [("messages", ["hola"]), ("notes", "x")], "task-1")
+
+    stored = saver.get_tuple(thread("t1"))
+    assert stored.config["configurable"]["checkpoint_id"] == checkpoint["id"]
+    assert stored.checkpoint["channel_values"] == checkpoint["channel_values"]
+    assert stored.metadata["source"] == "input"
+    assert stored.pending_writes == [("task-1", "messages", ["hola"]), ("task-1", "notes", "x")]
+    # El transcript largo se guarda comprimido
+    type_ = saver._conn.execute("SELECT type FROM checkpoints").fetchone()[0]
+    assert type_.endswith("+zlib")
+
+
+def test_async_api_matches_sync(saver):
+    async def turn():
+        checkpoint = empty_checkpoint()
+        config = await saver.aput(thread("t1"), checkpoint, {"source": "input"}, {})
+        await saver.aput_writes(config, [("notes", "a")], "task-1")
+        return checkpoint["id"], await saver.aget_tuple(thread("t1"))
+
+    checkpoint_id, stored = asyncio.run(turn())
+    assert stored.config["configurable"]["checkpoint_id"] == checkpoint_id
+    assert stored.pending_writes == [("task-1", "notes", "a")]
+
+
+def test_pruning_keeps_whole_turns(saver):
+    graph = three_step_graph(saver)
+    for _ in range(4):
+        graph.invoke({"notes": ["turno"]}, thread("t1"))
+
+    history = list(graph.get_state_history(thread("t1")))
+    sources = [state.metadata["source"] for state in reversed(history)]
+    per_turn = len(sources) // 2
+    # Quedan los dos últimos turnos completos, cada uno desde su checkpoint "input"
+    assert per_turn > saver.keep_last
+    assert sources == (["input"] + ["loop"] * (per_turn - 1)) * 2
+    assert graph.get_state(thread("t1")).values["notes"] == ["turno", "extract", "agent", "reply"] * 4
+    assert saver.metrics()["checkpoints_pruned"] == 2 * per_turn
+
+
+def test_threads_are_pruned_independently(saver):
+    graph = three_step_graph(saver)
+    for _ in range(3):
+        graph.invoke({"notes": []}, thread("t1"))
+    graph.invoke({"notes": []}, thread("t2"))
+    saver.flush()
+    counts = dict(saver._conn.execute("SELECT thread_id, COUNT(*) FROM checkpoints GROUP BY thread_id"))
+    assert counts["t1"] == 2 * counts["t2"]
+
+
+def test_idle_threads_expire(tmp_path):
+    saver = SQLiteCheckpointSaver(str(tmp_path / "checkpoints.sqlite"), ttl_seconds=60, flush_interval=0)
+    try:
+        graph = three_step_graph(saver)
+        graph.invoke({"notes": []}, thread("idle"))
+        graph.invoke({"notes": []}, thread("active"))
+        saver._conn.execute("UPDATE threads SET updated_at = ? WHERE thread_id = 'idle'", (time.time() - 120,))
+
+        assert saver.evict_expired() == 1
+        assert saver.get_tuple(thread("idle")) is None
+        assert saver.get_tuple(thread("active")) is not None
+        assert saver._conn.execute("SELECT COUNT(*) FROM writes WHERE thread_id = 'idle'").fetchone()[0] == 0
+    finally:
+        saver.close()
+
+
+def test_legacy_database_gains_the_turn_column(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = SQLiteCheckpointSaver(path, flush_interval=0)
+    saver._conn.execute("DROP TABLE checkpoints")
+    saver._conn.execute(
+        "CREATE TABLE checkpoints (thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL DEFAULT '',"
+        " checkpoint_id TEXT NOT NULL, parent_checkpoint_id TEXT, type TEXT NOT NULL, checkpoint BLOB NOT NULL,"
+        " metadata_type TEXT NOT NULL, metadata BLOB NOT NULL, PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))"
+    )
+    saver.close()
+
+    saver = SQLiteCheckpointSaver(path, flush_interval=0)
+    try:
+        three_step_graph(saver).invoke({"notes": []}, thread("t1"))
+        saver.flush()
+        assert saver._conn.execute("SELECT SUM(turn_start) FROM checkpoints").fetchone()[0] == 1
+    finally:
+        saver.close()
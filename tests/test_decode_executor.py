@@ -0,0 +1,82 @@
+import asyncio
+import io
+import threading
+import wave
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import av
+import numpy as np
+import pytest
+
+from infrastructure.audio.decode_executor import DecodeExecutor
+
+
+def recording(seconds=0.5):
+    buf = io.BytesIO()
+    output = av.open(buf, mode="w", format="webm")
+    stream = output.add_stream("libopus", rate=48000)
+    stream.layout = "mono"
+    samples = np.zeros(int(48000 * seconds), dtype=np.int16)
+    for start in range(0, len(samples) - 959, 960):
+        frame = av.AudioFrame.from_ndarray(samples[start:start + 960].reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = 48000
+        frame.pts = start
+        for packet in stream.encode(frame):
+            output.mux(packet)
+    for packet in stream.encode(None):
+        output.mux(packet)
+    output.close()
+    return buf.getvalue()
+
+
+class BrokenPool(Executor):
+    """Pool de procesos cuyo worker murió: todo trabajo falla con BrokenProcessPool"""
+
+    def __init__(self):
+        self.shutdowns = 0
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker muerto"))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdowns += 1
+
+
+@pytest.fixture
+def executor():
+    executor = DecodeExecutor(kind="thread", workers=2, max_pending=4)
+    yield executor
+    executor.shutdown()
+
+
+def test_decodes_to_wav_and_counts(executor):
+    wav = asyncio.run(executor.decode_to_wav(recording(), rate=16000))
+    with wave.open(wav) as w:
+        assert w.getframerate() == 16000
+        assert w.getnframes() == pytest.approx(8000, abs=400)
+    metrics = executor.metrics()
+    assert (metrics["submitted"], metrics["completed"], metrics["failed"], metrics["queued"]) == (1, 1, 0, 0)
+
+
+def test_broken_process_pool_falls_back_to_threads_off_the_loop(executor, monkeypatch):
+    broken = BrokenPool()
+    executor.kind, executor._pool = "process", broken
+    started_in = []
+    start = executor.start
+    monkeypatch.setattr(executor, "start", lambda: started_in.append(threading.current_thread()) or start())
+    data = recording()
+
+    async def main():
+        loop_thread = threading.current_thread()
+        results = await asyncio.gather(*(executor.decode_to_wav(data, rate=16000) for _ in range(3)))
+        return loop_thread, results
+
+    loop_thread, results = asyncio.run(main())
+    assert all(result.getbuffer().nbytes > 44 for result in results)
+    assert executor.kind == "thread" and isinstance(executor._pool, ThreadPoolExecutor)
+    # El pool caído se cierra una sola vez y el arranque del nuevo no corre en el event loop
+    assert broken.shutdowns == 1
+    assert started_in and loop_thread not in started_in
@@ -0,0 +1,104 @@
+import httpx
+import pytest
+
+from app.config.settings import settings
+from core.tools.doctor_directory import DoctorDirectory
+from infrastructure.storage import SupabaseStore, set_supabase
+
+T1 = "2025-10-20T10:00:00+00:00"
+T2 = "2025-10-20T11:00:00+00:00"
+
+
+class DoctorsTable:
+    """DoctorsData detrás de un PostgREST falso: entiende select, gt/gte, order por id y paginado"""
+
+    def __init__(self, rows, with_updated_column=True):
+        self.rows = rows
+        self.with_updated_column = with_updated_column
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        self.requests.append(params)
+        columns = params["select"].split(",")
+        if "updated_at" in columns and not self.with_updated_column:
+            return httpx.Response(400, json={"message": "column DoctorsData.updated_at does not exist"})
+        rows = sorted(self.rows, key=lambda row: row["id"])
+        if "updated_at" in params:
+            operator, value = params["updated_at"].split(".", 1)
+            rows = [row for row in rows if row["updated_at"] > value or (operator == "gte" and row["updated_at"] == value)]
+        offset, limit = int(params.get("offset", 0)), int(params.get("limit", len(rows)))
+        return httpx.Response(200, json=[{c: row.get(c) for c in columns} for row in rows[offset:offset + limit]])
+
+
+def doctor(doctor_id, speciality, updated_at, location="Mendoza"):
+    return {"id": doctor_id, "name": f"Médico {doctor_id}", "surname": "", "speciality": speciality,
+            "location": location, "calendly_url": f"https://calendly.com/{doctor_id}", "updated_at": updated_at}
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = DoctorsTable([doctor(1, "Cardiología", T1), doctor(2, "Dermatología", T1), doctor(3, "Pediatría", T2)])
+    store = SupabaseStore(base_url="http://postgrest.test", api_key="test")
+    store._client = httpx.Client(base_url=store.base_url, transport=httpx.MockTransport(table))
+    set_supabase(store)
+    monkeypatch.setattr(settings, "DOCTORS_SELECT_COLUMNS", "id,name,surname,speciality,location,calendly_url")
+    monkeypatch.setattr(settings, "DOCTOR_DIRECTORY_UPDATED_COLUMN", "updated_at")
+    monkeypatch.setattr(settings, "DOCTOR_DIRECTORY_FULL_RELOAD_EVERY", 100)
+    monkeypatch.setattr(settings, "DOCTOR_DIRECTORY_PAGE_SIZE", 2)
+    yield table
+    set_supabase(None)
+
+
+def specialities(directory):
+    return {doctor_id: record["speciality"] for doctor_id, record in directory._records.items()}
+
+
+def test_full_load_reads_every_page(table):
+    directory = DoctorDirectory()
+    directory.refresh()
+    assert directory.ready
+    assert specialities(directory) == {"1": "Cardiología", "2": "Dermatología", "3": "Pediatría"}
+    assert [params.get("offset") for params in table.requests] == ["0", "2"]
+    top, total = directory.search("cardiologo", "Mendoza")
+    assert total == 1 and top[0]["id"] == 1
+
+
+def test_incremental_refresh_reads_only_changes(table):
+    directory = DoctorDirectory()
+    directory.refresh()
+    table.rows[0] = doctor(1, "Cardiología Infantil", "2025-10-20T12:00:00+00:00")
+    table.requests.clear()
+
+    directory.refresh()
+    assert table.requests[0]["updated_at"] == f"gte.{T2}"
+    assert specialities(directory)["1"] == "Cardiología Infantil"
+    assert directory.metrics()["incremental_loads"] == 1
+    assert directory.metrics()["full_loads"] == 1
+
+
+def test_rows_sharing_the_last_timestamp_are_not_missed(table):
+    directory = DoctorDirectory()
+    directory.refresh()
+    # Escrita después del refresco anterior pero con el mismo updated_at que la última vista
+    table.rows.append(doctor(4, "Neurología", T2))
+
+    directory.refresh()
+    assert specialities(directory)["4"] == "Neurología"
+    # El médico 3 vuelve a llegar por el filtro inclusivo, pero sin cambios no se reindexa
+    assert directory.metrics()["incremental_loads"] == 1
+
+    directory.refresh()
+    assert directory.metrics()["incremental_loads"] == 1
+    assert len(directory._records) == 4
+
+
+def test_table_without_updated_column_only_reloads_fully(table):
+    table.with_updated_column = False
+    directory = DoctorDirectory()
+    directory.refresh()
+    directory.refresh()
+    assert directory.ready and directory.updated_column is None
+    assert settings.DOCTOR_DIRECTORY_UPDATED_COLUMN == "updated_at"
+    assert directory.metrics()["full_loads"] == 2
+    assert all("updated_at" not in params for params in table.requests[1:])
@@ -0,0 +1,49 @@
+import pytest
+
+from core.tools.doctor_search import format_doctors, ilike_pattern, rank_doctors
+
+ROWS = [
+    {"id": 1, "name": "Ana", "surname": "Pérez", "speciality": "Cardiología Infantil", "location": "Mendoza"},
+    {"id": 2, "name": "Luis", "surname": "Gómez", "speciality": "Cardiología", "location": "Godoy Cruz, Mendoza"},
+    {"id": 3, "name": "Eva", "surname": "Ruiz", "speciality": "Dermatología", "location": "Mendoza"},
+    {"id": 4, "name": "Juan", "surname": "Sosa", "speciality": "Odontología", "location": "Mendoza"},
+]
+
+
+def ranked_ids(speciality, location="Mendoza"):
+    return [row["id"] for row in rank_doctors(ROWS, speciality, location, top_k=3)]
+
+
+@pytest.mark.parametrize("speciality", ["cardiologo", "Cardióloga", "cardiología", "CARDIOLOGOS"])
+def test_exact_specialty_ranks_above_sub_specialty(speciality):
+    # La ubicación exacta del médico infantil no le gana a la especialidad exacta
+    assert ranked_ids(speciality)[:2] == [2, 1]
+
+
+def test_asking_for_the_sub_specialty_ranks_it_first():
+    assert ranked_ids("Cardiología Infantil")[:2] == [1, 2]
+
+
+def test_synonyms_resolve_to_the_specialty():
+    assert ranked_ids("dentista")[0] == 4
+
+
+def test_location_breaks_ties_within_a_specialty():
+    rows = [
+        {"id": 1, "speciality": "Cardiología", "location": "Córdoba"},
+        {"id": 2, "speciality": "Cardiología", "location": "Mendoza, Argentina"},
+        {"id": 3, "speciality": "Cardiología", "location": "Mendoza"},
+    ]
+    assert [row["id"] for row in rank_doctors(rows, "cardiologo", "Mendoza", top_k=3)] == [3, 2, 1]
+
+
+def test_ilike_pattern_ignores_accents_and_form():
+    assert ilike_pattern("Cardiólogo") == ilike_pattern("cardiologia") == "%c_rd__l_g%"
+    assert ilike_pattern("") == "%"
+
+
+def test_format_doctors_keeps_one_line_per_doctor():
+    text = format_doctors(ROWS[:2], total=7)
+    assert text.splitlines()[0] == "2 de 7 médicos encontrados (mejores coincidencias):"
+    assert "- ID 2: Luis Gómez, Cardiología, Godoy Cruz, Mendoza" in text
+    assert "calendly" not in text
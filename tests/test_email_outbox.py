@@ -0,0 +1,209 @@
+import smtplib
+import socketserver
+import threading
+import time
+from email.mime.text import MIMEText
+
+import pytest
+
+from app.config.settings import settings
+from infrastructure.email.outbox import EmailOutbox, FAILED, PENDING, SENDING, SENT
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Servidor SMTP mínimo: guarda los mensajes y responde DATA según `data_replies`"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.messages = []
+        self.sessions = 0
+        self.data_replies = []
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.sessions += 1
+        self.reply("220 stand-in ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO"):
+                self.reply("250 stand-in")
+            elif command.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                body = []
+                while True:
+                    data = self.rfile.readline()
+                    if data in (b".\r\n", b""):
+                        break
+                    body.append(data)
+                reply = server.data_replies.pop(0) if server.data_replies else "250 queued"
+                if reply.startswith("250"):
+                    server.messages.append(b"".join(body))
+                self.reply(reply)
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    server = SMTPStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", server.server_address[1])
+    monkeypatch.setattr(settings, "SMTP_SSL", False)
+    monkeypatch.setattr(settings, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(settings, "EMAIL_PASSWORD", None)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def message(subject):
+    msg = MIMEText("Paciente de prueba")
+    msg["Subject"] = subject
+    return msg
+
+
+def row(outbox, message_id):
+    return outbox._conn.execute(
+        "SELECT status, attempts, next_attempt_at, lease_until FROM outbox WHERE id = ?", (message_id,)
+    ).fetchone()
+
+
+def test_batch_is_sent_over_one_session(tmp_path, smtp_server):
+    outbox = EmailOutbox(str(tmp_path / "outbox.sqlite"))
+    try:
+        ids = [outbox.enqueue(message(f"Paciente {i}"), "curaai@test", ["doctor@test"]) for i in range(5)]
+        assert outbox.flush(timeout=10)
+        assert len(smtp_server.messages) == 5
+        assert smtp_server.sessions == 1
+        assert all(row(outbox, i)[0] == SENT for i in ids)
+    finally:
+        outbox.close()
+
+
+def test_transient_error_is_retried_with_backoff(tmp_path, smtp_server, monkeypatch):
+    monkeypatch.setattr(settings, "EMAIL_RETRY_BASE_SECONDS", 30.0)
+    smtp_server.data_replies = ["451 try again later"]
+    outbox = EmailOutbox(str(tmp_path / "outbox.sqlite"))
+    try:
+        before = time.time()
+        message_id = outbox.enqueue(message("Paciente"), "curaai@test", ["doctor@test"])
+        assert outbox.flush(timeout=10)
+        status, attempts, next_attempt_at, lease_until = row(outbox, message_id)
+        assert (status, attempts, lease_until) == (PENDING, 1, None)
+        # Primer reintento: la base con ±20% de jitter
+        assert before + 24 <= next_attempt_at <= time.time() + 36
+
+        # Cuando vence, sale en el siguiente intento
+        outbox._conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE id = ?", (message_id,))
+        assert outbox.flush(timeout=10)
+        assert row(outbox, message_id)[:2] == (SENT, 2)
+        assert len(smtp_server.messages) == 1
+        assert outbox.metrics()["retries"] == 1
+    finally:
+        outbox.close()
+
+
+def test_permanent_error_is_not_retried(tmp_path, smtp_server):
+    smtp_server.data_replies = ["550 mailbox unavailable"]
+    outbox = EmailOutbox(str(tmp_path / "outbox.sqlite"))
+    try:
+        rejected = outbox.enqueue(message("Rechazado"), "curaai@test", ["doctor@test"])
+        accepted = outbox.enqueue(message("Aceptado"), "curaai@test", ["doctor@test"])
+        assert outbox.flush(timeout=10)
+        assert row(outbox, rejected)[:2] == (FAILED, 1)
+        assert row(outbox, accepted)[0] == SENT
+        assert smtp_server.sessions == 1
+    finally:
+        outbox.close()
+
+
+def test_senders_sharing_a_spool_never_claim_the_same_row(tmp_path, monkeypatch):
+    # Dos instancias sobre el mismo archivo, como dos workers de uvicorn
+    monkeypatch.setattr(EmailOutbox, "start", lambda self: None)
+    path = str(tmp_path / "outbox.sqlite")
+    first, second = EmailOutbox(path), EmailOutbox(path)
+    try:
+        ids = {first.enqueue(message(f"Paciente {i}"), "curaai@test", ["doctor@test"]) for i in range(200)}
+        claimed = {first: [], second: []}
+
+        def drain(outbox):
+            while True:
+                batch = outbox._claim(7)
+                if not batch:
+                    return
+                claimed[outbox].extend(row[0] for row in batch)
+
+        threads = [threading.Thread(target=drain, args=(outbox,)) for outbox in (first, second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        everything = claimed[first] + claimed[second]
+        assert len(everything) == len(set(everything))
+        assert set(everything) == ids
+    finally:
+        first.close()
+        second.close()
+
+
+def test_expired_lease_is_reclaimed(tmp_path, monkeypatch):
+    monkeypatch.setattr(EmailOutbox, "start", lambda self: None)
+    path = str(tmp_path / "outbox.sqlite")
+    crashed, survivor = EmailOutbox(path), EmailOutbox(path)
+    try:
+        message_id = crashed.enqueue(message("Paciente"), "curaai@test", ["doctor@test"])
+        assert [r[0] for r in crashed._claim(10)] == [message_id]
+        assert row(survivor, message_id)[0] == SENDING
+        # Mientras la reserva está vigente nadie más lo toma
+        assert survivor._claim(10) == []
+
+        survivor._conn.execute("UPDATE outbox SET lease_until = ? WHERE id = ?", (time.time() - 1, message_id))
+        assert [r[0] for r in survivor._claim(10)] == [message_id]
+    finally:
+        crashed.close()
+        survivor.close()
+
+
+def test_unsent_rows_are_released_when_the_connection_drops(tmp_path, monkeypatch):
+    monkeypatch.setattr(EmailOutbox, "start", lambda self: None)
+    outbox = EmailOutbox(str(tmp_path / "outbox.sqlite"))
+    try:
+        ids = [outbox.enqueue(message(f"Paciente {i}"), "curaai@test", ["doctor@test"]) for i in range(3)]
+
+        class Dropping:
+            def noop(self):
+                return (250, b"OK")
+
+            def sendmail(self, *args):
+                raise smtplib.SMTPServerDisconnected("gone")
+
+            def close(self):
+                pass
+
+            quit = close
+
+        outbox._smtp = Dropping()
+        outbox._send_batch(outbox._claim(10))
+        assert row(outbox, ids[0])[:2] == (PENDING, 1)
+        assert [row(outbox, i)[:2] for i in ids[1:]] == [(PENDING, 0), (PENDING, 0)]
+        assert outbox._conn.execute("SELECT COUNT(*) FROM outbox WHERE status = ?", (SENDING,)).fetchone()[0] == 0
+    finally:
+        outbox.close()
@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+
+from app.config.settings import settings
+from infrastructure.google.calendar_client import InMemoryCalendarClient
+from infrastructure.google.event_cache import CalendarEventCache
+
+
+def event(day, hour, summary="Turno"):
+    return {"summary": summary, "start": {"dateTime": f"2025-10-{day:02d}T{hour:02d}:00:00+00:00"},
+            "end": {"dateTime": f"2025-10-{day:02d}T{hour:02d}:30:00+00:00"}}
+
+
+class SlowClient(InMemoryCalendarClient):
+    """Calendario que se queda esperando en list_events hasta que el test lo libere"""
+
+    def __init__(self, events=None):
+        super().__init__(events)
+        self.slow = False
+        self.pulling = threading.Event()
+        self.release = threading.Event()
+
+    def list_events(self, *args, **kwargs):
+        if self.slow:
+            self.pulling.set()
+            assert self.release.wait(timeout=5)
+        return super().list_events(*args, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def small_pages(monkeypatch):
+    monkeypatch.setattr(settings, "CALENDAR_PAGE_SIZE", 2)
+
+
+def summaries(cache):
+    return sorted(e["summary"] for e in cache.events_between(max_age=float("inf")))
+
+
+def test_full_sync_reads_every_page():
+    client = InMemoryCalendarClient([event(20, h, f"e{h}") for h in range(9, 14)])
+    cache = CalendarEventCache(client)
+    cache.sync()
+    assert summaries(cache) == ["e10", "e11", "e12", "e13", "e9"]
+    metrics = cache.metrics()
+    assert (metrics["full_syncs"], metrics["pages"], metrics["events"]) == (1, 3, 5)
+    busy = cache.events_between("2025-10-20T10:15:00+00:00", "2025-10-20T11:00:00+00:00", max_age=float("inf"))
+    assert [e["summary"] for e in busy] == ["e10"]
+
+
+def test_incremental_sync_applies_updates_and_deletions():
+    client = InMemoryCalendarClient([event(20, 9, "a"), event(20, 10, "b"), event(20, 11, "c")])
+    cache = CalendarEventCache(client)
+    cache.sync()
+    client.update_event("evt1", summary="a movido", start={"dateTime": "2025-10-21T09:00:00+00:00"},
+                        end={"dateTime": "2025-10-21T09:30:00+00:00"})
+    client.delete_event("evt2")
+    client.insert_event("primary", event(22, 9, "d"))
+
+    cache.sync()
+    assert summaries(cache) == ["a movido", "c", "d"]
+    assert cache.events_between("2025-10-21T00:00:00+00:00", "2025-10-22T00:00:00+00:00",
+                                max_age=float("inf"))[0]["summary"] == "a movido"
+    metrics = cache.metrics()
+    assert (metrics["full_syncs"], metrics["incremental_syncs"], metrics["events"]) == (1, 1, 3)
+
+
+def test_expired_sync_token_forces_a_full_resync():
+    client = InMemoryCalendarClient([event(20, 9, "a"), event(20, 10, "b")])
+    cache = CalendarEventCache(client)
+    cache.sync()
+    client.delete_event("evt1")
+    client.expired_tokens.add(cache._sync_token)
+
+    cache.sync()
+    assert summaries(cache) == ["b"]
+    metrics = cache.metrics()
+    assert (metrics["full_syncs"], metrics["incremental_syncs"], metrics["expired_tokens"]) == (2, 0, 1)
+    assert cache._sync_token not in client.expired_tokens
+
+
+def test_lookups_do_not_wait_for_a_slow_pull():
+    client = SlowClient([event(20, 9, "a")])
+    cache = CalendarEventCache(client)
+    cache.sync()
+    client.insert_event("primary", event(20, 10, "b"))
+    client.slow = True
+    syncing = threading.Thread(target=cache.sync)
+    syncing.start()
+    assert client.pulling.wait(timeout=5)
+
+    # Con el pull trabado, las consultas responden con el índice actual aunque esté vencido
+    assert summaries(cache) == ["a"]
+    assert [e["summary"] for e in cache.events_between(max_age=0)] == ["a"]
+    created = cache.insert(event(20, 11, "c"))
+    assert cache.metrics()["events"] == 2
+
+    client.release.set()
+    syncing.join(timeout=5)
+    assert not syncing.is_alive()
+    assert summaries(cache) == ["a", "b", "c"]
+    assert created["id"] in cache._events
+
+
+def test_insert_during_a_full_resync_is_kept():
+    client = InMemoryCalendarClient([event(20, 9, "a")])
+    cache = CalendarEventCache(client)
+    cache.sync()
+    client.expired_tokens.add(cache._sync_token)
+    created = []
+    list_events = client.list_events
+
+    def list_then_insert(*args, sync_token=None, **kwargs):
+        page = list_events(*args, sync_token=sync_token, **kwargs)
+        # Un turno reservado mientras se piden las páginas de la sincronización completa
+        if sync_token is None and not created:
+            created.append(cache.insert(event(20, 11, "c")))
+        return page
+
+    client.list_events = list_then_insert
+    cache.sync()
+    assert cache.metrics()["expired_tokens"] == 1
+    assert summaries(cache) == ["a", "c"]
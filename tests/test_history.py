@@ -0,0 +1,88 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from core.agents import history
+from core.agents.history import is_stub, messages_tokens, plan_compaction, split_turns, trim_history
+
+
+@pytest.fixture(autouse=True)
+def word_counter(monkeypatch):
+    # Un token por palabra: los presupuestos del test se pueden calcular a mano
+    monkeypatch.setattr(history, "_token_counter", lambda text: len(text.split()))
+
+
+def turn(n, payload_words=0):
+    """Un turno: pregunta, tool_call con su resultado y respuesta"""
+    call_id = f"call-{n}"
+    return [
+        HumanMessage(content=f"pregunta {n}", id=f"h{n}"),
+        AIMessage(content="", tool_calls=[{"name": "search_doctors", "args": {"q": n}, "id": call_id}], id=f"a{n}"),
+        ToolMessage(content=" ".join(["medico"] * payload_words) or "ok", tool_call_id=call_id,
+                    name="search_doctors", id=f"t{n}"),
+        AIMessage(content=f"respuesta {n}", id=f"r{n}"),
+    ]
+
+
+def conversation(turns, payload_words=0):
+    return [m for n in range(turns) for m in turn(n, payload_words)]
+
+
+def test_split_turns_keeps_tool_pairs_together():
+    messages = [AIMessage(content="Hola, soy CuraAI", id="greeting")] + conversation(3)
+    turns = split_turns(messages)
+    assert [len(t) for t in turns] == [1, 4, 4, 4]
+    for t in turns[1:]:
+        calls = {c["id"] for m in t if isinstance(m, AIMessage) for c in m.tool_calls}
+        results = {m.tool_call_id for m in t if isinstance(m, ToolMessage)}
+        assert calls == results
+
+
+def test_nothing_to_compact_under_budget():
+    messages = conversation(4)
+    assert plan_compaction(messages, budget=messages_tokens(messages), keep_turns=2) == ([], [])
+
+
+def test_a_single_turn_is_never_compacted():
+    assert plan_compaction(turn(0, payload_words=500), budget=10, keep_turns=2) == ([], [])
+
+
+def test_old_turns_are_summarized_and_middle_payloads_stubbed():
+    messages = conversation(6, payload_words=40)
+    recent = messages_tokens(conversation(2, payload_words=40))
+    stubbed_turn = messages_tokens(turn(0)) + 4
+    # Entran los dos turnos recientes completos y dos turnos más con stubs
+    to_summarize, stubs = plan_compaction(messages, budget=recent + 2 * stubbed_turn, keep_turns=2)
+
+    assert [m.id for m in to_summarize] == [m.id for m in conversation(2)]
+    assert [m.id for m in stubs] == ["t2", "t3"]
+    assert all(is_stub(m) for m in stubs)
+    assert [m.tool_call_id for m in stubs] == ["call-2", "call-3"]
+
+
+def test_recent_window_shrinks_to_fit_the_budget():
+    messages = conversation(4, payload_words=100)
+    last = messages_tokens(turn(3, payload_words=100))
+    to_summarize, stubs = plan_compaction(messages, budget=last + 10, keep_turns=3)
+    # Solo el último turno entra: todo lo anterior va al resumen
+    assert [m.id for m in to_summarize] == [m.id for m in conversation(3)]
+    assert stubs == []
+
+
+def test_existing_stubs_are_not_stubbed_again():
+    messages = conversation(4, payload_words=40)
+    _, stubs = plan_compaction(messages, budget=messages_tokens(messages) - 1, keep_turns=1)
+    compacted = [next((s for s in stubs if s.id == m.id), m) for m in messages]
+    again = plan_compaction(compacted, budget=messages_tokens(compacted) - 1, keep_turns=1)
+    assert not [m for m in again[1] if m.id in {s.id for s in stubs}]
+
+
+def test_trim_history_sends_the_last_turn_whole():
+    messages = conversation(3, payload_words=40)
+    view = trim_history(messages, summary="El paciente busca un cardiólogo", budget=10**6)
+    assert isinstance(view[0], SystemMessage) and "cardiólogo" in view[0].content
+    tool_results = [m for m in view if isinstance(m, ToolMessage)]
+    assert [is_stub(m) for m in tool_results] == [True, True, False]
+
+    # Aunque el último turno solo supere el presupuesto, se envía completo
+    view = trim_history(messages, budget=5)
+    assert [m.id for m in view] == [m.id for m in turn(2)]
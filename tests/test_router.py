@@ -0,0 +1,67 @@
+import pytest
+
+from app.config.settings import settings
+from core.agents.router import FAREWELL, SEARCH_DOCTORS, classify_intent
+
+
+@pytest.mark.parametrize(
+    "text, speciality, location",
+    [
+        ("Necesito un cardiólogo en Mendoza por favor", "Cardiología", "Mendoza"),
+        ("Busco un dermatólogo en Córdoba que atienda OSDE", "Dermatología", "Córdoba"),
+        ("Quiero un traumatólogo en Rosario, gracias", "Traumatología", "Rosario"),
+        ("Quiero un otorrino en Mar del Plata y que sea rápido", "Otorrinolaringología", "Mar del Plata"),
+        ("Busco un ginecólogo en San Miguel de Tucumán", "Ginecología", "San Miguel de Tucumán"),
+        ("Necesito un cardiólogo en Godoy Cruz, Mendoza", "Cardiología", "Godoy Cruz, Mendoza"),
+        ("Busco un neumólogo en La Plata.", "Neumología", "La Plata"),
+        ("Necesito un dentista en Salta para mañana", "Odontología", "Salta"),
+    ],
+)
+def test_location_stops_before_the_rest_of_the_request(text, speciality, location):
+    intent = classify_intent(text)
+    assert intent.intent == SEARCH_DOCTORS
+    assert intent.args == {"speciality": speciality, "location": location}
+    assert intent.confidence >= settings.ROUTER_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Necesito un cardiólogo por favor",
+        "Busco un cardiólogo en la zona",
+        "busco un cardiologo en mendoza",
+        "Quiero un cardiólogo",
+    ],
+)
+def test_uncertain_searches_are_left_to_the_llm(text):
+    intent = classify_intent(text)
+    assert intent.intent == SEARCH_DOCTORS
+    assert intent.confidence < settings.ROUTER_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Hola, me duele mucho la cabeza",
+        "Necesito un médico para la migraña en Mendoza",
+        "Gracias, también tengo fiebre",
+    ],
+)
+def test_symptoms_are_not_dispatched(text):
+    intent = classify_intent(text)
+    assert intent is None or intent.confidence < settings.ROUTER_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize(
+    "text, confidence",
+    [
+        ("Chau, muchas gracias", 0.95),
+        ("Bueno, nos vemos!", 0.95),
+        ("Muchas gracias", 0.7),
+        ("Chau, el lunes vuelvo a escribir", 0.6),
+    ],
+)
+def test_farewell_confidence(text, confidence):
+    intent = classify_intent(text)
+    assert intent.intent == FAREWELL
+    assert intent.confidence == confidence
@@ -0,0 +1,116 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.config.settings import settings
+from infrastructure.google import InMemoryCalendarClient, set_calendar_client
+from infrastructure.google.scheduling import find_free_slots, format_slots, free_slots, merge_intervals
+
+BA = ZoneInfo("America/Argentina/Buenos_Aires")
+MADRID = ZoneInfo("Europe/Madrid")
+WEEKDAYS = [0, 1, 2, 3, 4]
+
+
+def at(day, hour, minute=0, tz=BA):
+    # Octubre de 2025: el 20 es lunes
+    return datetime(2025, 10, day, hour, minute, tzinfo=tz)
+
+
+def busy(*intervals):
+    return [(start.timestamp(), end.timestamp()) for start, end in intervals]
+
+
+def starts(slots):
+    return [start.strftime("%d %H:%M") for start, _ in slots]
+
+
+def slots_between(intervals, start, end, limit=5, duration=60, tz=BA, workdays=WEEKDAYS):
+    return find_free_slots(intervals, start, end, duration, limit, tz, "09:00", "18:00", workdays, 30)
+
+
+def test_merge_intervals_joins_overlapping_and_adjacent():
+    assert merge_intervals([(5, 7), (1, 3), (2, 4), (4, 5), (9, 9), (10, 12)]) == [(1, 7), (10, 12)]
+
+
+def test_slots_skip_busy_intervals():
+    events = busy((at(20, 9), at(20, 10, 15)), (at(20, 10), at(20, 11)), (at(20, 12), at(20, 13)))
+    slots = slots_between(events, at(20, 0), at(20, 23), limit=4)
+    assert starts(slots) == ["20 11:00", "20 13:00", "20 13:30", "20 14:00"]
+    assert all(end - start == slots[0][1] - slots[0][0] for start, end in slots)
+
+
+def test_slots_stay_on_the_grid_from_the_opening():
+    # Empezar a media mañana o después de un evento fuera de la grilla no corre los turnos
+    events = busy((at(20, 11), at(20, 13, 7)))
+    slots = slots_between(events, at(20, 10, 37), at(20, 23), limit=3)
+    assert starts(slots) == ["20 13:30", "20 14:00", "20 14:30"]
+
+    slots = slots_between([], at(20, 10, 37), at(20, 23), limit=2)
+    assert starts(slots) == ["20 11:00", "20 11:30"]
+
+
+def test_slots_respect_working_hours_and_workdays():
+    # Viernes 17:00 es el último turno de una hora; el fin de semana no se atiende
+    slots = slots_between([], at(24, 17), at(27, 23), limit=3)
+    assert starts(slots) == ["24 17:00", "27 09:00", "27 09:30"]
+
+
+def test_limit_and_range_end():
+    assert len(slots_between([], at(20, 0), at(24, 23), limit=7)) == 7
+    assert starts(slots_between([], at(20, 9), at(20, 10, 45))) == ["20 09:00", "20 09:30"]
+
+
+def test_daylight_saving_change_keeps_local_opening():
+    # En Madrid el horario de verano empieza el domingo 30/03/2025
+    start = datetime(2025, 3, 29, tzinfo=MADRID)
+    end = datetime(2025, 4, 1, tzinfo=MADRID)
+    slots = find_free_slots([], start, end, 60, 3, MADRID, "09:00", "10:00", [0, 1, 2, 3, 4, 5, 6], 30)
+    assert [s.isoformat() for s, _ in slots] == [
+        "2025-03-29T09:00:00+01:00",
+        "2025-03-30T09:00:00+02:00",
+        "2025-03-31T09:00:00+02:00",
+    ]
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    monkeypatch.setattr(settings, "CALENDAR_TIMEZONE", "America/Argentina/Buenos_Aires")
+    monkeypatch.setattr(settings, "SCHEDULING_DAY_START", "09:00")
+    monkeypatch.setattr(settings, "SCHEDULING_DAY_END", "18:00")
+    monkeypatch.setattr(settings, "SCHEDULING_WORKDAYS", WEEKDAYS)
+    monkeypatch.setattr(settings, "SCHEDULING_SLOT_STEP_MINUTES", 30)
+    monkeypatch.setattr(settings, "SCHEDULING_MIN_NOTICE_MINUTES", 60)
+    client = InMemoryCalendarClient()
+    set_calendar_client(client)
+    yield client
+    set_calendar_client(None)
+
+
+def test_free_slots_reads_the_calendar(calendar):
+    calendar.insert_event("primary", {
+        "start": {"dateTime": "2025-10-20T09:00:00-03:00"}, "end": {"dateTime": "2025-10-20T17:30:00-03:00"},
+    })
+    calendar.insert_event("primary", {
+        "start": {"dateTime": "2025-10-21T09:00:00-03:00"}, "end": {"dateTime": "2025-10-21T18:00:00-03:00"},
+        "transparency": "transparent",
+    })
+    calendar.insert_event("primary", {"start": {"date": "2025-10-22"}, "end": {"date": "2025-10-23"}})
+
+    slots = free_slots("2025-10-20", "2025-10-22", 60, 2, not_before=at(1, 0))
+    # El 20 está ocupado y el evento "disponible" del 21 no bloquea
+    assert starts(slots) == ["21 09:00", "21 09:30"]
+    # El día completo del 22 sí bloquea
+    assert free_slots("2025-10-22", "2025-10-22", 60, 2, not_before=at(1, 0)) == []
+
+
+def test_free_slots_applies_minimum_notice_on_the_grid(calendar):
+    slots = free_slots("2025-10-20", "2025-10-20", 60, 2, not_before=at(20, 8, 13))
+    assert starts(slots) == ["20 09:30", "20 10:00"]
+
+
+def test_format_slots():
+    assert format_slots([]) == "No hay turnos libres en ese rango."
+    line = format_slots([(at(20, 9), at(20, 10))])
+    assert line.startswith("- lun 20/10 09:00-10:00")
+    assert "inicio 2025-10-20T09:00:00-03:00" in line
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import time
+import wave
+
+import av
+import numpy as np
+import pytest
+
+from infrastructure.audio.streaming_decoder import StreamingAudioDecoder, is_container_header
+
+RATE = 48000
+
+
+def record(seconds, container="webm", codec="libopus"):
+    # Un tono de 220 Hz codificado como lo manda MediaRecorder (WebM/Opus) o iOS (MP4/AAC)
+    buf = io.BytesIO()
+    output = av.open(buf, mode="w", format=container)
+    stream = output.add_stream(codec, rate=RATE)
+    stream.layout = "mono"
+    t = np.arange(int(RATE * seconds)) / RATE
+    pcm = (0.3 * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16)
+    for start in range(0, len(pcm) - 959, 960):
+        frame = av.AudioFrame.from_ndarray(pcm[start:start + 960].reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = RATE
+        frame.pts = start
+        for packet in stream.encode(frame):
+            output.mux(packet)
+    for packet in stream.encode(None):
+        output.mux(packet)
+    output.close()
+    return buf.getvalue()
+
+
+def chunks(data, size=1500):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def wav_seconds(wav):
+    with wave.open(wav) as w:
+        assert (w.getnchannels(), w.getsampwidth(), w.getframerate()) == (1, 2, 16000)
+        return w.getnframes() / w.getframerate()
+
+
+def wait_for_pcm(decoder, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    pcm = b""
+    while not pcm and time.monotonic() < deadline:
+        time.sleep(0.01)
+        pcm = decoder.read_pcm()
+    return pcm
+
+
+@pytest.fixture
+def decoder():
+    decoder = StreamingAudioDecoder(rate=16000)
+    yield decoder
+    decoder.close()
+
+
+def test_container_headers():
+    assert is_container_header(record(0.1))
+    assert is_container_header(record(0.1, "mp4", "aac"))
+    assert not is_container_header(record(0.5)[200:])
+
+
+def test_pcm_is_decoded_while_chunks_arrive(decoder):
+    parts = chunks(record(1.0))
+    for part in parts[: len(parts) // 2]:
+        decoder.feed(part)
+    # La primera mitad ya está decodificada antes de que termine la locución
+    assert wait_for_pcm(decoder)
+    for part in parts[len(parts) // 2:]:
+        decoder.feed(part)
+
+    wav = decoder.finish()
+    assert wav_seconds(wav) == pytest.approx(1.0, abs=0.05)
+    assert decoder.received_bytes == 0
+
+
+def test_afinish_returns_the_same_audio(decoder):
+    for part in chunks(record(0.6)):
+        decoder.feed(part)
+    wav = asyncio.run(decoder.afinish())
+    assert wav_seconds(wav) == pytest.approx(0.6, abs=0.05)
+
+
+def test_mp4_with_trailing_moov_falls_back_to_full_decode(decoder):
+    # El átomo moov al final no se puede leer sin seek: se decodifica el contenedor completo
+    data = record(1.0, "mp4", "aac")
+    for part in chunks(data):
+        decoder.feed(part)
+    assert decoder.received_bytes == len(data)
+    assert wav_seconds(decoder.finish()) == pytest.approx(1.0, abs=0.05)
+
+
+def test_new_container_starts_a_new_session(decoder):
+    for part in chunks(record(0.5)):
+        decoder.feed(part)
+    second = record(0.8)
+    for part in chunks(second):
+        decoder.feed(part)
+    assert decoder.received_bytes == len(second)
+    assert wav_seconds(decoder.finish()) == pytest.approx(0.8, abs=0.05)
+
+
+def test_finish_without_audio_raises(decoder):
+    with pytest.raises(ValueError):
+        decoder.finish()
@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.config.settings import settings
+from core.tools.agent_tools import search_doctors, update_database
+from core.tools.doctor_directory import doctor_directory
+from infrastructure.storage import PostgrestError, SupabaseStore, get_supabase, set_supabase
+
+
+class Transport:
+    """Transporte HTTP de prueba: guarda cada request y responde con `reply`"""
+
+    def __init__(self, reply=None):
+        self.requests = []
+        self.reply = reply or (lambda request: httpx.Response(200, json=[]))
+
+    def __call__(self, request):
+        self.requests.append(request)
+        return self.reply(request)
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    transport = Transport()
+    store = SupabaseStore(base_url="http://postgrest.test/rest/v1/", api_key="anon-key", timeout=3)
+    options = store._client_options
+    # El cliente se arma por el camino normal (headers, límites, timeout), solo cambia el transporte
+    monkeypatch.setattr(store, "_client_options", lambda: {**options(), "transport": httpx.MockTransport(transport)})
+    set_supabase(store)
+    transport.store = store
+    yield transport
+    set_supabase(None)
+
+
+def test_filters_become_postgrest_params(transport):
+    transport.store.table("DoctorsData").select("id, name,speciality").ilike("speciality", "%c_rd__l_g%") \
+        .eq("location", "Mendoza").gte("updated_at", "2025-10-20").gt("id", 3).order("id").range(10, 19).execute()
+
+    request = transport.requests[0]
+    assert request.method == "GET"
+    assert request.url.path == "/rest/v1/DoctorsData"
+    assert request.url.params.multi_items() == [
+        ("select", "id,name,speciality"),
+        ("speciality", "ilike.%c_rd__l_g%"),
+        ("location", "eq.Mendoza"),
+        ("updated_at", "gte.2025-10-20"),
+        ("id", "gt.3"),
+        ("order", "id.asc"),
+        ("offset", "10"),
+        ("limit", "10"),
+    ]
+    assert request.headers["apikey"] == "anon-key"
+    assert request.headers["authorization"] == "Bearer anon-key"
+
+
+def test_update_sends_a_patch_and_returns_the_rows(transport):
+    transport.reply = lambda request: httpx.Response(200, json=[{"user_id": "p1", "birthday": "1990-01-01"}])
+    result = transport.store.table("UsersData").update({"birthday": "1990-01-01"}).eq("user_id", "p1").execute()
+
+    request = transport.requests[0]
+    assert request.method == "PATCH"
+    assert request.url.params["user_id"] == "eq.p1"
+    assert request.headers["prefer"] == "return=representation"
+    assert json.loads(request.content) == {"birthday": "1990-01-01"}
+    assert result.data == [{"user_id": "p1", "birthday": "1990-01-01"}]
+
+
+def test_single_object_and_empty_bodies(transport):
+    transport.reply = lambda request: httpx.Response(200, json={"id": 1})
+    assert transport.store.table("DoctorsData").select().execute().data == [{"id": 1}]
+    transport.reply = lambda request: httpx.Response(204)
+    assert transport.store.table("UsersData").update({"a": 1}).execute().data == []
+
+
+@pytest.mark.parametrize(
+    "response, status, message",
+    [
+        (httpx.Response(400, json={"message": "column DoctorsData.foo does not exist", "code": "42703"}), 400,
+         "PostgREST 400: column DoctorsData.foo does not exist"),
+        (httpx.Response(503, text="upstream down"), 503, "PostgREST 503: upstream down"),
+    ],
+)
+def test_http_errors_become_postgrest_errors(transport, response, status, message):
+    transport.reply = lambda request: response
+    with pytest.raises(PostgrestError) as error:
+        transport.store.table("DoctorsData").select("foo").execute()
+    assert (error.value.status_code, str(error.value)) == (status, message)
+    assert transport.store.metrics()["errors"] == 1
+
+
+def test_connection_errors_and_timeouts(transport):
+    def timeout(request):
+        raise httpx.ReadTimeout("lento", request=request)
+
+    transport.reply = timeout
+    with pytest.raises(PostgrestError, match="Error de conexión"):
+        transport.store.table("DoctorsData").select().execute(timeout=0.1)
+    metrics = transport.store.metrics()
+    assert (metrics["requests"], metrics["errors"], metrics["timeouts"]) == (1, 1, 1)
+
+
+def test_missing_url_is_reported():
+    store = SupabaseStore(base_url="http://postgrest.test", api_key="")
+    # Sin SUPABASE_URL ni POSTGREST_URL en el entorno
+    store.base_url = ""
+    with pytest.raises(PostgrestError, match="no está configurada"):
+        store.table("DoctorsData").select().execute()
+
+
+def test_clients_are_created_once_and_reused(transport):
+    store = get_supabase()
+    assert store is transport.store
+    for _ in range(3):
+        store.table("DoctorsData").select().execute()
+    assert store.client is store.client
+
+    async def main():
+        first = store.async_client
+        await store.table("DoctorsData").select().aexecute()
+        await store.table("DoctorsData").select().aexecute()
+        assert store.async_client is first
+        assert await store.ahealth_check()
+        await store.aclose()
+
+    asyncio.run(main())
+    assert len(transport.requests) == 6
+    assert store.metrics()["healthy"] is True
+    assert store._client is None and store._async_client is None
+
+
+def test_tools_keep_their_queries(transport, monkeypatch):
+    monkeypatch.setattr(doctor_directory, "loaded_at", None)
+    transport.reply = lambda request: httpx.Response(200, json=[
+        {"id": 7, "name": "Luis", "surname": "Gómez", "speciality": "Cardiología", "location": "Mendoza",
+         "calendly_url": "https://calendly.com/luis"},
+    ])
+    text = search_doctors.invoke({"speciality": "cardiólogo", "location": "Mendoza"})
+    assert "- ID 7: Luis Gómez, Cardiología, Mendoza" in text
+    assert "calendly" not in text
+    params = transport.requests[-1].url.params
+    assert params["speciality"] == "ilike.%c_rd__l_g%"
+    assert params["location"] == "ilike.%m_nd_z%"
+    assert params["limit"] == str(settings.DOCTORS_SEARCH_MAX_ROWS)
+
+    transport.reply = lambda request: httpx.Response(200, json=[])
+    text = update_database.invoke({"patient_id": "p1", "field": "med_insurance", "value": "OSDE"})
+    assert text.startswith("Base de datos actualizada")
+    request = transport.requests[-1]
+    assert (request.method, request.url.path, request.url.params["user_id"]) == ("PATCH", "/rest/v1/UsersData", "eq.p1")
+    assert json.loads(request.content) == {"med_insurance": "OSDE"}
+
+    transport.reply = lambda request: httpx.Response(401, json={"message": "JWT expired"})
+    assert "JWT expired" in update_database.invoke({"patient_id": "p1", "field": "resume", "value": "x"})
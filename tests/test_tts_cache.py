@@ -0,0 +1,82 @@
+import asyncio
+import os
+import threading
+
+from infrastructure.audio.tts_cache import TTSCache, normalize_tts_text
+
+
+def key(text):
+    return TTSCache.make_key(text, "alloy", "tts-1", "mp3")
+
+
+def test_key_ignores_whitespace_variations():
+    assert normalize_tts_text("  Hola,\n  ¿cómo   estás? ") == "Hola, ¿cómo estás?"
+    assert key("Hola  mundo") == key("Hola mundo\n")
+    assert key("Hola") != TTSCache.make_key("Hola", "nova", "tts-1", "mp3")
+
+
+def test_memory_tier_is_a_byte_bounded_lru(tmp_path):
+    cache = TTSCache(memory_max_bytes=10, disk_dir="", disk_max_bytes=0)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    # "b" era el menos usado
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa" and cache.get("c") == b"cccc"
+    assert cache.metrics()["memory_evictions"] == 1
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    TTSCache(memory_max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024).put(key("hola"), b"audio")
+    cache = TTSCache(memory_max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024)
+    assert asyncio.run(cache.aget(key("hola"))) == b"audio"
+    assert asyncio.run(cache.aget(key("hola"))) == b"audio"
+    metrics = cache.metrics()
+    assert (metrics["disk_hits"], metrics["memory_hits"]) == (1, 1)
+    assert asyncio.run(cache.aget(key("chau"))) is None
+
+
+def test_disk_eviction_drops_the_least_recently_used(tmp_path, monkeypatch):
+    cache = TTSCache(memory_max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=300)
+    scans = []
+    entries = cache._disk_entries
+    monkeypatch.setattr(cache, "_disk_entries", lambda: scans.append(1) or entries())
+
+    for name in ("uno", "dos", "tres"):
+        cache.put(key(name), b"x" * 100)
+    assert cache.get(key("uno")) is not None
+    cache.put(key("cuatro"), b"x" * 100)
+
+    # "dos" es el menos usado: "uno" se leyó después de escribirse
+    assert cache.get(key("dos")) is None
+    assert all(cache.get(key(name)) for name in ("uno", "tres", "cuatro"))
+    assert cache.metrics()["disk_bytes"] == 300
+    assert cache.metrics()["disk_evictions"] == 1
+    # El directorio se recorre una sola vez, en el primer write
+    assert len(scans) == 1
+
+
+def test_existing_files_are_indexed_oldest_first(tmp_path):
+    old = TTSCache(memory_max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=1000)
+    old.put(key("viejo"), b"x" * 100)
+    old.put(key("nuevo"), b"x" * 100)
+    os.utime(old._disk_path(key("viejo")), (1, 1))
+
+    cache = TTSCache(memory_max_bytes=0, disk_dir=str(tmp_path), disk_max_bytes=250)
+    cache.put(key("otro"), b"x" * 100)
+    assert cache.get(key("viejo")) is None
+    assert cache.get(key("nuevo")) is not None
+
+
+def test_memory_lookups_do_not_wait_for_disk_eviction(tmp_path):
+    cache = TTSCache(memory_max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=1024)
+    cache.put(key("hola"), b"audio")
+    # Con el lock del disco tomado (una eviction en curso en otro hilo), el LRU en memoria responde igual
+    with cache._disk_lock:
+        result = []
+        reader = threading.Thread(target=lambda: result.append(asyncio.run(cache.aget(key("hola")))))
+        reader.start()
+        reader.join(timeout=2)
+        assert not reader.is_alive()
+    assert result == [b"audio"]
@@ -0,0 +1,192 @@
+import io
+import time
+import wave
+
+import av
+import numpy as np
+import pytest
+
+from infrastructure.audio.streaming_decoder import StreamingAudioDecoder
+from infrastructure.audio.vad import VoiceActivityDetector, contains_speech
+
+RATE = 16000
+
+
+def tone(ms, amplitude=0.3):
+    t = np.arange(RATE * ms // 1000) / RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t) * 32767).astype(np.int16).tobytes()
+
+
+def silence(ms):
+    return bytes(RATE * ms // 1000 * 2)
+
+
+def noise(ms, seed=0):
+    return np.random.default_rng(seed).integers(-12000, 12000, RATE * ms // 1000, dtype=np.int16).tobytes()
+
+
+def feed_in_chunks(vad, pcm, chunk_ms=20):
+    size = RATE * chunk_ms // 1000 * 2
+    for start in range(0, len(pcm), size):
+        if vad.feed(pcm[start:start + size]):
+            return start + size
+    return None
+
+
+def make_vad(**overrides):
+    options = dict(rate=RATE, frame_ms=30, energy_threshold_db=-45, zcr_max=0.35, hangover_ms=600, min_speech_ms=200)
+    options.update(overrides)
+    return VoiceActivityDetector(**options)
+
+
+def test_utterance_ends_after_the_hangover():
+    vad = make_vad()
+    pcm = tone(500) + silence(1000)
+    consumed = feed_in_chunks(vad, pcm)
+    assert vad.ended
+    # Termina apenas se cumplen los 600 ms de silencio, no al final del buffer
+    assert len(tone(500) + silence(600)) <= consumed < len(tone(500) + silence(700))
+    assert vad.silence_ms >= 600
+    assert vad.speech_ms == pytest.approx(500, abs=30)
+
+
+def test_short_pause_does_not_end_the_utterance():
+    vad = make_vad()
+    assert feed_in_chunks(vad, tone(400) + silence(300) + tone(400) + silence(300)) is None
+    assert vad.speech_detected and not vad.ended
+    assert vad.silence_ms == pytest.approx(300, abs=30)
+
+
+def test_a_blip_below_the_minimum_is_not_speech():
+    vad = make_vad()
+    assert feed_in_chunks(vad, tone(90) + silence(2000)) is None
+    assert not vad.speech_detected
+    # El silencio acumulado permite descartar el buffer antes de transcribirlo
+    assert vad.silence_ms == pytest.approx(2000, abs=60)
+
+
+def test_noise_and_quiet_audio_are_not_speech():
+    assert not contains_speech(noise(1000), rate=RATE)
+    assert not contains_speech(tone(1000, amplitude=0.001), rate=RATE)
+    assert contains_speech(silence(200) + tone(300), rate=RATE)
+
+
+def test_partial_frames_are_kept_between_feeds():
+    pcm = tone(600) + silence(900)
+    byte_by_byte = make_vad()
+    for start in range(0, len(pcm), 7):
+        byte_by_byte.feed(pcm[start:start + 7])
+    framed = make_vad()
+    framed.feed(pcm)
+    assert (byte_by_byte.frames_seen, byte_by_byte.speech_frames, byte_by_byte.ended) == (
+        framed.frames_seen, framed.speech_frames, framed.ended)
+
+
+def test_ended_detector_ignores_audio_until_reset():
+    vad = make_vad()
+    vad.feed(tone(300) + silence(700))
+    assert vad.ended
+    frames = vad.frames_seen
+    assert vad.feed(tone(300))
+    assert vad.frames_seen == frames
+
+    vad.reset()
+    assert (vad.ended, vad.frames_seen, vad.speech_ms, vad.silence_ms) == (False, 0, 0, 0)
+
+
+def test_custom_classifier():
+    calls = []
+
+    def every_other_frame(frames):
+        calls.append(frames.shape)
+        return np.arange(len(frames)) % 2 == 0
+
+    vad = make_vad(classifier=every_other_frame, hangover_ms=30, min_speech_ms=30)
+    assert vad.feed(silence(90))
+    assert calls == [(3, 480)]
+
+
+def record(pcm):
+    # WebM/Opus a partir de PCM de 16 kHz, como lo manda MediaRecorder
+    buf = io.BytesIO()
+    output = av.open(buf, mode="w", format="webm")
+    stream = output.add_stream("libopus", rate=48000)
+    stream.layout = "mono"
+    samples = np.frombuffer(pcm, dtype=np.int16).repeat(3)
+    for start in range(0, len(samples) - 959, 960):
+        frame = av.AudioFrame.from_ndarray(samples[start:start + 960].reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = 48000
+        frame.pts = start
+        for packet in stream.encode(frame):
+            output.mux(packet)
+    for packet in stream.encode(None):
+        output.mux(packet)
+    output.close()
+    return buf.getvalue()
+
+
+@pytest.fixture
+def decoder():
+    decoder = StreamingAudioDecoder(rate=RATE)
+    yield decoder
+    decoder.close()
+
+
+def listen(decoder, vad, parts):
+    """Entrega chunks al decoder hasta que el VAD corta la locución; devuelve los que sobran"""
+    for i, part in enumerate(parts):
+        decoder.feed(part)
+        # El demuxer corre en su hilo: dar tiempo a que decodifique el chunk
+        time.sleep(0.01)
+        if vad.feed(decoder.read_pcm()):
+            return parts[i + 1:]
+    return []
+
+
+def test_vad_cut_keeps_the_container_open(decoder):
+    data = record(tone(700) + silence(1200) + tone(700) + silence(300))
+    parts = [data[i:i + 400] for i in range(0, len(data), 400)]
+    vad = make_vad()
+    rest = listen(decoder, vad, parts)
+    assert vad.ended and rest
+
+    wav = decoder.cut()
+    with wave.open(wav) as w:
+        assert 1.2 <= w.getnframes() / RATE <= 2.0
+    assert decoder.was_cut and decoder.received_bytes == 0
+
+    # La segunda locución sale del mismo contenedor, sin cabecera nueva
+    for part in rest:
+        decoder.feed(part)
+    with wave.open(decoder.finish()) as w:
+        assert w.getnframes() > 0
+
+
+def test_discarded_silence_does_not_grow_the_buffer(decoder):
+    data = record(silence(3000))
+    parts = [data[i:i + 400] for i in range(0, len(data), 400)]
+    vad = make_vad()
+    for part in parts[: len(parts) // 2]:
+        decoder.feed(part)
+    time.sleep(0.2)
+    vad.feed(decoder.read_pcm())
+    assert not vad.speech_detected
+
+    decoder.discard()
+    assert decoder.was_cut and decoder.received_bytes == 0
+    for part in parts[len(parts) // 2:]:
+        decoder.feed(part)
+    assert decoder.received_bytes == sum(len(p) for p in parts[len(parts) // 2:])
+    time.sleep(0.2)
+    vad.feed(decoder.read_pcm())
+    decoder.discard()
+    # Cerrar la locución no vuelve a decodificar el contenedor crudo: a lo sumo queda la cola del resampler
+    wav = decoder.finish()
+    if wav is not None:
+        with wave.open(wav) as w:
+            assert w.getnframes() < RATE // 10
+
+
+def test_cut_without_audio_raises(decoder):
+    with pytest.raises(ValueError):
+        decoder.cut()